@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+"""
+Benchmark the parse, update and rotate phases of PythonTest.Ops against a
+synthetic syslog, without root or cron. Reports lines/sec, bytes/sec, peak
+RSS and per-phase latency percentiles, and saves results as JSON so runs
+can be compared for regressions (--compare). Each scenario runs in a child
+process of its own, so its peak RSS is not inherited from the scenarios
+before it; --tracemalloc adds the peak memory allocated by each phase.
+
+Throughput is the syslog's size divided by the first parse, so it is the
+scan rate for the full-file scenario (its window covers the whole file);
+the window and incremental scenarios show how much of the file is avoided.
+
+    python benchmarks/bench.py --size 256M --output before.json
+    python benchmarks/bench.py --size 256M --compare before.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'pythontest'))
+sys.path.insert(0, HERE)
+
+import PythonTest  # noqa: E402
+from clock import monotonic  # noqa: E402
+from synth_syslog import FORMATS, SyslogSynth, parse_size  # noqa: E402
+
+PHASES = ('parse', 'update', 'rotate')
+
+
+def percentile(samples, fraction):
+    """
+    :param samples: measurements
+    :ptype samples: list of floats
+    :param fraction: 0.0 to 1.0
+    :ptype fraction: float
+    :return: nearest-rank percentile, None without samples
+    :rtype: float
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    """
+    :param samples: seconds per run
+    :ptype samples: list of floats
+    :return: latency summary in milliseconds
+    :rtype: dict
+    """
+    return {'runs': len(samples),
+            'p50_ms': percentile(samples, 0.50) * 1e3,
+            'p90_ms': percentile(samples, 0.90) * 1e3,
+            'p99_ms': percentile(samples, 0.99) * 1e3,
+            'max_ms': max(samples) * 1e3}
+
+
+def peak_rss_kb():
+    """
+    :return: peak resident set size of this process in KiB
+    :rtype: int
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def setup_logging():
+    """
+    Quiet PythonTest's logger, in the parent and in each scenario process
+    :return: None
+    """
+    PythonTest.LOGGER = logging.getLogger('bench')
+    logging.basicConfig(level=logging.ERROR)
+
+
+def make_ops(workdir, logfile, extra_args):
+    """
+    :param workdir: scratch directory for touch, rotate and state files
+    :ptype workdir: string
+    :param logfile: syslog to parse
+    :ptype logfile: string
+    :param extra_args: additional PythonTest command line options
+    :ptype extra_args: list of strings
+    :return: Ops instance
+    :rtype: PythonTest.Ops
+    """
+    os.mkdir(os.path.join(workdir, 'rotate'))
+    argv = ['--test',
+            '--file', os.path.join(workdir, 'touchfile.txt'),
+            '--prefix', os.path.join(workdir, 'rotate', 'pythontest'),
+            '--state-file', os.path.join(workdir, 'state.json'),
+            '--cron-log', logfile] + extra_args
+    return PythonTest.Ops(PythonTest.parse_arguments(sys_argv=argv), PythonTest.LOGGER)
+
+
+def run_scenario(name, synth, workdir, size, span, iterations, append_lines, extra_args, trace=False):
+    """
+    Generate a syslog, then run parse, update and rotate iterations times,
+    appending append_lines new lines to the syslog before every iteration.
+    Run it with run_isolated(), peak RSS is the process's high-water mark.
+    :param trace: also measure each phase's peak allocation with tracemalloc,
+        which slows the phases down
+    :ptype trace: bool
+    :return: scenario results
+    :rtype: dict
+    """
+    logfile = os.path.join(workdir, 'syslog')
+    generated = monotonic()
+    lines, written = synth.write(logfile, size, span)
+    generated = monotonic() - generated
+    ops = make_ops(workdir, logfile, extra_args + ['--touch-format', 'text'])
+    timings = dict((phase, []) for phase in PHASES)
+    allocated = dict((phase, 0) for phase in PHASES)
+    if trace:
+        import tracemalloc
+        tracemalloc.start()
+    for iteration in range(iterations):
+        if iteration and append_lines:
+            end = time.time()
+            with open(logfile, 'a') as filehandle:
+                filehandle.writelines(synth.lines(append_lines, end - 1, end))
+        ops._standard_loop_count += 1
+        for phase, method in (('parse', ops.parse_logfile),
+                              ('update', ops.update_touchfile),
+                              ('rotate', ops.rotate_touchfile)):
+            if trace:
+                base = _reset_peak(tracemalloc)
+            started = monotonic()
+            method()
+            timings[phase].append(monotonic() - started)
+            if trace:
+                allocated[phase] = max(allocated[phase], (tracemalloc.get_traced_memory()[1] - base) // 1024)
+    ops.writer.close()
+    ops.rotator.close()
+    if trace:
+        tracemalloc.stop()
+    first_parse = timings['parse'][0]
+    result = {'scenario': name,
+              'options': extra_args,
+              'log_lines': lines,
+              'log_bytes': written,
+              'generate_seconds': generated,
+              'first_parse_lines_per_sec': lines / first_parse if first_parse else None,
+              'first_parse_bytes_per_sec': written / first_parse if first_parse else None,
+              'touch_count': ops.recent_events.get('count'),
+              'phases': dict((phase, summarize(samples)) for phase, samples in timings.items()),
+              'peak_rss_kb': peak_rss_kb()}
+    if trace:
+        result['phase_peak_alloc_kb'] = allocated
+    return result
+
+
+def _reset_peak(tracemalloc):
+    """
+    :param tracemalloc: the tracemalloc module, tracing
+    :ptype tracemalloc: module
+    :return: traced memory the next peak is measured from, in bytes
+    :rtype: int
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+    # Before Python 3.9 the peak is only reset along with the traces
+    tracemalloc.clear_traces()
+    return 0
+
+
+def _scenario_process(connection, args):
+    """
+    Child process of run_isolated(), sends the results or the traceback
+    :return: None
+    """
+    setup_logging()
+    try:
+        connection.send(run_scenario(*args))
+    except Exception:
+        connection.send(traceback.format_exc())
+    finally:
+        connection.close()
+
+
+def run_isolated(*args):
+    """
+    Run run_scenario(*args) in a process of its own
+    :return: scenario results
+    :rtype: dict
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_scenario_process, args=(sender, args))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = 'scenario process exited with code {}'.format(process.exitcode)
+    process.join()
+    if not isinstance(result, dict):
+        raise RuntimeError('scenario {} failed: {}'.format(args[0], result))
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print p50 latency ratios against a baseline run
+    :return: number of phases slower than baseline by more than tolerance
+    :rtype: int
+    """
+    regressions = 0
+    previous = dict((scenario['scenario'], scenario) for scenario in baseline.get('scenarios', []))
+    for scenario in results['scenarios']:
+        before = previous.get(scenario['scenario'])
+        if before is None:
+            continue
+        for phase in PHASES:
+            old = before['phases'][phase]['p50_ms']
+            new = scenario['phases'][phase]['p50_ms']
+            ratio = new / old if old else float('inf')
+            flag = ''
+            if ratio > 1 + tolerance:
+                regressions += 1
+                flag = '  REGRESSION'
+            sys.stdout.write('{:<12} {:<7} p50 {:9.3f} ms -> {:9.3f} ms  x{:.2f}{}\n'.format(
+                scenario['scenario'], phase, old, new, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', default='32M', help='synthetic syslog size (default: 32M)')
+    parser.add_argument('--span', type=float, default=60, help='minutes the syslog covers (default: 60)')
+    parser.add_argument('--format', dest='stamp_format', choices=FORMATS, default='rfc3164')
+    parser.add_argument('--touch', type=float, default=0.02, help='density of cron touch jobs')
+    parser.add_argument('--cron', type=float, default=0.05, help='density of other cron jobs')
+    parser.add_argument('--error', type=float, default=0.005, help='density of errors')
+    parser.add_argument('--warning', type=float, default=0.01, help='density of warnings')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--append-lines', type=int, default=1000,
+                        help='lines appended to the syslog between iterations (default: 1000)')
+    parser.add_argument('--scenario', action='append', default=[],
+                        help='NAME=OPTIONS, PythonTest options for a named scenario, may be '
+                             'repeated (default: window, full-file and incremental scenarios)')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='also report the peak memory allocated by each phase (Python 3.4 '
+                             'or later, slows the phases down)')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed p50 slowdown before --compare reports a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    if args.tracemalloc and sys.version_info < (3, 4):
+        parser.error('--tracemalloc needs Python 3.4 or later')
+    setup_logging()
+    size = parse_size(args.size)
+    span = args.span * 60
+    scenarios = [item.split('=', 1) for item in args.scenario] or [
+        ('window', ''),
+        ('full-file', '--window {}'.format(int(args.span) + 1)),
+        ('incremental', '--incremental')]
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+               'size': size,
+               'span_minutes': args.span,
+               'iterations': args.iterations,
+               'append_lines': args.append_lines,
+               'scenarios': []}
+    for name, options in scenarios:
+        workdir = tempfile.mkdtemp(prefix='pythontest-bench-')
+        try:
+            synth = SyslogSynth(touch_files=[os.path.join(workdir, 'touchfile.txt')],
+                                cron=args.cron, touch=args.touch, error=args.error,
+                                warning=args.warning, stamp_format=args.stamp_format)
+            scenario = run_isolated(name, synth, workdir, size, span, args.iterations,
+                                    args.append_lines, options.split(), args.tracemalloc)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        results['scenarios'].append(scenario)
+        phases = scenario['phases']
+        sys.stdout.write('{:<12} {:>10.0f} lines/s {:>8.1f} MB/s  parse p50 {:8.2f} ms p99 {:8.2f} ms  '
+                         'update p50 {:6.2f} ms  rotate p50 {:6.2f} ms  peak RSS {} KiB\n'.format(
+                             name, scenario['first_parse_lines_per_sec'] or 0,
+                             (scenario['first_parse_bytes_per_sec'] or 0) / 1024.0 ** 2,
+                             phases['parse']['p50_ms'], phases['parse']['p99_ms'],
+                             phases['update']['p50_ms'], phases['rotate']['p50_ms'],
+                             scenario['peak_rss_kb']))
+        if args.tracemalloc:
+            sys.stdout.write('{:<12} peak allocated {}\n'.format(name, '  '.join(
+                '{} {} KiB'.format(phase, scenario['phase_peak_alloc_kb'][phase]) for phase in PHASES)))
+    if args.output:
+        with open(args.output, 'wt') as filehandle:
+            json.dump(results, filehandle, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, 'rt') as filehandle:
+            return 1 if compare(results, json.load(filehandle), args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Generate realistic synthetic syslog files for benchmarking, no root or
+cron needed. Lines are spread evenly over a time span ending now, with
+configurable densities of cron touch jobs, other cron jobs, errors and
+warnings and a choice of time stamp format.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+FORMATS = ('rfc3164', 'iso8601', 'unix')
+
+NOISE = ('systemd[1]: Started Session {n} of user root.',
+         'kernel: [{n}.000000] eth0: link up, 1000Mbps, full-duplex',
+         'sshd[{n}]: Accepted publickey for deploy from 10.0.0.{m} port 5{m}22 ssh2',
+         'dhclient[{n}]: DHCPACK of 10.0.0.{m} from 10.0.0.1',
+         'rsyslogd: action \'action-{m}-builtin:omfile\' resumed')
+ERRORS = ('kernel: [{n}.000000] EXT4-fs error (device sda1): htree_dirblock_to_tree',
+          'app[{n}]: ERROR connection refused to backend {m}')
+WARNINGS = ('kernel: [{n}.000000] WARNING: CPU: {m} PID: {n} at mm/page_alloc.c',
+            'ntpd[{n}]: warning: time reset +0.{m}s')
+
+
+def format_stamp(epoch, stamp_format='rfc3164'):
+    """
+    :param epoch: seconds since the epoch
+    :ptype epoch: float
+    :param stamp_format: one of FORMATS
+    :ptype stamp_format: string
+    :return: time stamp as it starts a syslog line
+    :rtype: string
+    """
+    if stamp_format == 'unix':
+        return '{:.6f}'.format(epoch)
+    if stamp_format == 'iso8601':
+        micro = int((epoch % 1) * 1e6)
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch)) + '.{:06d}+00:00'.format(micro)
+    return time.strftime('%b %d %H:%M:%S', time.localtime(epoch))
+
+
+class SyslogSynth(object):
+    """
+    Produce syslog lines; densities are the fraction of lines of each kind,
+    the remaining lines are daemon noise
+    """
+
+    def __init__(self, touch_files=('/root/touchfile.txt',), cron=0.05, touch=0.02,
+                 error=0.005, warning=0.01, stamp_format='rfc3164', host='bench', seed=0):
+        """
+        :param touch_files: files the touch cron jobs name
+        :ptype touch_files: list of strings
+        :param cron: density of cron jobs other than touch
+        :ptype cron: float
+        :param touch: density of cron touch jobs
+        :ptype touch: float
+        :param error: density of error lines
+        :ptype error: float
+        :param warning: density of warning lines
+        :ptype warning: float
+        :param stamp_format: one of FORMATS
+        :ptype stamp_format: string
+        :param host: host name in every line
+        :ptype host: string
+        :param seed: random seed, for reproducible files
+        :ptype seed: int
+        """
+        self.touch_files = list(touch_files)
+        self.thresholds = (touch, touch + cron, touch + cron + error, touch + cron + error + warning)
+        self.stamp_format = stamp_format
+        self.host = host
+        self.random = random.Random(seed)
+
+    def message(self):
+        """
+        :return: one syslog message, without time stamp and host
+        :rtype: string
+        """
+        roll = self.random.random()
+        n = self.random.randint(1000, 99999)
+        m = self.random.randint(1, 254)
+        if roll < self.thresholds[0]:
+            return 'CROND[{}]: (root) CMD (touch {})'.format(n, self.random.choice(self.touch_files))
+        if roll < self.thresholds[1]:
+            return 'CROND[{}]: (root) CMD (run-parts /etc/cron.hourly)'.format(n)
+        if roll < self.thresholds[2]:
+            return self.random.choice(ERRORS).format(n=n, m=m)
+        if roll < self.thresholds[3]:
+            return self.random.choice(WARNINGS).format(n=n, m=m)
+        return self.random.choice(NOISE).format(n=n, m=m)
+
+    def lines(self, count, start, end):
+        """
+        :param count: lines to produce
+        :ptype count: int
+        :param start: first line time, seconds since the epoch
+        :ptype start: float
+        :param end: last line time, seconds since the epoch
+        :ptype end: float
+        :return: newline terminated lines, time ordered
+        :rtype: generator of strings
+        """
+        step = (end - start) / max(1, count - 1)
+        for index in range(count):
+            epoch = start + index * step
+            yield '{} {} {}\n'.format(format_stamp(epoch, self.stamp_format), self.host, self.message())
+
+    def write(self, filename, size, span, end=None, mode='w'):
+        """
+        Write about size bytes of lines covering span seconds up to end
+        :param filename: syslog file to create
+        :ptype filename: string
+        :param size: bytes to write
+        :ptype size: int
+        :param span: seconds covered
+        :ptype span: float
+        :param end: last line time (default: now)
+        :ptype end: float
+        :param mode: "w" to create, "a" to append
+        :ptype mode: string
+        :return: lines and bytes written
+        :rtype: tuple (int, int)
+        """
+        if end is None:
+            end = time.time()
+        sample = ''.join(self.lines(200, end - span, end))
+        count = max(1, int(size / (len(sample) / 200.0)))
+        written = 0
+        buffered = []
+        with open(filename, mode) as filehandle:
+            for line in self.lines(count, end - span, end):
+                buffered.append(line)
+                if len(buffered) >= 10000:
+                    chunk = ''.join(buffered)
+                    filehandle.write(chunk)
+                    written += len(chunk)
+                    buffered = []
+            chunk = ''.join(buffered)
+            filehandle.write(chunk)
+            written += len(chunk)
+        return count, written
+
+
+def parse_size(text):
+    """
+    :param text: size like "512K", "64M", "2G" or bytes
+    :ptype text: string
+    :return: bytes
+    :rtype: int
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('output', help='syslog file to write')
+    parser.add_argument('--size', default='64M', help='approximate file size (default: 64M)')
+    parser.add_argument('--span', type=float, default=60, help='minutes covered, ending now (default: 60)')
+    parser.add_argument('--format', dest='stamp_format', choices=FORMATS, default='rfc3164')
+    parser.add_argument('--touch-file', dest='touch_files', action='append', default=[],
+                        help='file named by touch jobs, may be repeated (default: /root/touchfile.txt)')
+    parser.add_argument('--touch', type=float, default=0.02, help='density of cron touch jobs')
+    parser.add_argument('--cron', type=float, default=0.05, help='density of other cron jobs')
+    parser.add_argument('--error', type=float, default=0.005, help='density of errors')
+    parser.add_argument('--warning', type=float, default=0.01, help='density of warnings')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    synth = SyslogSynth(touch_files=args.touch_files or ['/root/touchfile.txt'],
+                        cron=args.cron, touch=args.touch, error=args.error, warning=args.warning,
+                        stamp_format=args.stamp_format, seed=args.seed)
+    count, written = synth.write(args.output, parse_size(args.size), args.span * 60)
+    sys.stdout.write('wrote {} lines, {} bytes to {}\n'.format(count, written, os.path.abspath(args.output)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,3 @@
 #!/usr/bin/env sh
-python2 pythontest/PythonTest.py $@
+# Import PythonTest rather than run it as a script, its compiled bytecode is then reused
+python2 -c 'import sys; sys.path.insert(0, "pythontest"); import PythonTest; PythonTest.main(sys.argv[1:])' "$@"
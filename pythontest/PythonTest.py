@@ -4,21 +4,31 @@ Automate making system calls and processing log files
 """
 
 import argparse
+import binascii
 import datetime
 import json
 import logging
 import os
-import random
 import re
-import shlex
-import shutil
-import string
-import subprocess
 import sys
 import time
-from socket import getfqdn
+
+from classifier import SEVERITY_CATEGORIES, load_rules
+from clock import SystemClock, VirtualClock, next_deadline
+from crontable import Crontab
+from events import EventReader
+from logreader import LogCheckpoint, ReplayCursor, log_time_range, to_native
+from metrics import PROFILERS, Metrics, Profiler
+from rotation import Rotator
+from state import StateFile
+from targets import Target, load_targets
+from timestamps import TimestampParser, parse_offset, parse_time
+from window import WindowAggregator, merge_collapsed
+from writer import DURABILITY, FORMATS, TouchWriter
 
 __version__ = '0.01.00'
+# --once runs between checks that the touch jobs are still in the crontab
+CRONTAB_CHECK_RUNS = 10
 
 
 def parse_arguments(sys_argv=sys.argv):
@@ -30,13 +40,16 @@ def parse_arguments(sys_argv=sys.argv):
     :return: a validated, known options namespace
     :rtype: argparse.ArgumentParser.parse_known_args()[0]
     """
-    parser = argparse.ArgumentParser(version=__version__)
+    parser = argparse.ArgumentParser()
+    # ArgumentParser(version=...) is Python 2 only, this is the same option
+    parser.add_argument('-v', '--version',
+                        action='version',
+                        version=__version__)
     # README.md section (1.a.i)
     default = os.path.join(os.getenv('HOME', '.'), 'touchfile.txt')
     help = "Specify a file location and name (default: {})".format(default)
     parser.add_argument('-f', '--file',
                         dest='touch',
-                        nargs=1,
                         help=help,
                         metavar='FILENAME',
                         action='store',
@@ -75,6 +88,117 @@ def parse_arguments(sys_argv=sys.argv):
                         action='store',
                         default=default,
                         type=int)
+    # Many touch files, each with its own rate and prefix, in one process
+    help = 'Specify a JSON file listing touch file targets, '
+    help += 'ex. [{"file": "/root/a.txt", "rate": 2, "prefix": "/root/rotate/a"}], '
+    help += 'instead of --file, --rate and --prefix'
+    parser.add_argument('-t', '--targets',
+                        dest='targets',
+                        help=help,
+                        metavar='FILECONFIG',
+                        action='store',
+                        default=None)
+    # Touch file output
+    default = 'flush'
+    help = 'Specify how hard touch file appends are pushed to disk each '
+    help += 'loop: {} (default: {})'.format(', '.join(DURABILITY), default)
+    parser.add_argument('--durability',
+                        help=help,
+                        choices=DURABILITY,
+                        action='store',
+                        default=default)
+    default = 'text'
+    help = 'Specify the touch file format, "text" or compact JSON lines '
+    help += '"jsonl" (default: {})'.format(default)
+    parser.add_argument('--touch-format',
+                        dest='touch_format',
+                        help=help,
+                        choices=FORMATS,
+                        action='store',
+                        default=default)
+    # README.md section (1.d) rotation triggers and housekeeping
+    default = 15
+    help = 'Rotate touch files every this many loops, 0 for never '
+    help += '(default: {})'.format(default)
+    parser.add_argument('--rotate-loops',
+                        dest='rotate_loops',
+                        help=help,
+                        metavar='LOOPS',
+                        action='store',
+                        default=default,
+                        type=int)
+    parser.add_argument('--rotate-size',
+                        dest='rotate_size',
+                        help='Also rotate touch files once they reach this many bytes',
+                        metavar='BYTES',
+                        action='store',
+                        default=0,
+                        type=int)
+    parser.add_argument('--rotate-lines',
+                        dest='rotate_lines',
+                        help='Also rotate touch files once they have this many lines',
+                        metavar='LINES',
+                        action='store',
+                        default=0,
+                        type=int)
+    parser.add_argument('--rotate-age',
+                        dest='rotate_age',
+                        help='Also rotate touch files once they are this many minutes old',
+                        metavar='MINUTES',
+                        action='store',
+                        default=0,
+                        type=int)
+    parser.add_argument('--compress',
+                        help='Gzip rotated touch files in the background',
+                        action='store_true')
+    parser.add_argument('--keep',
+                        help='Keep at most this many rotated files per prefix, oldest removed first',
+                        metavar='FILES',
+                        action='store',
+                        default=0,
+                        type=int)
+    parser.add_argument('--keep-bytes',
+                        dest='keep_bytes',
+                        help='Keep at most this many bytes of rotated files per prefix',
+                        metavar='BYTES',
+                        action='store',
+                        default=0,
+                        type=int)
+    # Instrumentation
+    help = 'Write loop metrics to this Prometheus textfile-collector file every loop'
+    parser.add_argument('--metrics-prom',
+                        dest='metrics_prom',
+                        help=help,
+                        metavar='FILEPROM',
+                        action='store',
+                        default=None)
+    help = 'Write loop metrics to this JSON stats file every loop'
+    parser.add_argument('--metrics-json',
+                        dest='metrics_json',
+                        help=help,
+                        metavar='FILEJSON',
+                        action='store',
+                        default=None)
+    help = 'Profile the whole run with {}, '.format(' or '.join(PROFILERS))
+    help += 'results are written to --profile-output on exit'
+    parser.add_argument('--profile',
+                        help=help,
+                        choices=PROFILERS,
+                        action='store',
+                        default=None)
+    default = os.path.join(os.getenv('HOME', '.'), 'pythontest-profile.out')
+    help = 'Specify the profile results file, (default: {})'.format(default)
+    parser.add_argument('--profile-output',
+                        dest='profile_output',
+                        help=help,
+                        metavar='FILEPROFILE',
+                        action='store',
+                        default=default)
+    # Re-read the crontab after writing it, to confirm the jobs are installed
+    parser.add_argument('--verify-crontab',
+                        dest='verify_crontab',
+                        help='Re-read the crontab after changing it and fail if it differs',
+                        action='store_true')
     # README.md section (1.c)
     default = '/var/log/syslog'
     parser.add_argument('-c', '--cron-log',
@@ -98,6 +222,189 @@ def parse_arguments(sys_argv=sys.argv):
                         metavar='FILECRONTAB',
                         action='store',
                         default=default)
+    # README.md section (1.c) asks for the last 7 minutes
+    default = 7
+    help = 'Specify how many minutes of cron log to count events over '
+    help += '(default: {} minutes)'.format(default)
+    parser.add_argument('-w', '--window',
+                        help=help,
+                        metavar='MINUTES',
+                        action='store',
+                        default=default,
+                        type=int)
+    help = 'Also report event counts over this many minutes, '
+    help += 'may be repeated (ex. --report-window 1 --report-window 60)'
+    parser.add_argument('--report-window',
+                        dest='report_windows',
+                        help=help,
+                        metavar='MINUTES',
+                        action='append',
+                        default=[],
+                        type=int)
+    default = 'local'
+    help = 'Specify the timezone of cron log time stamps without a UTC '
+    help += 'offset, "local" or an offset like "UTC" or "+02:00" '
+    help += '(default: {})'.format(default)
+    parser.add_argument('--log-timezone',
+                        dest='log_timezone',
+                        help=help,
+                        metavar='TIMEZONE',
+                        action='store',
+                        default=default)
+    # Which syslog lines count as errors and warnings
+    help = 'Specify a JSON file of error and warning rules, ex. '
+    help += '{"rules": [{"category": "error", "keyword": "segfault"}], "severity": {"error": 3, "warning": 4}} '
+    help += '(default: the words "error" and "warning", and <PRI> severities)'
+    parser.add_argument('--rules',
+                        dest='rules',
+                        help=help,
+                        metavar='FILECONFIG',
+                        action='store',
+                        default=None)
+    # Wake up when the cron log or touch files change instead of sleeping
+    help = 'Watch the cron log (inotify, or polling) and report new '
+    help += 'warnings and errors as they are logged, implies --incremental'
+    parser.add_argument('--watch',
+                        help=help,
+                        action='store_true')
+    default = 2.0
+    help = 'Specify how long the files must be quiet before a burst of '
+    help += 'changes is processed, with --watch (default: {} seconds)'.format(default)
+    parser.add_argument('--debounce',
+                        help=help,
+                        metavar='SECONDS',
+                        action='store',
+                        default=default,
+                        type=float)
+    # Run from cron itself rather than as a sleeping daemon
+    help = 'Run one loop and exit, for running from cron instead of as a '
+    help += 'daemon, implies --incremental; the loop count, log checkpoint '
+    help += 'and rotation are kept in --state-file between runs and the '
+    help += 'crontab is written when the touch jobs change and checked every '
+    help += '{} runs'.format(CRONTAB_CHECK_RUNS)
+    parser.add_argument('--once',
+                        help=help,
+                        action='store_true')
+    # Read only the log lines appended since the previous loop
+    help = 'Read only new cron log lines each loop, resuming from the '
+    help += 'checkpoint in the state file after a restart'
+    parser.add_argument('-i', '--incremental',
+                        help=help,
+                        action='store_true')
+    default = os.path.join(os.getenv('HOME', '.'), '.pythontest-state.json')
+    help = 'Specify a state file location for checkpoints and rotation, '
+    help += '(default: {})'.format(default)
+    parser.add_argument('-s', '--state-file',
+                        dest='state_file',
+                        help=help,
+                        metavar='FILESTATE',
+                        action='store',
+                        default=default)
+    # Central log host: count every host's syslog, one worker process per log
+    help = 'Specify a directory or glob pattern of syslogs collected from '
+    help += 'other hosts, ex. "/var/log/remote/*.log", to count each host into '
+    help += 'its own touch files ("<host>-<file>") and all hosts into --file'
+    parser.add_argument('--hosts',
+                        dest='hosts',
+                        help=help,
+                        metavar='LOGS',
+                        action='store',
+                        default=None)
+    default = 0
+    help = 'Specify the worker processes reading --hosts logs, 0 for one per '
+    help += 'CPU core (default: {})'.format(default)
+    parser.add_argument('--jobs',
+                        dest='jobs',
+                        help=help,
+                        metavar='PROCESSES',
+                        action='store',
+                        default=default,
+                        type=int)
+    # Backfill reports from an archived log on a simulated clock
+    help = 'Replay an archived syslog instead of following --cron-log: run '
+    help += 'the loops on a simulated clock, without sleeping, and write the '
+    help += 'touch file appends and rotations that would have happened'
+    parser.add_argument('--replay',
+                        dest='replay',
+                        help=help,
+                        metavar='LOG',
+                        action='store',
+                        default=None)
+    help = 'Specify when the replay starts, YYYY-MM-DDTHH:MM:SS in --log-timezone, '
+    help += 'with an optional UTC offset (default: first line of the log)'
+    parser.add_argument('--replay-start',
+                        dest='replay_start',
+                        help=help,
+                        metavar='TIME',
+                        action='store',
+                        default=None)
+    help = 'Specify when the replay ends (default: last line of the log)'
+    parser.add_argument('--replay-end',
+                        dest='replay_end',
+                        help=help,
+                        metavar='TIME',
+                        action='store',
+                        default=None)
+    # One process follows the cron log for any number of local readers
+    help = 'Run as the event broker instead of looping: follow --cron-log '
+    help += 'once and publish its cron events, warnings and errors on this '
+    help += 'Unix domain socket to --broker clients, keeping the longest '
+    help += '--window/--report-window of events for new clients'
+    parser.add_argument('--serve-broker',
+                        dest='serve_broker',
+                        help=help,
+                        metavar='SOCKET',
+                        action='store',
+                        default=None)
+    help = 'Read the cron events, warnings and errors of these touch files '
+    help += 'from the event broker listening on this socket (see '
+    help += '--serve-broker) instead of reading --cron-log'
+    parser.add_argument('--broker',
+                        dest='broker',
+                        help=help,
+                        metavar='SOCKET',
+                        action='store',
+                        default=None)
+    # One event loop for every schedule, Python 3.7 or later
+    help = 'Run each touch rate\'s reports, and --watch, as tasks on one '
+    help += 'asyncio event loop, crontab commands as asyncio subprocesses '
+    help += 'and file reads, writes and compression in a thread pool'
+    parser.add_argument('--asyncio',
+                        help=help,
+                        action='store_true')
+    default = 4
+    help = 'Specify the threads for blocking work with --asyncio '
+    help += '(default: {})'.format(default)
+    parser.add_argument('--workers',
+                        dest='workers',
+                        help=help,
+                        metavar='THREADS',
+                        action='store',
+                        default=default,
+                        type=int)
+    # Rotated touch files are indexed by time in <prefix>.index as they rotate
+    help = 'Query the rotated touch files of every --prefix instead of looping: '
+    help += 'print their report, alert, touch and event counts from this time on, '
+    help += 'YYYY-MM-DDTHH:MM:SS in UTC like the touch file records, with an '
+    help += 'optional UTC offset, or seconds since the epoch'
+    parser.add_argument('--query-start',
+                        dest='query_start',
+                        help=help,
+                        metavar='TIME',
+                        action='store',
+                        default=None)
+    help = 'Specify when the query ends (default: now)'
+    parser.add_argument('--query-end',
+                        dest='query_end',
+                        help=help,
+                        metavar='TIME',
+                        action='store',
+                        default=None)
+    help = 'Also print the touch file records from --query-start to --query-end'
+    parser.add_argument('--query-records',
+                        dest='query_records',
+                        help=help,
+                        action='store_true')
     # options replaces args, only known args are needed
     options, args = parser.parse_known_args(sys_argv)
     exit_code, description = validate_args(args=options)
@@ -118,10 +425,33 @@ def validate_args(args=None):
       --rate: integer value > 0
       --prefix: write permission on existing directory name required
       --how-long: integer value >= 0
+      --window, --report-window: integer value > 0
+      --log-timezone: "local" or a UTC offset
+      --rules: readable JSON file of valid rules
       --user: must be root unless --test present
       --test: false unless --test present
       --cron-log: write permission on existing file name required
       --backup: hidden, disabled - but backs up the current crontab
+      --targets: readable JSON file of valid --file, --rate, --prefix values
+      --state-file: write permission on existing directory name required
+      --rotate-*, --keep, --keep-bytes: integer value >= 0
+      --metrics-prom, --metrics-json, --profile-output: write permission on
+        existing directory name required
+      --debounce: number >= 0
+      --hosts: at least one log file, not with --incremental, --watch,
+        --replay or --broker
+      --replay: readable log file, not with --incremental or --watch
+      --replay-start, --replay-end: date and times, start before end
+      --jobs: integer value >= 0
+      --serve-broker: write permission on existing directory name required,
+        not with --hosts, --replay, --incremental, --watch or --broker
+      --broker: not with --hosts, --replay, --incremental or --watch
+      --asyncio: Python 3.7 or later, not with --replay or --serve-broker
+      --once: not with --watch, --replay, --serve-broker or --asyncio
+      --workers: integer value > 0
+      --query-start, --query-end: date and times, start before end, not with
+        --watch, --replay, --serve-broker, --asyncio or --once; the other
+        checks, superuser included, are skipped as only indexes are read
       Also: Per README.md section (1.b),
         the SYSTEM crontab is to be used, not the USER's
     :param args: command line arguments namespace
@@ -130,40 +460,230 @@ def validate_args(args=None):
     :rtype: tuple (int, string)
     """
     try:
+        if args.query_start is not None:
+            # Only the prefixes' indexes are read, no crontab, cron log or state file
+            if args.watch or args.replay is not None or args.serve_broker is not None or args.asyncio or args.once:
+                msg = 'argument --query-start: not allowed with --watch, --replay, '
+                msg += '--serve-broker, --asyncio or --once'
+                return 1, msg
+            try:
+                start, end = query_range(args)
+            except ValueError as err:
+                return 1, 'argument --query-start or --query-end: ' + str(err)
+            if start > end:
+                return 1, 'argument --query-start ' + args.query_start + ': after --query-end'
+            if args.targets is not None:
+                try:
+                    load_targets(args.targets, args.frequency, args.rename)
+                except (IOError, OSError, ValueError) as err:
+                    return 1, 'argument --targets ' + args.targets + ': ' + str(err)
+            LOGGER.debug('Command line option checks for the query all passed')
+            return 0, 'success'
         username = os.getenv('USER', 'unprivileged user')
         if username != 'root' and not args.test:
             msg = 'Superuser needed, current user is ' + format(username)
             msg += '\n\tFor unprivileged users, try hidden option --test'
             return 1, msg
-        msg = 'invalid path or write permissions needed, argument --file '
-        msg += args.touch
-        if not os.access(os.path.dirname(args.touch), os.W_OK):
-            return 1, msg
-        if os.path.isfile(os.path.abspath(args.touch)):
-            if not os.access(args.touch, os.W_OK):
+        if args.targets is not None:
+            try:
+                targets = load_targets(args.targets, args.frequency, args.rename)
+            except (IOError, OSError, ValueError) as err:
+                return 1, 'argument --targets ' + args.targets + ': ' + str(err)
+            for target in targets:
+                exit_code, msg = target.validate()
+                if exit_code != 0:
+                    return exit_code, 'argument --targets ' + args.targets + ': ' + msg
+        else:
+            msg = 'invalid path or write permissions needed, argument --file '
+            msg += args.touch
+            if not os.access(os.path.dirname(args.touch), os.W_OK):
                 return 1, msg
-        if args.frequency <= 0:
-            msg = 'positive integer needed, argument --rate ' + args.frequency
-            return 1, msg
-        if not os.access(os.path.dirname(args.rename), os.W_OK):
-            msg = 'invalid path or write permissions needed, argument '
-            msg += '--prefix ' + args.rename
+            if os.path.isfile(os.path.abspath(args.touch)):
+                if not os.access(args.touch, os.W_OK):
+                    return 1, msg
+            if args.frequency <= 0:
+                msg = 'positive integer needed, argument --rate ' + format(args.frequency)
+                return 1, msg
+            if not os.access(os.path.dirname(args.rename), os.W_OK):
+                msg = 'invalid path or write permissions needed, argument '
+                msg += '--prefix ' + args.rename
+                return 1, msg
+        if args.window <= 0 or [minutes for minutes in args.report_windows if minutes <= 0]:
+            msg = 'positive integer needed, argument --window or --report-window '
+            msg += format([args.window] + args.report_windows)
             return 1, msg
+        if args.log_timezone != 'local':
+            try:
+                parse_offset(args.log_timezone)
+            except ValueError as err:
+                return 1, 'argument --log-timezone: ' + str(err)
+        if args.rules is not None:
+            try:
+                load_rules(args.rules)
+            except (IOError, OSError, ValueError, re.error) as err:
+                return 1, 'argument --rules ' + args.rules + ': ' + str(err)
         if args.duration < 0:
             msg = 'zero or positive integer needed, argument --rate '
             msg += format(args.duration)
             return 1, msg
-        if not os.access(args.logfile, os.R_OK):
+        if args.hosts is not None:
+            msg = check_hosts(args.hosts)
+            if msg is not None:
+                return 1, msg
+            if args.incremental or args.watch or args.replay is not None or args.broker is not None:
+                return 1, 'argument --hosts: not allowed with --incremental, --watch, --replay or --broker'
+        elif args.broker is not None:
+            if args.replay is not None or args.incremental or args.watch or args.serve_broker is not None:
+                return 1, 'argument --broker: not allowed with --replay, --incremental, --watch or --serve-broker'
+        elif args.replay is not None:
+            if not os.access(args.replay, os.R_OK):
+                return 1, 'invalid path or read permissions needed, argument --replay ' + args.replay
+            if args.incremental or args.watch:
+                return 1, 'argument --replay: not allowed with --incremental or --watch'
+            try:
+                start, end = replay_range(args)
+            except ValueError as err:
+                return 1, 'argument --replay-start or --replay-end: ' + str(err)
+            if start is None or end is None or start > end:
+                return 1, 'argument --replay ' + args.replay + ': no time range to replay'
+        elif not os.access(args.logfile, os.R_OK):
             msg = 'invalid path or read permissions needed, argument '
             msg += '--cron-log ' + args.logfile
             msg += '\n\tTry hidden argument --cron-log LOG_FILE'
             return 1, msg
+        if args.serve_broker is not None:
+            if args.hosts is not None or args.replay is not None or args.incremental or args.watch:
+                return 1, 'argument --serve-broker: not allowed with --hosts, --replay, --incremental or --watch'
+            if not os.access(os.path.dirname(os.path.abspath(args.serve_broker)), os.W_OK):
+                msg = 'invalid path or write permissions needed, argument '
+                msg += '--serve-broker ' + args.serve_broker
+                return 1, msg
+        if args.once:
+            if args.watch or args.replay is not None or args.serve_broker is not None or args.asyncio:
+                return 1, 'argument --once: not allowed with --watch, --replay, --serve-broker or --asyncio'
+        if args.asyncio:
+            if sys.version_info < (3, 7):
+                return 1, 'argument --asyncio needs Python 3.7 or later'
+            if args.replay is not None or args.serve_broker is not None:
+                return 1, 'argument --asyncio: not allowed with --replay or --serve-broker'
+        if args.workers <= 0:
+            msg = 'positive integer needed, argument --workers '
+            msg += format(args.workers)
+            return 1, msg
+        if args.jobs < 0:
+            msg = 'zero or positive integer needed, argument --jobs '
+            msg += format(args.jobs)
+            return 1, msg
+        if args.debounce < 0:
+            msg = 'zero or positive number needed, argument --debounce '
+            msg += format(args.debounce)
+            return 1, msg
+        if not os.access(os.path.dirname(os.path.abspath(args.state_file)), os.W_OK):
+            msg = 'invalid path or write permissions needed, argument '
+            msg += '--state-file ' + args.state_file
+            return 1, msg
+        for option in ('metrics_prom', 'metrics_json', 'profile_output'):
+            filename = getattr(args, option)
+            if filename is not None and not os.access(os.path.dirname(os.path.abspath(filename)), os.W_OK):
+                msg = 'invalid path or write permissions needed, argument --'
+                msg += option.replace('_', '-') + ' ' + filename
+                return 1, msg
+        if args.profile == 'tracemalloc' and sys.version_info < (3, 4):
+            return 1, 'argument --profile tracemalloc needs Python 3.4 or later'
+        for option in ('rotate_loops', 'rotate_size', 'rotate_lines', 'rotate_age', 'keep', 'keep_bytes'):
+            if getattr(args, option) < 0:
+                msg = 'zero or positive integer needed, argument --'
+                msg += option.replace('_', '-') + ' ' + format(getattr(args, option))
+                return 1, msg
         LOGGER.debug('Command line option checks all passed')
         return 0, 'success'
     except Exception as err:
         return 1, err
 
 
+def check_hosts(pattern):
+    """
+    :param pattern: --hosts directory or glob pattern
+    :ptype pattern: string
+    :return: why the host logs cannot be read, None if they can
+    :rtype: string
+    """
+    from hosts import find_host_logs
+    try:
+        if not find_host_logs(pattern):
+            return 'no log files found, argument --hosts ' + pattern
+    except (IOError, OSError, ValueError) as err:
+        return 'argument --hosts ' + pattern + ': ' + str(err)
+    return None
+
+
+def replay_range(args):
+    """
+    :param args: command line arguments namespace, with --replay
+    :ptype args: parser.parse_known_args object
+    :return: replay start and end, seconds since the epoch, the log's
+        first and last time stamps unless given (None if not found)
+    :rtype: tuple (float, float)
+    """
+    # RFC3164 stamps have no year, infer it from when the archive was last written
+    written = os.path.getmtime(args.replay)
+    timestamps = TimestampParser(timezone=args.log_timezone)
+    first, last = log_time_range(args.replay, lambda line: timestamps.parse(to_native(line), written))
+    if args.replay_start is not None:
+        first = parse_time(args.replay_start, args.log_timezone)
+    if args.replay_end is not None:
+        last = parse_time(args.replay_end, args.log_timezone)
+    return first, last
+
+
+def query_range(args):
+    """
+    :param args: command line arguments namespace, with --query-start
+    :ptype args: parser.parse_known_args object
+    :return: query start and end, seconds since the epoch, end defaults to now
+    :rtype: tuple (float, float)
+    """
+    # Touch file records are stamped in UTC
+    start = parse_time(args.query_start, 'UTC')
+    end = parse_time(args.query_end, 'UTC') if args.query_end is not None else time.time()
+    return start, end
+
+
+def query_archive(args, log):
+    """
+    Answer --query-start/--query-end from each prefix's index of rotated
+    touch files, see archive.ArchiveIndex, printed as JSON. Runs without
+    Ops, nothing but the indexes and archives is read.
+    :param args: valid command line options, with --query-start
+    :ptype args: argparse.ArgumentParser.parse_known_args object
+    :param log: pre-configured logger
+    :pytpe log: logging.getLogger object
+    :return: None
+    """
+    from archive import ArchiveIndex
+    if args.targets is not None:
+        prefixes = [target.rename for target in load_targets(args.targets, args.frequency, args.rename)]
+    else:
+        prefixes = [args.rename]
+    start, end = query_range(args)
+    results = []
+    for prefix in sorted(set(prefixes)):
+        try:
+            result = ArchiveIndex(prefix).query(start, end, records=args.query_records)
+        except (IOError, OSError) as err:
+            log.error(err, exc_info=True)
+            exit(1)
+        result['prefix'] = prefix
+        results.append(result)
+        log.info('queried {} rotated touch files, {} read'.format(result['files'], len(result['opened'])))
+        if result['missing']:
+            log.warning('{} rotated touch files no longer exist, their records in range '
+                        'are not counted'.format(len(result['missing'])))
+    print(json.dumps({'start': datetime.datetime.utcfromtimestamp(start).isoformat(),
+                      'end': datetime.datetime.utcfromtimestamp(end).isoformat(),
+                      'prefixes': results}, sort_keys=True, indent=4))
+
+
 def setup_logger(level=logging.ERROR):
     """
     Setup console or other logging for debugging, metrics, stats, etc.
@@ -181,12 +701,12 @@ def setup_logger(level=logging.ERROR):
     log_fmt += '%(message)s'
     logging.basicConfig(format=log_fmt, level=level)
     # Create random ASCII eight character string for uniqueness
-    log_uuid = ''.join(random.choice(string.ascii_letters + string.digits)
-                       for _ in range(8))
-    # Remote logging to syslog, incl. user and hostname
+    log_uuid = binascii.hexlify(os.urandom(4)).decode('ascii')
+    # Remote logging to syslog, incl. user and hostname, the node name
+    # rather than socket.getfqdn(), a DNS lookup that can take seconds
     log_name = 'log {}:{}@{}'.format(log_uuid,
                                      os.getenv('USER', 'user'),
-                                     getfqdn())
+                                     os.uname()[1])
     logger = logging.getLogger(name=log_name)
     logger.debug('Logging enabled')
     return logger
@@ -213,13 +733,108 @@ class Ops(object):
         """
         self.args = args
         self.log = log
+        if self.args.targets is not None:
+            self.targets = load_targets(self.args.targets, self.args.frequency, self.args.rename)
+        else:
+            self.targets = [Target(self.args.touch, self.args.frequency, self.args.rename)]
+        self.crontab = Crontab(log=self.log)
+        self.metrics = Metrics(prometheus=self.args.metrics_prom,
+                               stats=self.args.metrics_json,
+                               log=self.log)
+        self.profiler = None
+        if self.args.profile is not None:
+            self.profiler = Profiler(self.args.profile, self.args.profile_output, log=self.log)
+            self.profiler.start()
+        self.writer = TouchWriter(durability=self.args.durability,
+                                  touch_format=self.args.touch_format,
+                                  log=self.log)
         self._crontab_backup = None
         self._crontab_runtime = None
-        self._standard_loop_starttime = time.time()
+        self.clock = SystemClock()
+        self.replay = None
+        if self.args.replay is not None:
+            self._setup_replay()
+        self._standard_loop_starttime = self.clock.time()
         self._standard_loop_runtime = None
         self._standard_loop_count = 0
+        self._standard_loop_deadline = None
+        self._reported_events = set()
         self._standard_loop_maxtime = self.args.duration * 60  # convert minutes to seconds
+        if self.replay is not None:
+            # The last loop is the first one at or after the end of the replay
+            self._standard_loop_maxtime = self._replay_end - self._standard_loop_starttime + self._loop_period
         self.recent_events = {}
+        self.incremental = self.args.incremental or self.args.watch or self.args.once
+        self.executor = self._thread_pool() if self.args.asyncio else None
+        self.state = StateFile(self.args.state_file, log=self.log)
+        self.rotator = Rotator(self.state,
+                               log=self.log,
+                               loops=self.args.rotate_loops,
+                               max_bytes=self.args.rotate_size,
+                               max_lines=self.args.rotate_lines,
+                               max_age=self.args.rotate_age * 60,
+                               compress=self.args.compress,
+                               keep=self.args.keep,
+                               keep_bytes=self.args.keep_bytes,
+                               clock=self.clock,
+                               executor=self.executor,
+                               index=True)
+        self._checkpoint = None
+        self.rules = load_rules(self.args.rules) if self.args.rules is not None else None
+        self.reader = EventReader(self.targets, timezone=self.args.log_timezone, rules=self.rules)
+        self.hosts = self._host_pool() if self.args.hosts is not None else None
+        self.host_targets = {}
+        self.broker = self._broker_client() if self.args.broker is not None else None
+        self.windows = WindowAggregator(primary=self.args.window,
+                                        windows=self.args.report_windows)
+
+    def _thread_pool(self):
+        """
+        :return: the bounded thread pool for blocking work with --asyncio
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        return ThreadPoolExecutor(max_workers=self.args.workers)
+
+    def _host_pool(self):
+        """
+        :return: worker processes reading the --hosts logs
+        :rtype: hosts.HostPool
+        """
+        from hosts import HostPool
+        return HostPool(self.args.hosts, processes=self.args.jobs or None)
+
+    def _broker_client(self):
+        """
+        :return: subscription to the --broker for every cron event, warning
+            and error, the events the windows count in local mode
+        :rtype: broker.BrokerClient
+        """
+        from broker import BrokerClient
+        # Not only these touch files: the windows also count every cron
+        # event, see _broker_events
+        return BrokerClient(self.args.broker,
+                            severities=['cron'] + list(SEVERITY_CATEGORIES),
+                            log=self.log)
+
+    def _setup_replay(self):
+        """
+        Read --replay instead of the cron log, on a simulated clock that
+        starts at --replay-start. Each loop reads the archive only up to
+        the lines logged by the simulated time, see ReplayCursor.
+        :return: None
+        """
+        start, self._replay_end = replay_range(self.args)
+        self.clock = VirtualClock(start)
+        self.args.logfile = self.args.replay
+        # A parser of its own, stamps are read relative to the end of the replay
+        timestamps = TimestampParser(timezone=self.args.log_timezone)
+        self.replay = ReplayCursor(self.args.replay,
+                                   lambda line: timestamps.parse(to_native(line), self._replay_end))
+        msg = 'replaying {} from {} to {}'.format(self.args.replay,
+                                                 datetime.datetime.utcfromtimestamp(start).isoformat(),
+                                                 datetime.datetime.utcfromtimestamp(self._replay_end).isoformat())
+        self.log.info(msg)
 
     def __enter__(self):
         """
@@ -235,11 +850,22 @@ class Ops(object):
         :return: exit code 
         :rtype: int
         """
+        self.writer.close()
+        self.rotator.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        if self.hosts is not None:
+            self.hosts.close()
+        if self.broker is not None:
+            self.broker.close()
+        if self.profiler is not None:
+            self.profiler.stop()
         exit(0)
 
     def new_cronjob(self):
         """
-        Aggregate sub-methods to add a new job to crontab
+        Aggregate sub-methods to add a new job to crontab, the crontab
+        is read once and written at most once
         :return: None 
         """
         self._cron_backup()
@@ -247,19 +873,18 @@ class Ops(object):
 
     def _cron_addnew(self):
         """
-        Append the new job, avoiding duplicates, and call
-        sub-method to overwrite entire crontab  
+        Add the new jobs, one per target, replacing a job touching the same
+        file at another rate, and call sub-method to overwrite entire crontab  
         :return: new crontab text
         :rtype: string
         """
-        # Format the new cronjob to run at the requested rate and touch the requested file
-        crontab_newjob = '*/{} * * * * touch {}'.format(self.args.frequency, self.args.touch)
-        self.log.info('new crontab job "{}"'.format(crontab_newjob))
-        crontab_alljobs = (self._crontab_runtime + '\n' + crontab_newjob).strip()
-
+        # Format the new cronjobs to run at the requested rate and touch the requested file
+        for target in self.targets:
+            self.log.info('new crontab job "{}"'.format(target.cronjob))
         # Do not add the new cronjob again, that would be silly
-        if crontab_newjob not in self._cron_runtime():
-            return self._cron_overwrite(crontab_alljobs)
+        crontab_newjobs = self.crontab.replace([target.cronjob for target in self.targets])
+        if crontab_newjobs:
+            return self._cron_overwrite('\n'.join(crontab_newjobs))
         else:
             self.log.debug('self._crontab_runtime\n' + self._crontab_runtime)
             self.log.info('crontab job exists')
@@ -267,60 +892,61 @@ class Ops(object):
 
     def _cron_overwrite(self, newjobs=None):
         """
-        Accept the new job and append it to the current one using system commands 
-        :param newjobs: crontab job(s) to append separated by newlines
+        Write the changed crontab, with the new jobs, in one system command
+        :param newjobs: crontab job(s) added, separated by newlines
         :ptype newjobs: string
         :return: new crontab text
         :rtype: string
         """
+        from subprocess import CalledProcessError
         if newjobs is not None:
             try:
-                cmd_echo = shlex.split('echo "{}"'.format(newjobs.strip()))
-                proc_echo = subprocess.Popen(cmd_echo, stdout=subprocess.PIPE)
-                cmd_crontab_pipe = shlex.split('crontab - ')
-                proc_crontab_pipe = subprocess.Popen(cmd_crontab_pipe,
-                                                     stdin=proc_echo.stdout,
-                                                     stdout=subprocess.PIPE)
-                proc_echo.stdout.close()  # Allow proc_echo to receive a SIGPIPE if proc_crontab_pipe exits
-                proc_crontab_pipe.wait()
-                self.log.debug('self._crontab_runtime\n' + self._cron_runtime())
+                self.crontab.commit()
+                if self.args.verify_crontab and not self.crontab.verify():
+                    self.log.error('crontab differs from the jobs written')
+                    exit(1)
+                self._crontab_runtime = self.crontab.text
+                self.log.debug('self._crontab_runtime\n' + self._crontab_runtime)
                 self.log.info('crontab job added')
-                return self._cron_runtime()
-            except subprocess.CalledProcessError as err:
+                return self._crontab_runtime
+            except (CalledProcessError, OSError) as err:
                 self.log.error(err, exc_info=True)
                 exit(1)
-            except Exception as err:
-                raise Exception(err)
         else:
             self.log.error('Missing argument newjobs', exc_info=True)
             exit(1)
 
+    def _cron_check(self):
+        """
+        Read the crontab with one `crontab -l` and install the touch jobs
+        again if they were removed or changed since they were written
+        :return: None
+        """
+        self._cron_runtime()
+        crontab_newjobs = self.crontab.replace([target.cronjob for target in self.targets])
+        if crontab_newjobs:
+            self.log.warning('crontab jobs missing, installing "{}"'.format('", "'.join(crontab_newjobs)))
+            self._cron_overwrite('\n'.join(crontab_newjobs))
+        else:
+            self.log.debug('crontab jobs checked')
+
     def _cron_runtime(self):
         """
         Read, store current crontab using system calls 
         :return: new crontab text
         :rtype: string
         """
-        # Capture the current crontab
-        cmd_crontab_l = shlex.split('crontab -l')
-        proc_crontab_l = subprocess.Popen(cmd_crontab_l,
-                                          stdout=subprocess.PIPE,
-                                          stderr=subprocess.STDOUT)
-        returncode = proc_crontab_l.wait()
-        stdoutdata = proc_crontab_l.communicate()[0].strip()
-
-        # If no crontab exists, then add comment or empty string
-        if stdoutdata.startswith('no crontab for'):
-            stdoutdata = ''
-        # For other non-success responses, raise an exception
-        elif returncode != 0:
-            self.log.error(subprocess.CalledProcessError(returncode, cmd_crontab_l, stdoutdata),
-                           exc_info=True)
+        from subprocess import CalledProcessError
+        try:
+            # Read once, the asyncio runtime may have read it already
+            if self.crontab.lines is None:
+                self.crontab.read()
+            self._crontab_runtime = self.crontab.original
+        except (CalledProcessError, OSError) as err:
+            self.log.error(err, exc_info=True)
             exit(1)
-        self._crontab_runtime = stdoutdata
-        stdoutjson = json.dumps(stdoutdata.strip().split('\n'), indent=4)
+        stdoutjson = json.dumps(self._crontab_runtime.strip().split('\n'), indent=4)
         self.log.debug('self._crontab_runtime...\n' + stdoutjson)
-        self.log.info('crontab jobs read')
         return self._crontab_runtime
 
     def _cron_backup(self):
@@ -342,14 +968,84 @@ class Ops(object):
                 self.log.error(err, exc_info=True)
         return self._crontab_backup
 
+    @property
+    def _loop_period(self):
+        """
+        :return: seconds between loops, the fastest touch rate
+        :rtype: int
+        """
+        return min(target.frequency for target in self.targets) * 60
+
     def _pause_loop(self):
         """
-        Pause standard_loop (indirectly via _try_one_exec)
+        Pause standard_loop (indirectly via _try_one_exec) until the next
+        loop is due, on a fixed-rate schedule so the time spent parsing
+        does not make the loop drift
+        :return: None
+        """
+        if self._standard_loop_deadline is None:
+            self._standard_loop_deadline = self.clock.monotonic()
+        self._standard_loop_deadline = next_deadline(self._standard_loop_deadline, self._loop_period,
+                                                     now=self.clock.monotonic())
+        pause_seconds = max(0, self._standard_loop_deadline - self.clock.monotonic())
+        self.log.info('pausing loop {} min'.format(str(self._loop_period // 60)))
+        self.clock.sleep(pause_seconds)
+
+    def watch_loop(self):
+        """
+        Event driven alternative to standard_loop: report on a drift free
+        schedule and, between reports, wake up as soon as the cron log
+        changes to read the new log lines and report any new warnings or
+        errors straight away. The touch files are not watched, the loop
+        writes them itself and would wake itself up.
+        :return: None
+        """
+        from watcher import make_watcher
+        watcher = make_watcher([self.args.logfile], log=self.log)
+        self._standard_loop_deadline = self.clock.monotonic()
+        try:
+            while self.args.duration == 0 or not self._exceeded_duration():
+                timeout = self._standard_loop_deadline - self.clock.monotonic()
+                if self.args.duration != 0:
+                    timeout = min(timeout, self._standard_loop_maxtime - self._standard_loop_runtime)
+                if self._standard_loop_deadline <= self.clock.monotonic():
+                    self._run_phases()
+                    self.metrics.export()
+                    self._reported_events = set(message['message'] for message in
+                                                self.recent_events.get('messages', []))
+                    self._standard_loop_deadline = next_deadline(self._standard_loop_deadline,
+                                                                 self._loop_period,
+                                                                 now=self.clock.monotonic())
+                    self.log.info('waiting for changes, up to {:.0f}s'.format(
+                        self._standard_loop_deadline - self.clock.monotonic()))
+                elif watcher.wait(timeout, debounce=self.args.debounce):
+                    self._report_new_events()
+        except KeyboardInterrupt:
+            self.log.warning('loop terminated by request')
+            exit(0)
+        finally:
+            watcher.close()
+
+    def _report_new_events(self):
+        """
+        Read the new cron log lines and append warnings and errors not
+        reported before to the touch files
         :return: None
         """
-        pause_seconds = self.args.frequency * 60
-        self.log.info('pausing loop {} min'.format(str(self.args.frequency)))
-        time.sleep(pause_seconds)
+        self.parse_logfile()
+        messages = self.recent_events.get('messages', [])
+        new_events = [self._format_message(message) for message in messages
+                      if message['message'] not in self._reported_events]
+        self._reported_events = set(message['message'] for message in messages)
+        if not new_events:
+            self.log.debug('no new warnings or errors')
+            return
+        record = {'kind': 'alert',
+                  'start': self.recent_events.get('start'),
+                  'events': new_events}
+        for target in self.targets:
+            self._append_touchfile(target, record)
+        self._commit_touchfiles()
 
     def standard_loop(self):
         """
@@ -357,7 +1053,7 @@ class Ops(object):
          README.md section (1.a.iv.)
         :return: None
         """
-        if self.args.duration == 0:
+        if self._standard_loop_maxtime == 0:
             # Run forever, unless interrupted by signals
             while True:
                 self._try_one_exec()
@@ -374,7 +1070,7 @@ class Ops(object):
           non-zero values in self.args.duration
         :return: None
         """
-        self._standard_loop_runtime = time.time() - self._standard_loop_starttime
+        self._standard_loop_runtime = self.clock.time() - self._standard_loop_starttime
         self.log.debug('runtime = {}'.format(self._standard_loop_runtime))
         self.log.debug('maxtime = {}'.format(self._standard_loop_maxtime))
         if self._standard_loop_runtime >= self._standard_loop_maxtime:
@@ -392,128 +1088,461 @@ class Ops(object):
         :rtype : int
         """
         try:
-            self._standard_loop_count += 1
-            self.parse_logfile()
-            self.update_touchfile()
-            self.rotate_touchfile()
-            self._pause_loop()
+            self._run_phases()
+            with self.metrics.phase('pause'):
+                self._pause_loop()
+            self.metrics.export()
         except KeyboardInterrupt:
             self.log.warning('loop terminated by request')
             exit(0)
 
-    def update_touchfile(self):
+    def _run_phases(self, targets=None, loop_count=None, parse=True, rotate=True):
+        """
+        One loop of parse, update and rotate, timed per phase; the caller
+        exports the loop's metrics once the loop is complete
+        :param targets: touch file targets to update and rotate (default: all)
+        :ptype targets: list of Target
+        :param loop_count: loops run by these targets' schedule, for
+            rotation (default: loops run)
+        :ptype loop_count: int
+        :param parse: False to reuse the events parsed by the previous loop
+        :ptype parse: bool
+        :param rotate: False to leave the rotation to a _rotate_phase() call
+        :ptype rotate: bool
+        :return: None
+        """
+        self._standard_loop_count += 1
+        self.metrics.count('loops')
+        if self._standard_loop_deadline is not None:
+            self.metrics.gauge('schedule_lag_seconds',
+                               max(0.0, self.clock.monotonic() - self._standard_loop_deadline))
+        if parse:
+            with self.metrics.phase('parse'):
+                self.parse_logfile()
+        with self.metrics.phase('update'):
+            self.update_touchfile(targets)
+        if rotate:
+            self._rotate_phase(targets, loop_count)
+
+    def _rotate_phase(self, targets=None, loop_count=None):
+        """
+        The rotate phase of a loop
+        :param targets: touch file targets to rotate (default: all)
+        :ptype targets: list of Target
+        :param loop_count: see _run_phases
+        :ptype loop_count: int
+        :return: None
+        """
+        with self.metrics.phase('rotate'):
+            self.rotate_touchfile(targets, loop_count)
+
+    def update_touchfile(self, targets=None):
         """
         Per README.md section (c.) update
-        the touch file with parsed logfile information
+        the touch files with parsed logfile information
+        :param targets: touch file targets to update (default: all)
+        :ptype targets: list of Target
         :return: None
         """
+        if targets is None:
+            targets = self.targets
         if self.recent_events:
-            touch_append = self.recent_events.get('start')
-            touch_append += ': cron touch command events count '
-            touch_append += str(self.recent_events.get('count'))
-            other_events = [event for event in self.recent_events.get('events', [])
-                            if 'warning' in event.lower() or 'error' in event.lower()]
-            # other_events = [event for event in self.recent_events.get('events', [])
-            #                 if 'CMD (touch {})'.format(self.args.touch) not in event]
-            # other_events = self.recent_events.get('events', [])
-            if len(other_events) > 0:
-                msg = 'Found {} interesting events '.format(len(other_events))
-                msg += "in self.recent_events['events'][0:{}]".format(len(self.recent_events.get('events', [])))
-                self.log.debug(msg)
-                touch_append += ', {} other events:\n'.format(len(other_events))
-                touch_append += json.dumps(other_events, sort_keys=True, indent=4) + '\n'
-            if '\n' in touch_append:
-                self.log.debug('Appended...\n{}\n...to touch file "{}"'.format(touch_append.strip(),
-                                                                               self.args.touch))
-            else:
-                self.log.debug('Appended "{}" to touch file "{}"'.format(touch_append.strip(),
-                                                                         self.args.touch))
-            try:
-                with open(self.args.touch, 'at') as filehandle:
-                    filehandle.write(touch_append.strip() + '\n')
-                self.log.info('cron event information appended to touch file')
-            except Exception as err:
-                self.log.error(err, exc_info=True)
-                exit(1)
+            for target in targets:
+                self._update_one_touchfile(target)
+            for host, host_events in sorted(self.recent_events.get('hosts', {}).items()):
+                for target, touch_target in zip(self.targets, self.host_targets[host]):
+                    if target in targets:
+                        self._update_one_touchfile(touch_target, host_events)
+            self._commit_touchfiles()
         else:
             self.log.debug('No keys in self.recent_events')
 
+    def _update_one_touchfile(self, target, events=None):
+        """
+        Queue a target's touch count, and the warnings and errors found,
+        for its touch file
+        :param target: touch file target
+        :ptype target: Target
+        :param events: counts and warnings and errors, a host's from
+            self.recent_events['hosts'] (default: self.recent_events)
+        :ptype events: dict
+        :return: None
+        """
+        if events is None:
+            events = self.recent_events
+        counts = events['targets'][target.touch]
+        other_events = events.get('other_events', [])
+        if len(other_events) > 0:
+            msg = 'Found {} warning or error events '.format(len(other_events))
+            msg += 'for touch file "{}"'.format(target.touch)
+            self.log.debug(msg)
+        record = {'kind': 'report',
+                  'start': self.recent_events.get('start'),
+                  'count': counts[self.args.window],
+                  'windows': dict((minutes, count) for minutes, count in counts.items()
+                                  if minutes != self.args.window),
+                  'events': other_events}
+        self._append_touchfile(target, record)
+
+    def _append_touchfile(self, target, record):
+        """
+        Queue a record for a target's touch file, see _commit_touchfiles
+        :param target: touch file target
+        :ptype target: Target
+        :param record: report, see writer.format_record
+        :ptype record: dict
+        :return: None
+        """
+        touch_append = self.writer.append(target.touch, record)
+        self.rotator.note_append(target.touch, touch_append)
+        if '\n' in touch_append.strip():
+            self.log.debug('Appended...\n{}\n...to touch file "{}"'.format(touch_append.strip(),
+                                                                           target.touch))
+        else:
+            self.log.debug('Appended "{}" to touch file "{}"'.format(touch_append.strip(),
+                                                                     target.touch))
+
+    def _commit_touchfiles(self):
+        """
+        Write the queued records, one batch per touch file
+        :return: None
+        """
+        try:
+            self.writer.commit()
+            self.log.info('cron event information appended to touch file')
+        except Exception as err:
+            self.log.error(err, exc_info=True)
+            exit(1)
+
     def parse_logfile(self):
         """
         Per README.md section (c.) read the 
         the cron logfile and store events within the accepted time
-        window (last 7 minutes)
-        :return: log file review results from last 7 minutes
+        window (last 7 minutes, see --window)
+        :return: log file review results from the window
         :rtype: dict
         """
-        history_minutes = 7
-        start = datetime.datetime.utcnow()
-        touch_count = 0
-        cron_events = []
-        re.compile(r' CROND\[[0-9][0-9]*\]: \(.*\) CMD')
+        now = self.clock.time()
+        start = datetime.datetime.utcfromtimestamp(now)
         self.recent_events = {}
         try:
-            # Assuming entire file fits in memory, otherwise... boom.
-            for line in reversed(open(self.args.logfile, 'rt').readlines()):
-                if ' CROND[' in line:
-                    # Current four digit year, unexpected results on New Years Eve
-                    #   What are you doing in the office?
-                    event_datetime = start.strftime('%Y ') + line[:16].strip()
-                    # Append logfile's abbreviated date and time stamp, ex. "Mar 27 18:10:01"
-                    # String conversion to datetime object
-                    event_datetime = datetime.datetime.strptime(event_datetime,
-                                                                "%Y %b %d %H:%M:%S")
-                    # TODO: Consider excluding
-                    if start - datetime.timedelta(minutes=history_minutes) < event_datetime:
-                        if 'CMD (touch {})'.format(self.args.touch) in line:
-                            touch_count += 1
-                        cron_events.append(line.strip())
-                    else:
-                        break
+            if self.hosts is not None:
+                windows, messages = self._scan_hosts(now)
+            else:
+                if self.broker is not None:
+                    self._broker_events(now)
+                elif self.incremental:
+                    self._incremental_events(now)
+                else:
+                    self.windows = WindowAggregator(primary=self.args.window,
+                                                    windows=self.args.report_windows)
+                    end = self.replay.advance(now) if self.replay is not None else None
+                    self._add_events(reversed(self._scan_events(now, end=end)), now)
+                windows = self.windows.counts(now)
+                messages = self.windows.collapsed(('error', 'warning'))
+            touch_count = windows[self.args.window].get('touch', 0)
+            target_counts = self._target_counts(self.targets, windows)
             self.log.info('parsed cron event information')
-            msg = 'Checked ' + self.args.logfile
+            msg = 'Checked ' + (self.args.hosts or self.args.broker or self.args.logfile)
             msg += ' at ' + start.isoformat()
             msg += ', found ' + str(touch_count)
-            msg += ' cron touch events for file ' + self.args.touch
+            msg += ' cron touch events for {} touch files'.format(len(self.targets))
             self.log.debug(msg)
             self.recent_events = {'start': start.isoformat(),
                                   'count': touch_count,
-                                  'events': cron_events}
+                                  'targets': target_counts,
+                                  'events': self.windows.events(),
+                                  'messages': messages,
+                                  'other_events': [self._format_message(message) for message in messages],
+                                  'windows': windows,
+                                  'hosts': self.recent_events.get('hosts', {})}
             return self.recent_events
         except Exception as err:
             self.log.error(err, exc_info=True)
             return self.recent_events
 
-    def rotate_touchfile(self):
+    @staticmethod
+    def _target_counts(targets, windows):
+        """
+        :param targets: touch file targets
+        :ptype targets: list of Target
+        :param windows: window length in minutes to events per category
+        :ptype windows: dict
+        :return: touch file to window length in minutes to touch count
+        :rtype: dict
+        """
+        return dict((target.touch,
+                     dict((minutes, counts.get(target.category, 0)) for minutes, counts in windows.items()))
+                    for target in targets)
+
+    def _scan_hosts(self, now):
+        """
+        Scan every --hosts log in the worker pool, keep each host's counts
+        for its own touch files in self.recent_events['hosts'] and merge
+        all hosts into one set of counts and warnings and errors
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :return: merged window counts, and merged messages, last seen first
+        :rtype: tuple (dict, list of dicts)
+        """
+        from hosts import host_target
+        results = self.hosts.scan(now, self.args.window, self.args.report_windows, self.targets,
+                                  timezone=self.args.log_timezone, rules=self.rules)
+        windows = dict((minutes, {}) for minutes in self.windows.windows)
+        host_messages = []
+        host_events = {}
+        for result in results:
+            host = result['host']
+            if 'error' in result:
+                self.log.warning('host {} not scanned: {}'.format(host, result['error']))
+                continue
+            for minutes, counts in result['windows'].items():
+                merged = windows[minutes]
+                for category, count in counts.items():
+                    merged[category] = merged.get(category, 0) + count
+            host_messages.append(result['messages'])
+            for name in ('lines_scanned', 'bytes_scanned', 'events_matched', 'errors_found'):
+                self.metrics.count(name, result[name])
+            if host not in self.host_targets:
+                self.host_targets[host] = [host_target(target, host) for target in self.targets]
+            counts = self._target_counts(self.targets, result['windows'])
+            host_events[host] = {'targets': dict((touch_target.touch, counts[target.touch]) for target, touch_target
+                                                 in zip(self.targets, self.host_targets[host])),
+                                 'other_events': [self._format_message(message)
+                                                  for message in result['messages']]}
+        # The same message logged by several hosts is reported once, with their total count
+        messages = merge_collapsed(host_messages)
+        self.recent_events['hosts'] = host_events
+        self.log.debug('scanned {} of {} hosts'.format(len(host_events), len(results)))
+        return windows, messages
+
+    @staticmethod
+    def _format_message(message):
+        """
+        :param message: collapsed message, see WindowAggregator.collapsed
+        :ptype message: dict
+        :return: the line, or for repeats "message xN (first seen ..., last seen ...)"
+        :rtype: string
+        """
+        if message['count'] == 1:
+            return message['line']
+        first = datetime.datetime.utcfromtimestamp(message['first']).isoformat()
+        last = datetime.datetime.utcfromtimestamp(message['last']).isoformat()
+        return '{} x{} (first seen {}, last seen {})'.format(message['message'], message['count'],
+                                                            first, last)
+
+    def _add_events(self, events, now):
+        """
+        Count events in every window, see EventReader.add
+        :param events: (epoch, line) pairs, oldest first
+        :ptype events: iterable of tuples
+        :param now: current time, seconds since the epoch
+        :ptype now: float
+        :return: None
+        """
+        matched, errors = self.reader.add(self.windows, events, now)
+        self.metrics.count('events_matched', matched)
+        self.metrics.count('errors_found', errors)
+
+    def _scan_events(self, now, end=None):
+        """
+        Read the cron logfile backward from the end, continuing into its
+        rotated generations, collecting cron events, errors and warnings
+        inside the longest window, see EventReader.scan
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :param end: byte offset to read backward from (default: end of file)
+        :ptype end: int
+        :return: (epoch, line) pairs, newest first
+        :rtype: list of tuples
+        """
+        scanned = self.reader.lines_scanned
+        scanned_bytes = self.reader.bytes_scanned
+        events = self.reader.scan(self.args.logfile, now, now - self.windows.longest * 60, end=end)
+        self.metrics.count('lines_scanned', self.reader.lines_scanned - scanned)
+        self.metrics.count('bytes_scanned', self.reader.bytes_scanned - scanned_bytes)
+        return events
+
+    def _incremental_events(self, now):
+        """
+        Read only the cron log lines appended since the last loop and
+        count them into the windows. The log offset and the window
+        counters are saved to the state file after every loop so a
+        restart resumes where the previous run stopped.
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :return: None
+        """
+        if self._checkpoint is None:
+            self._checkpoint = LogCheckpoint.from_dict(self.args.logfile, self.state.get('logfile'))
+            self.windows.load(self.state.get('windows', {}))
+        if self._checkpoint.started:
+            scanned = self.reader.lines_scanned
+            scanned_bytes = self.reader.bytes_scanned
+            events = self.reader.stamp(self._checkpoint.read_new(scanner=self.reader.scanner), now)
+            self.metrics.count('lines_scanned', self.reader.lines_scanned - scanned)
+            self.metrics.count('bytes_scanned', self.reader.bytes_scanned - scanned_bytes)
+        else:
+            # First run, scan the existing windows once then follow the end
+            self._checkpoint.seek_end()
+            events = reversed(self._scan_events(now, end=self._checkpoint.offset))
+        self._add_events(events, now)
+        self.windows.expire(now)
+        self.state.set('logfile', self._checkpoint.to_dict())
+        self.state.set('windows', self.windows.to_dict())
+        self.state.save()
+        self.log.debug('log checkpoint {}'.format(self._checkpoint.to_dict()))
+
+    def _broker_events(self, now):
+        """
+        Count the events the broker published since the last loop, already
+        time stamped; the windows are kept between loops as with
+        --incremental, a restart is filled in from the broker. The broker
+        marks a touch of any file as a touch, so the lines are categorized
+        again for these touch files, counting as in local mode.
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :return: None
+        """
+        events = ((epoch, line) for epoch, _, line in self.broker.receive())
+        matched, errors = self.reader.add(self.windows, events, now)
+        self.metrics.count('events_matched', matched)
+        self.metrics.count('errors_found', errors)
+        self.windows.expire(now)
+
+    def run_once(self):
+        """
+        One loop without pausing, for running from cron rather than as a
+        daemon: the loop count is kept in the state file next to the log
+        checkpoint and the rotation index. The crontab is written when the
+        touch jobs differ from those the last run installed, otherwise it
+        is only checked every CRONTAB_CHECK_RUNS runs, or after a run that
+        found a touch file not touched, in case the jobs were removed
+        :return: None
+        """
+        cronjobs = [target.cronjob for target in self.targets]
+        installed = self.state.get('cronjobs') == cronjobs
+        if not installed:
+            self.new_cronjob()
+            self.state.set('cronjobs', cronjobs)
+        self._standard_loop_count = self.state.get('loops', 0)
+        try:
+            self._run_phases()
+        except KeyboardInterrupt:
+            self.log.warning('loop terminated by request')
+            exit(0)
+        if installed:
+            counts = self.recent_events.get('targets', {})
+            untouched = [target.touch for target in self.targets
+                         if not counts.get(target.touch, {}).get(self.args.window)]
+            if untouched or self._standard_loop_count % CRONTAB_CHECK_RUNS == 0:
+                self._cron_check()
+        self.metrics.export()
+        self.state.set('loops', self._standard_loop_count)
+        self.state.save()
+
+    def asyncio_loop(self):
+        """
+        Alternative to standard_loop and watch_loop: the crontab update,
+        every touch rate's reports and the watcher run as tasks on one
+        asyncio event loop, see runtime.AsyncRuntime (Python 3.7 or later)
+        :return: None
+        """
+        from runtime import AsyncRuntime
+        AsyncRuntime(self).run()
+
+    def serve_broker(self):
+        """
+        Follow the cron log and publish its events to --broker clients,
+        see broker.Broker, instead of running the loops
+        :return: None
+        """
+        from broker import Broker
+        broker = Broker(self.args.serve_broker, self.args.logfile,
+                        EventReader(None, timezone=self.args.log_timezone, rules=self.rules),
+                        self.windows.longest * 60,
+                        log=self.log,
+                        clock=self.clock)
+        try:
+            broker.serve(duration=self._standard_loop_maxtime)
+        except KeyboardInterrupt:
+            self.log.warning('broker terminated by request')
+            exit(0)
+        finally:
+            broker.close()
+
+    def rotate_touchfile(self, targets=None, loop_count=None):
         """
         Per README.md section (d.) rotate
-        the touch file, renaming based on self.args.prefix
+        the touch files, renaming based on each target's prefix
+        with an incremented suffix
+        :param targets: touch file targets to rotate (default: all)
+        :ptype targets: list of Target
+        :param loop_count: loops run by these targets' schedule (default: loops run)
+        :ptype loop_count: int
         :return: None
         """
-        rotate_interval = 15
-        rotate_filename = self.args.rename + '-' + str(time.time())[:-3] + '.txt'
-        remaining_loops = self._standard_loop_count % rotate_interval
-        if remaining_loops == 0:
+        if targets is None:
+            targets = self.targets
+        if loop_count is None:
+            loop_count = self._standard_loop_count
+        rotated = 0
+        host_targets = [touch_target for host, touch_targets in sorted(self.host_targets.items())
+                        for target, touch_target in zip(self.targets, touch_targets) if target in targets]
+        for target in targets + host_targets:
+            reason = self.rotator.due(target.touch, loop_count)
+            if reason is None:
+                continue
+            self.writer.close(target.touch)
             try:
-                shutil.move(self.args.touch, rotate_filename)
+                rotate_filename = self.rotator.rotate(target.touch, target.rename)
             except Exception as err:
                 self.log.error(err, exc_info=True)
                 exit(1)
+            rotated += 1
+            self.metrics.count('rotations')
             self.log.info('rotated touch file')
-            msg = 'rotated out "{}", renamed as'.format(self.args.touch)
+            msg = 'rotated out "{}" after {}, renamed as'.format(target.touch, reason)
             msg += '"{}"'.format(rotate_filename)
             self.log.debug(msg)
-        else:
+        if not rotated:
             self.log.info('touch file not rotated')
-            msg = 'Insufficient loops to rotate touch file, need +/- '
-            msg += str(remaining_loops) + ' more to reach '
-            msg += str(rotate_interval)
-            self.log.debug(msg)
+            if self.args.rotate_loops:
+                msg = 'Insufficient loops to rotate touch file, need +/- '
+                msg += str(self.args.rotate_loops - loop_count % self.args.rotate_loops)
+                msg += ' more to reach ' + str(self.args.rotate_loops)
+                self.log.debug(msg)
 
 
-if __name__ == '__main__':
+def main(sys_argv=sys.argv):
+    """
+    Run per the command line, see README.md; pythontest.sh calls this
+    after importing the module so its compiled bytecode is reused
+    :param sys_argv: command line arguments
+    :ptype sys_argv: list of strings
+    :return: None
+    """
+    global LOGGER
     LOGGER = setup_logger(level=logging.INFO)
-    ARGS = parse_arguments(sys_argv=sys.argv)
-    with Ops(ARGS, LOGGER) as OPS:
-        OPS.new_cronjob()
-        OPS.standard_loop()
+    args = parse_arguments(sys_argv=sys_argv)
+    if args.query_start is not None:
+        query_archive(args, LOGGER)
+        return
+    with Ops(args, LOGGER) as ops:
+        if args.serve_broker is not None:
+            ops.serve_broker()
+        elif args.asyncio:
+            ops.asyncio_loop()
+        elif args.once:
+            ops.run_once()
+        else:
+            if args.replay is None:
+                ops.new_cronjob()
+            if args.watch:
+                ops.watch_loop()
+            else:
+                ops.standard_loop()
+
+
+if __name__ == '__main__':
+    main()
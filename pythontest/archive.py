@@ -0,0 +1,379 @@
+"""
+Index rotated touch files by time, and answer queries over years of them
+from the index, opening only the archives a query needs
+"""
+
+import calendar
+import json
+import os
+import re
+import time
+
+from state import atomic_write
+
+# Records start with the report's UTC start time, see writer.format_record
+RE_TEXT_RECORD = re.compile(br'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?): (.*)$')
+RE_COUNT = re.compile(br'events count (\d+)')
+RE_EVENTS = re.compile(br'(\d+) (?:other events|new warning or error events):$')
+# Records are grouped into blocks per this many seconds of start times
+BLOCK_SECONDS = 3600
+# Field order of an index block
+BLOCK_FIELDS = ('first', 'last', 'offset', 'length', 'records', 'reports', 'alerts', 'touches', 'max', 'events')
+SUMMARY_FIELDS = BLOCK_FIELDS[4:]
+# Bytes read per step when looking for the last line of the index
+TAIL_CHUNK = 64 * 1024
+
+
+def parse_start(text):
+    """
+    :param text: record start, ex. "2024-03-07T18:10:00.123456" (UTC)
+    :ptype text: string
+    :return: seconds since the epoch
+    :rtype: float
+    """
+    seconds, _, fraction = text.partition('.')
+    epoch = calendar.timegm(time.strptime(seconds, '%Y-%m-%dT%H:%M:%S'))
+    return epoch + float('0.' + fraction) if fraction else float(epoch)
+
+
+def _record(line):
+    """
+    :param line: first line of a touch file record
+    :ptype line: bytes
+    :return: start, kind, count and events of the record, None if the
+        line does not start one
+    :rtype: tuple (float, string, int, int)
+    """
+    if line.startswith(b'{'):
+        try:
+            record = json.loads(line.decode('utf-8'))
+            return (parse_start(record['start']), record.get('kind', 'report'),
+                    record.get('count') or 0, len(record.get('events', [])))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+    match = RE_TEXT_RECORD.match(line.rstrip())
+    if match is None:
+        return None
+    rest = match.group(2)
+    count = RE_COUNT.search(rest)
+    events = RE_EVENTS.search(rest)
+    return (parse_start(match.group(1).decode('ascii')),
+            'alert' if b'new warning or error events' in rest else 'report',
+            int(count.group(1)) if count is not None else 0,
+            int(events.group(1)) if events is not None else 0)
+
+
+def read_records(filehandle, offset=0, length=None):
+    """
+    Split touch file text or jsonl records, a text record being its first
+    line and the indented JSON list of events that follows it
+    :param filehandle: touch file, opened in binary mode
+    :ptype filehandle: file
+    :param offset: byte offset of the first record to read
+    :ptype offset: int
+    :param length: bytes to read (default: to the end of the file)
+    :ptype length: int
+    :return: byte offset, text and (start, kind, count, events) of each record
+    :rtype: generator of tuples (int, bytes, tuple)
+    """
+    filehandle.seek(offset)
+    end = offset + length if length is not None else None
+    position = offset
+    current = None
+    while end is None or position < end:
+        line = filehandle.readline()
+        if not line:
+            break
+        record = _record(line)
+        if record is not None:
+            if current is not None:
+                yield current[0], b''.join(current[1]), current[2]
+            current = (position, [line], record)
+        elif current is not None:
+            current[1].append(line)
+        position += len(line)
+    if current is not None:
+        yield current[0], b''.join(current[1]), current[2]
+
+
+def _summarize(counts, record, base=0):
+    """
+    Add a record to a block or summary
+    :param counts: records, reports, alerts, touches, max, events
+    :ptype counts: list of ints
+    :param record: start, kind, count and events, see read_records()
+    :ptype record: tuple
+    :param base: index of the records count in counts, 4 for a block
+    :ptype base: int
+    :return: None
+    """
+    _, kind, count, events = record
+    counts[base] += 1
+    if kind == 'alert':
+        counts[base + 2] += 1
+    else:
+        counts[base + 1] += 1
+        counts[base + 3] += count
+        counts[base + 4] = max(counts[base + 4], count)
+    counts[base + 5] += events
+
+
+def _merge(summary, block):
+    """
+    :param summary: records, reports, alerts, touches, max, events
+    :ptype summary: list of ints
+    :param block: index block, see BLOCK_FIELDS
+    :ptype block: list
+    :return: None
+    """
+    for position, value in enumerate(block[4:]):
+        summary[position] = max(summary[position], value) if SUMMARY_FIELDS[position] == 'max' \
+            else summary[position] + value
+
+
+def index_file(filename):
+    """
+    Read a rotated touch file once and describe it for the index: its
+    time range, summary counts and blocks of records by start hour, each
+    with its byte range in the file and its own counts
+    :param filename: rotated touch file, not yet compressed
+    :ptype filename: string
+    :return: index entry with keys "file", "first", "last", "summary" and
+        "blocks" (lists of BLOCK_FIELDS values), None without records
+    :rtype: dict
+    """
+    blocks = []
+    block = None
+    with open(filename, 'rb') as filehandle:
+        for offset, text, record in read_records(filehandle):
+            if block is None or record[0] // BLOCK_SECONDS != block[0] // BLOCK_SECONDS:
+                block = [record[0], record[0], offset, 0, 0, 0, 0, 0, 0, 0]
+                blocks.append(block)
+            block[1] = max(block[1], record[0])
+            block[3] += len(text)
+            _summarize(block, record, base=4)
+    if not blocks:
+        return None
+    summary = [0] * len(SUMMARY_FIELDS)
+    for block in blocks:
+        _merge(summary, block)
+    return {'file': os.path.abspath(filename),
+            'first': min(block[0] for block in blocks),
+            'last': max(block[1] for block in blocks),
+            'summary': dict(zip(SUMMARY_FIELDS, summary)),
+            'blocks': blocks}
+
+
+def _decode(line):
+    """
+    :param line: index line
+    :ptype line: bytes
+    :return: index entry, None for a damaged line
+    :rtype: dict
+    """
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def open_archive(filename):
+    """
+    :param filename: rotated touch file, read from <filename>.gz once compressed
+    :ptype filename: string
+    :return: file handle, binary mode, None if the file was removed
+    :rtype: file
+    """
+    import gzip
+    if os.path.isfile(filename):
+        return open(filename, 'rb')
+    if os.path.isfile(filename + '.gz'):
+        return gzip.open(filename + '.gz', 'rb')
+    return None
+
+
+class ArchiveIndex(object):
+    """
+    A sidecar index of a prefix's rotated touch files, <prefix>.index,
+    one compact JSON line per file appended as it is rotated. Lines are
+    kept in order of their first record, and each carries "reach", the
+    latest record time of itself and every line before it, so a query
+    binary searches the index for its start and reads forward only until
+    its end: years of rotated files cost a few seeks. Aggregate questions
+    are answered from the block counts, an archive is only opened to read
+    the records of blocks the query range cuts through (or all of them
+    when records are asked for). Entries outlive their archives, so
+    summaries of files removed by retention are still answered.
+    """
+
+    def __init__(self, prefix):
+        """
+        :param prefix: rotated file location and prefix
+        :ptype prefix: string
+        """
+        self.prefix = prefix
+        self.filename = prefix + '.index'
+
+    def add(self, filename):
+        """
+        Index a rotated touch file, before it is compressed
+        :param filename: rotated touch file
+        :ptype filename: string
+        :return: index entry, None if the file has no records
+        :rtype: dict
+        """
+        entry = index_file(filename)
+        if entry is None:
+            return None
+        last = self._last_entry()
+        if last is not None and entry['first'] < last['first']:
+            # Out of order, ex. a replay of an older log: rewrite the index sorted
+            entries = list(self.entries()) + [entry]
+            entries.sort(key=lambda item: item['first'])
+            reach = None
+            for item in entries:
+                reach = item['reach'] = max(reach, item['last']) if reach is not None else item['last']
+            atomic_write(self.filename, ''.join(self._encode(item) for item in entries), mode=0o644)
+            return entry
+        entry['reach'] = max(last['reach'], entry['last']) if last is not None else entry['last']
+        with open(self.filename, 'ab') as filehandle:
+            filehandle.write(self._encode(entry).encode('utf-8'))
+        return entry
+
+    @staticmethod
+    def _encode(entry):
+        """
+        :param entry: index entry
+        :ptype entry: dict
+        :return: index line
+        :rtype: string
+        """
+        return json.dumps(entry, sort_keys=True, separators=(',', ':')) + '\n'
+
+    def _last_entry(self):
+        """
+        Read the last index line, dropping a partial one left by an
+        interrupted append
+        :return: last index entry, None for a new index
+        :rtype: dict
+        """
+        if not os.path.isfile(self.filename):
+            return None
+        with open(self.filename, 'rb+') as filehandle:
+            filehandle.seek(0, os.SEEK_END)
+            size = filehandle.tell()
+            step = TAIL_CHUNK
+            while True:
+                start = max(0, size - step)
+                filehandle.seek(start)
+                data = filehandle.read(size - start)
+                complete = data.rfind(b'\n') + 1
+                if complete == 0 and start > 0:
+                    step *= 2
+                    continue
+                if complete < len(data):
+                    filehandle.truncate(start + complete)
+                    size = start + complete
+                    data = data[:complete]
+                begin = data.rfind(b'\n', 0, len(data) - 1) + 1
+                if begin > 0 or start == 0:
+                    return _decode(data[begin:]) if data else None
+                step *= 2
+
+    def entries(self, start=None):
+        """
+        :param start: skip entries whose records all end before this time,
+            seconds since the epoch (default: read the whole index)
+        :ptype start: float
+        :return: index entries, in order of their first record
+        :rtype: generator of dicts
+        """
+        if not os.path.isfile(self.filename):
+            return
+        with open(self.filename, 'rb') as filehandle:
+            if start is not None:
+                filehandle.seek(self._search(filehandle, start))
+            for line in filehandle:
+                entry = _decode(line)
+                if entry is not None:
+                    yield entry
+
+    @staticmethod
+    def _search(filehandle, start):
+        """
+        :param filehandle: index, opened in binary mode
+        :ptype filehandle: file
+        :param start: seconds since the epoch
+        :ptype start: float
+        :return: byte offset of the first line reaching start
+        :rtype: int
+        """
+        def line_at(position):
+            # The first line starting at or after position
+            filehandle.seek(max(0, position - 1))
+            if position > 0:
+                filehandle.readline()
+            return filehandle.tell(), filehandle.readline()
+
+        low, high = 0, os.fstat(filehandle.fileno()).st_size
+        while low < high:
+            middle = (low + high) // 2
+            entry = _decode(line_at(middle)[1]) or {}
+            if entry.get('reach', start) >= start:
+                high = middle
+            else:
+                low = middle + 1
+        return line_at(low)[0]
+
+    def query(self, start, end, records=False):
+        """
+        :param start: range start, seconds since the epoch
+        :ptype start: float
+        :param end: range end, inclusive, seconds since the epoch
+        :ptype end: float
+        :param records: also return the text of the records in range
+        :ptype records: bool
+        :return: result with keys "files" (rotated files in range),
+            "opened" (archives read), "missing" (archives removed whose
+            records in range could not be read, their blocks are left out),
+            "summary" (records, reports, alerts, touches: sum of the
+            reports' counts, max: largest report count, events) and
+            "records" if asked for
+        :rtype: dict
+        """
+        summary = [0] * len(SUMMARY_FIELDS)
+        result = {'files': 0, 'opened': [], 'missing': []}
+        found = []
+        for entry in self.entries(start=start):
+            if entry['first'] > end:
+                break
+            if entry['last'] < start:
+                continue
+            result['files'] += 1
+            # Blocks the range covers are counted from the index, the others read
+            partial = []
+            for block in entry['blocks']:
+                if block[1] < start or block[0] > end:
+                    continue
+                if not records and start <= block[0] and block[1] <= end:
+                    _merge(summary, block)
+                else:
+                    partial.append(block)
+            if not partial:
+                continue
+            filehandle = open_archive(entry['file'])
+            if filehandle is None:
+                result['missing'].append(entry['file'])
+                continue
+            result['opened'].append(entry['file'])
+            with filehandle:
+                for block in partial:
+                    for _, text, record in read_records(filehandle, block[2], block[3]):
+                        if start <= record[0] <= end:
+                            _summarize(summary, record)
+                            if records:
+                                found.append(text.decode('utf-8', 'replace').rstrip('\n'))
+        result['summary'] = dict(zip(SUMMARY_FIELDS, summary))
+        if records:
+            result['records'] = found
+        return result
@@ -0,0 +1,553 @@
+"""
+Tail the cron log once and publish its time stamped, categorized events to
+any number of local subscribers over a Unix domain socket
+"""
+
+import errno
+import json
+import os
+import select
+import socket
+import struct
+from collections import deque
+
+from clock import SystemClock, monotonic
+from logreader import LogCheckpoint
+
+# Every message is a 4 byte big-endian length followed by compact JSON
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME = 1 << 20
+# Bytes queued for a subscriber that stopped reading before it is dropped
+MAX_PENDING = 8 << 20
+RECEIVE_SIZE = 64 << 10
+
+
+def encode_frame(message):
+    """
+    :param message: JSON serializable message
+    :ptype message: dict
+    :return: length prefixed compact JSON
+    :rtype: bytes
+    """
+    payload = json.dumps(message, separators=(',', ':'))
+    if not isinstance(payload, bytes):
+        payload = payload.encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def event_message(sequence, epoch, categories, line):
+    """
+    :param sequence: the broker's count of events published, this one included
+    :ptype sequence: int
+    :param epoch: event time, seconds since the epoch
+    :ptype epoch: float
+    :param categories: see events.EventReader.categorize
+    :ptype categories: tuple of strings
+    :param line: log line
+    :ptype line: string
+    :return: event as published, short keys keep the frames small
+    :rtype: dict
+    """
+    return {'s': sequence, 't': epoch, 'c': list(categories), 'l': line}
+
+
+class FrameDecoder(object):
+    """
+    Split a byte stream back into the messages written by encode_frame,
+    keeping a trailing partial frame for the next read
+    """
+
+    def __init__(self):
+        self.buffer = b''
+
+    def feed(self, data):
+        """
+        :param data: bytes received
+        :ptype data: bytes
+        :return: complete messages, in order
+        :rtype: list of dicts
+        """
+        buf = self.buffer + data
+        messages = []
+        position = 0
+        while len(buf) - position >= FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack_from(buf, position)
+            if length > MAX_FRAME:
+                raise ValueError('frame of {} bytes is larger than {}'.format(length, MAX_FRAME))
+            end = position + FRAME_HEADER.size + length
+            if len(buf) < end:
+                break
+            messages.append(json.loads(buf[position + FRAME_HEADER.size:end].decode('utf-8')))
+            position = end
+        self.buffer = buf[position:]
+        return messages
+
+
+class _Subscriber(object):
+    """
+    One connected client: its filter, its unread input and its unsent output
+    """
+
+    def __init__(self, connection):
+        """
+        :param connection: accepted, non-blocking connection
+        :ptype connection: socket.socket
+        """
+        self.connection = connection
+        self.decoder = FrameDecoder()
+        self.categories = None
+        self.subscribed = False
+        self.pending = deque()
+        self.pending_bytes = 0
+
+    def fileno(self):
+        """
+        :return: socket file descriptor, for select
+        :rtype: int
+        """
+        return self.connection.fileno()
+
+    def subscribe(self, request):
+        """
+        :param request: {"targets": [touch files], "severities": ["error", ...]},
+            either may be null for no filter on it, an event is sent if it
+            touches one of the targets or has one of the severities
+        :ptype request: dict
+        :return: None
+        """
+        targets = request.get('targets')
+        severities = request.get('severities')
+        if targets is None and severities is None:
+            self.categories = None
+        else:
+            self.categories = set('touch:' + target for target in targets or [])
+            self.categories.update(severities or [])
+        self.subscribed = True
+
+    def wants(self, categories):
+        """
+        :param categories: event categories
+        :ptype categories: list of strings
+        :return: True if the event passes the filter
+        :rtype: bool
+        """
+        if self.categories is None:
+            return True
+        for category in categories:
+            if category in self.categories:
+                return True
+        return False
+
+    def queue(self, frame):
+        """
+        :param frame: encoded message
+        :ptype frame: bytes
+        :return: None
+        """
+        self.pending.append(frame)
+        self.pending_bytes += len(frame)
+
+    def flush(self):
+        """
+        Send as much of the queued output as the socket takes
+        :return: None
+        """
+        while self.pending:
+            frame = self.pending[0]
+            sent = self.connection.send(frame)
+            self.pending_bytes -= sent
+            if sent < len(frame):
+                self.pending[0] = frame[sent:]
+                return
+            self.pending.popleft()
+
+
+class Broker(object):
+    """
+    Follow the cron log with a LogCheckpoint, parse and categorize each new
+    line once with an EventReader and fan the events out to subscribers.
+    Each event is encoded once however many subscribers receive it; a
+    select loop serves all of them from one thread. Events of the last
+    retention seconds are kept so a subscriber starts with full windows.
+    Events are numbered in the order published, and each broker has an id
+    of its own, so a subscriber resumes after the last event it received
+    even when several were logged in the same second. A subscriber first
+    sends a subscription (see _Subscriber.subscribe, plus "broker" and
+    "sequence" of the last event received, or after a broker restart
+    "since": only events of this time or newer), later {"sync": true}
+    whenever it wants to be up to date. The broker answers each request by
+    reading the log, sending what is new and then {"synced": time,
+    "broker": id}.
+    """
+
+    def __init__(self, path, logfile, reader, retention, log=None, clock=None, interval=1.0):
+        """
+        :param path: Unix domain socket to listen on, replaced if it exists
+        :ptype path: string
+        :param logfile: cron log to follow
+        :ptype logfile: string
+        :param reader: categorizes every touch, see EventReader(targets=None)
+        :ptype reader: events.EventReader
+        :param retention: seconds of events kept for new subscribers
+        :ptype retention: float
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        :param clock: time source (default: clock.SystemClock)
+        :ptype clock: clock.SystemClock
+        :param interval: seconds between checks of the log for new lines
+        :ptype interval: float
+        """
+        self.path = path
+        self.reader = reader
+        self.retention = retention
+        self.log = log
+        self.clock = clock or SystemClock()
+        self.interval = interval
+        self.checkpoint = LogCheckpoint(logfile)
+        # (epoch, sequence, categories, frame) of the events kept, oldest first
+        self.recent = deque()
+        self.subscribers = []
+        self.published = 0
+        # Sequences restart with the broker, the id tells subscribers they did
+        self.id = '{}-{:.6f}'.format(os.getpid(), self.clock.time())
+        self.listener = None
+
+    def listen(self):
+        """
+        Bind the socket, read the retained events from the existing log
+        and start following its end
+        :return: None
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(64)
+        self.listener.setblocking(False)
+        now = self.clock.time()
+        self.checkpoint.seek_end()
+        events = self.reader.scan(self.checkpoint.filename, now, now - self.retention,
+                                  end=self.checkpoint.offset)
+        self._publish(reversed(events), now)
+        self._log('info', 'broker listening on {}, {} events kept'.format(self.path, len(self.recent)))
+
+    def serve(self, duration=0):
+        """
+        Serve subscribers and follow the log
+        :param duration: seconds to run, 0 to run until interrupted
+        :ptype duration: float
+        :return: None
+        """
+        if self.listener is None:
+            self.listen()
+        started = monotonic()
+        next_read = started
+        while duration == 0 or monotonic() - started < duration:
+            timeout = max(0.0, next_read - monotonic())
+            writers = [subscriber for subscriber in self.subscribers if subscriber.pending]
+            try:
+                readable, writable, _ = select.select([self.listener] + self.subscribers, writers, [], timeout)
+            except (select.error, OSError) as err:
+                if err.args[0] == errno.EINTR:
+                    continue
+                raise
+            for subscriber in readable:
+                if subscriber is self.listener:
+                    self._accept()
+                else:
+                    self._receive(subscriber)
+            for subscriber in writable:
+                if subscriber in self.subscribers:
+                    self._send(subscriber)
+            if monotonic() >= next_read:
+                self._follow()
+                next_read = monotonic() + self.interval
+
+    def close(self):
+        """
+        :return: None
+        """
+        for subscriber in list(self.subscribers):
+            self._drop(subscriber)
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _log(self, level, msg):
+        """
+        :param level: logger method name, ex. "info"
+        :ptype level: string
+        :param msg: message
+        :ptype msg: string
+        :return: None
+        """
+        if self.log is not None:
+            getattr(self.log, level)(msg)
+
+    def _follow(self):
+        """
+        Publish the lines appended to the log since the last read
+        :return: None
+        """
+        now = self.clock.time()
+        self._publish(self.reader.stamp(self.checkpoint.read_new(scanner=self.reader.scanner), now), now)
+
+    def _publish(self, events, now):
+        """
+        Categorize, keep and send new events, then expire old ones
+        :param events: (epoch, line) pairs, oldest first
+        :ptype events: iterable of tuples
+        :param now: current time, seconds since the epoch
+        :ptype now: float
+        :return: None
+        """
+        for epoch, line in events:
+            categories = self.reader.categorize(line)
+            if not categories:
+                continue
+            self.published += 1
+            frame = encode_frame(event_message(self.published, epoch, categories, line))
+            self.recent.append((epoch, self.published, categories, frame))
+            for subscriber in self.subscribers:
+                if subscriber.subscribed and subscriber.wants(categories):
+                    subscriber.queue(frame)
+        oldest = now - self.retention
+        while self.recent and self.recent[0][0] <= oldest:
+            self.recent.popleft()
+        for subscriber in list(self.subscribers):
+            if subscriber.pending:
+                self._send(subscriber)
+
+    def _accept(self):
+        """
+        :return: None
+        """
+        try:
+            connection, _ = self.listener.accept()
+        except socket.error as err:
+            if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        connection.setblocking(False)
+        self.subscribers.append(_Subscriber(connection))
+        self._log('debug', '{} subscribers connected'.format(len(self.subscribers)))
+
+    def _receive(self, subscriber):
+        """
+        Answer a subscriber's requests, a subscription is sent the retained
+        events it asks for
+        :param subscriber: readable subscriber
+        :ptype subscriber: _Subscriber
+        :return: None
+        """
+        try:
+            data = subscriber.connection.recv(RECEIVE_SIZE)
+            requests = subscriber.decoder.feed(data) if data else None
+        except (socket.error, ValueError) as err:
+            self._log('warning', 'subscriber dropped: {}'.format(err))
+            data, requests = None, None
+        if not data:
+            self._drop(subscriber)
+            return
+        for request in requests:
+            self._follow()
+            if not request.get('sync'):
+                subscriber.subscribe(request)
+                for frame in self._resume(subscriber, request):
+                    subscriber.queue(frame)
+            subscriber.queue(encode_frame({'synced': self.clock.time(), 'broker': self.id}))
+        if subscriber in self.subscribers:
+            self._send(subscriber)
+
+    def _resume(self, subscriber, request):
+        """
+        :param subscriber: subscriber that just subscribed
+        :ptype subscriber: _Subscriber
+        :param request: subscription, with the "broker" and "sequence" of
+            the last event received, or "since" its time for another broker
+        :ptype request: dict
+        :return: frames of the retained events the subscriber has not received
+        :rtype: list of bytes
+        """
+        sequence = request.get('sequence')
+        if request.get('broker') != self.id or sequence is None:
+            # Another broker's numbering, resend the last second received as well
+            since = request.get('since')
+            return [frame for epoch, _, categories, frame in self.recent
+                    if (since is None or epoch >= since) and subscriber.wants(categories)]
+        return [frame for _, published, categories, frame in self.recent
+                if published > sequence and subscriber.wants(categories)]
+
+    def _send(self, subscriber):
+        """
+        :param subscriber: subscriber with queued output
+        :ptype subscriber: _Subscriber
+        :return: None
+        """
+        try:
+            subscriber.flush()
+        except socket.error as err:
+            if err.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._log('warning', 'subscriber dropped: {}'.format(err))
+                self._drop(subscriber)
+                return
+        if subscriber.pending_bytes > MAX_PENDING:
+            self._log('warning', 'subscriber dropped, {} bytes unread'.format(subscriber.pending_bytes))
+            self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        """
+        :param subscriber: subscriber to disconnect
+        :ptype subscriber: _Subscriber
+        :return: None
+        """
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        subscriber.connection.close()
+
+
+class BrokerClient(object):
+    """
+    Subscribe to a Broker and collect the events published since the last
+    call, waiting only for the broker to catch up with the log. After the
+    connection drops it reconnects, asking the same broker only for the
+    events after the last sequence received. A restarted broker numbers
+    its events anew, so it resends those from the second of the last one
+    received, and the lines of that second already received are skipped;
+    no event is counted twice or lost.
+    """
+
+    def __init__(self, path, targets=None, severities=None, log=None, timeout=10.0):
+        """
+        :param path: the broker's Unix domain socket
+        :ptype path: string
+        :param targets: touch files of interest, None for all
+        :ptype targets: list of strings
+        :param severities: categories of interest, ex. ["error", "warning"]
+        :ptype severities: list of strings
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        :param timeout: seconds to wait for the broker to answer
+        :ptype timeout: float
+        """
+        self.path = path
+        self.timeout = timeout
+        self.request = {'targets': targets, 'severities': severities}
+        self.log = log
+        # Broker id and sequence of the last event received, its time and
+        # the lines received with that time, with their occurrences
+        self.broker = None
+        self.sequence = None
+        self.since = None
+        self.seen = {}
+        self.connection = None
+        self.decoder = None
+
+    def connect(self):
+        """
+        :return: None
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+            request = dict(self.request, broker=self.broker, sequence=self.sequence, since=self.since)
+            connection.sendall(encode_frame(request))
+        except socket.error:
+            connection.close()
+            raise
+        connection.setblocking(False)
+        self.connection = connection
+        self.decoder = FrameDecoder()
+
+    def _warning(self, msg):
+        """
+        :param msg: message
+        :ptype msg: string
+        :return: None
+        """
+        if self.log is not None:
+            self.log.warning(msg)
+
+    def receive(self):
+        """
+        Ask the broker to catch up with the log and collect everything
+        published since the last call
+        :return: (epoch, categories, line) of the events, oldest first
+        :rtype: list of tuples
+        """
+        resumed = self.connection is None
+        try:
+            if resumed:
+                self.connect()
+            else:
+                self.connection.sendall(encode_frame({'sync': True}))
+        except socket.error as err:
+            self._warning('broker {} not available: {}'.format(self.path, err))
+            self.close()
+            return []
+        messages = []
+        broker = None
+        synced = False
+        deadline = monotonic() + self.timeout
+        while not synced:
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not select.select([self.connection], [], [], remaining)[0]:
+                self._warning('broker {} did not answer in {}s'.format(self.path, self.timeout))
+                break
+            try:
+                data = self.connection.recv(RECEIVE_SIZE)
+            except socket.error as err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    continue
+                data = b''
+            if not data:
+                self._warning('broker {} disconnected'.format(self.path))
+                self.close()
+                break
+            for message in self.decoder.feed(data):
+                if 'synced' in message:
+                    synced = True
+                    broker = message.get('broker')
+                else:
+                    messages.append(message)
+        if resumed and broker != self.broker:
+            messages = self._unseen(messages)
+        if broker is not None:
+            self.broker = broker
+        for message in messages:
+            self.sequence = message['s']
+            if self.since is None or message['t'] > self.since:
+                self.since = message['t']
+                self.seen = {}
+            if message['t'] == self.since:
+                self.seen[message['l']] = self.seen.get(message['l'], 0) + 1
+        return [(message['t'], tuple(message['c']), message['l']) for message in messages]
+
+    def _unseen(self, messages):
+        """
+        :param messages: events resent by another broker, from the time of the
+            last event received on
+        :ptype messages: list of dicts
+        :return: messages, without the ones of that time already received
+        :rtype: list of dicts
+        """
+        seen = dict(self.seen)
+        unseen = []
+        for message in messages:
+            if self.since is not None and message['t'] < self.since:
+                continue
+            if message['t'] == self.since and seen.get(message['l'], 0) > 0:
+                seen[message['l']] -= 1
+                continue
+            unseen.append(message)
+        return unseen
+
+    def close(self):
+        """
+        :return: None
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
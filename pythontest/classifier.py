@@ -0,0 +1,120 @@
+"""
+Classify syslog lines as errors or warnings by <PRI> severity, keywords and
+regular expressions
+"""
+
+import json
+import re
+
+SEVERITY_CATEGORIES = ('error', 'warning')
+# Syslog severities (RFC5424), lower is more severe
+SEVERITIES = ('emerg', 'alert', 'crit', 'err', 'warning', 'notice', 'info', 'debug')
+# Most severe first: a <PRI> severity up to 3 (err) is an error, 4 (warning) a warning
+DEFAULT_SEVERITY = {'error': 3, 'warning': 4}
+DEFAULT_RULES = ({'category': 'error', 'keyword': 'error'},
+                 {'category': 'warning', 'keyword': 'warning'})
+# "<PRI>" header of RFC5424 and raw kernel/journal lines
+RE_PRI = re.compile(r'<(\d{1,3})>')
+
+
+def load_rules(filename):
+    """
+    Read classifier rules from a JSON config file, either a list or
+    {"rules": [...], "severity": {...}}, of objects like
+        {"category": "error", "keyword": "segfault"}
+        {"category": "warning", "regex": "temperature above \\d+"}
+    Keywords are matched without regard to case, regular expressions are
+    case sensitive (use character classes, ex. "[Tt]emperature").
+    "severity" maps each category to the largest <PRI> severity it covers,
+    ex. {"error": 3, "warning": 4}, or null to ignore <PRI> headers
+    :param filename: config file
+    :ptype filename: string
+    :return: rules and severity thresholds
+    :rtype: tuple (list of dicts, dict)
+    """
+    with open(filename, 'rt') as filehandle:
+        config = json.load(filehandle)
+    severity = DEFAULT_SEVERITY
+    if isinstance(config, dict):
+        severity = config.get('severity', DEFAULT_SEVERITY)
+        config = config.get('rules', [])
+    for entry in config:
+        if not isinstance(entry, dict) or entry.get('category') not in SEVERITY_CATEGORIES:
+            raise ValueError('rule without "category" {} in {}: {}'.format(
+                ' or '.join(SEVERITY_CATEGORIES), filename, entry))
+        if ('keyword' in entry) == ('regex' in entry):
+            raise ValueError('rule needs one of "keyword" or "regex" in {}: {}'.format(filename, entry))
+    if severity is not None:
+        for category, level in severity.items():
+            if category not in SEVERITY_CATEGORIES or not 0 <= level < len(SEVERITIES):
+                raise ValueError('invalid severity {}: {} in {}'.format(category, level, filename))
+    Classifier(config, severity)
+    return config, severity
+
+
+class Classifier(object):
+    """
+    Find the error and warning categories of a log line: the <PRI> header
+    is read once, keywords are substring tests on the lowercased line and
+    all regex rules are alternatives of one compiled pattern, so a line is
+    searched once however many regex rules there are. The rules are also
+    available as bytes (keywords, patterns and line_prefixes) for the
+    scanner.LineScanner prefilter.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, severity=DEFAULT_SEVERITY):
+        """
+        :param rules: see load_rules
+        :ptype rules: list of dicts
+        :param severity: category to largest <PRI> severity, None to ignore <PRI>
+        :ptype severity: dict
+        """
+        self.categories = []
+        self.keywords = []
+        self.patterns = []
+        self.line_prefixes = []
+        self._keywords = []
+        sources = []
+        for rule in rules:
+            if 'keyword' in rule:
+                self._keywords.append((rule['keyword'].lower(), rule['category']))
+                self.keywords.append(rule['keyword'].encode('utf-8'))
+            else:
+                sources.append('(?P<rule{}>{})'.format(len(self.categories), rule['regex']))
+                self.categories.append(rule['category'])
+                self.patterns.append(rule['regex'].encode('utf-8'))
+        self.regex = re.compile('|'.join(sources)) if sources else None
+        # PRI value to category, the severity is the PRI modulo 8
+        self.priorities = {}
+        if severity:
+            for priority in range(192):
+                for category, level in sorted(severity.items(), key=lambda item: item[1]):
+                    if priority % 8 <= level:
+                        self.priorities[str(priority)] = category
+                        break
+            self.line_prefixes.append(('<(?:' + '|'.join(sorted(self.priorities, key=int)) + ')>').encode('utf-8'))
+
+    def classify(self, line):
+        """
+        :param line: log line
+        :ptype line: string
+        :return: categories the line belongs to, ex. ("error",)
+        :rtype: tuple of strings
+        """
+        categories = []
+        if self.priorities and line[:1] == '<':
+            match = RE_PRI.match(line)
+            category = match and self.priorities.get(match.group(1))
+            if category:
+                categories.append(category)
+        if self._keywords:
+            lowered = line.lower()
+            for keyword, category in self._keywords:
+                if keyword in lowered and category not in categories:
+                    categories.append(category)
+        if self.regex is not None:
+            for match in self.regex.finditer(line):
+                category = self.categories[int(match.lastgroup[4:])]
+                if category not in categories:
+                    categories.append(category)
+        return tuple(categories)
@@ -0,0 +1,149 @@
+"""
+Time sources for schedules that must not drift or jump
+"""
+
+import os
+import time
+
+CLOCK_MONOTONIC = 1
+
+
+def _find_libc():
+    """
+    :return: the C library's file name, found by ldconfig
+    :rtype: string
+    """
+    import ctypes.util
+    return ctypes.util.find_library('c')
+
+
+def _clock_gettime_monotonic():
+    """
+    Python 2 has no time.monotonic(), ask libc for CLOCK_MONOTONIC instead.
+    ctypes is only imported here, Python 3 never needs it, and the symbols
+    already loaded into the interpreter are tried before find_library(),
+    which runs ldconfig in a subprocess.
+    :return: monotonic time function, None when unavailable
+    :rtype: function
+    """
+    try:
+        import ctypes
+    except ImportError:
+        return None
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    clock_gettime = None
+    for name in (None, 'libc.so.6', 'find_library'):
+        try:
+            if name == 'find_library':
+                name = _find_libc()
+            clock_gettime = ctypes.CDLL(name, use_errno=True).clock_gettime
+            break
+        except (OSError, AttributeError, TypeError):
+            continue
+    if clock_gettime is None:
+        return None
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+
+    def monotonic():
+        timespec = Timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+    return monotonic
+
+
+# Seconds from an arbitrary start, never affected by system clock changes
+monotonic = getattr(time, 'monotonic', None) or _clock_gettime_monotonic() or time.time
+
+
+def next_deadline(deadline, period, now=None):
+    """
+    Advance a fixed-rate schedule by whole periods, skipping any missed
+    ticks, so the time spent working never shifts later ticks
+    :param deadline: the tick just handled, monotonic seconds
+    :ptype deadline: float
+    :param period: seconds between ticks
+    :ptype period: float
+    :param now: current monotonic time (default: now)
+    :ptype now: float
+    :return: the next tick still in the future
+    :rtype: float
+    """
+    if now is None:
+        now = monotonic()
+    deadline += period
+    if deadline <= now:
+        deadline += ((now - deadline) // period + 1) * period
+    return deadline
+
+
+class SystemClock(object):
+    """
+    The running system's wall clock, monotonic clock and sleep
+    """
+
+    @staticmethod
+    def time():
+        """
+        :return: seconds since the epoch
+        :rtype: float
+        """
+        return time.time()
+
+    @staticmethod
+    def monotonic():
+        """
+        :return: monotonic seconds, see monotonic
+        :rtype: float
+        """
+        return monotonic()
+
+    @staticmethod
+    def sleep(seconds):
+        """
+        :param seconds: time to wait
+        :ptype seconds: float
+        :return: None
+        """
+        time.sleep(seconds)
+
+
+class VirtualClock(object):
+    """
+    Simulated clock for replaying archived logs: sleep() moves time
+    forward instantly, so a day of loops runs as fast as the work allows.
+    Its monotonic time is its wall clock time, which only moves forward.
+    """
+
+    def __init__(self, start):
+        """
+        :param start: initial time, seconds since the epoch
+        :ptype start: float
+        """
+        self.now = float(start)
+
+    def time(self):
+        """
+        :return: simulated seconds since the epoch
+        :rtype: float
+        """
+        return self.now
+
+    def monotonic(self):
+        """
+        :return: simulated monotonic seconds
+        :rtype: float
+        """
+        return self.now
+
+    def sleep(self, seconds):
+        """
+        :param seconds: time to skip
+        :ptype seconds: float
+        :return: None
+        """
+        self.now += max(0.0, seconds)
@@ -0,0 +1,205 @@
+"""
+In memory crontab, read once and written back in a single batch
+"""
+
+# Schedules written as one field instead of five, ex. "@reboot touch /root/a"
+SPECIAL_SCHEDULES = ('@reboot', '@yearly', '@annually', '@monthly', '@weekly',
+                     '@daily', '@midnight', '@hourly')
+
+
+def job_identity(line):
+    """
+    Identify a crontab job by its command, so the same job at another
+    schedule is recognised as a replacement rather than a new job
+    :param line: crontab line
+    :ptype line: string
+    :return: the command, None for comments, blank and variable lines
+    :rtype: string
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split(None, 1 if line.startswith('@') else 5)
+    if line.startswith('@'):
+        if fields[0] not in SPECIAL_SCHEDULES or len(fields) < 2:
+            return None
+        return fields[1].strip()
+    if len(fields) < 6:
+        # Environment settings, ex. MAILTO=root
+        return None
+    return fields[5].strip()
+
+
+class Crontab(object):
+    """
+    The user's crontab as a list of lines. It is read with one `crontab -l`,
+    changed in memory (add, remove, replace, many jobs at a time, dedup by
+    job identity) and written with one `crontab -` fed over stdin, so the
+    number of subprocesses does not grow with the number of jobs and job
+    text is never interpreted by a shell.
+    """
+
+    def __init__(self, log=None, command='crontab', runner=None):
+        """
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        :param command: crontab executable
+        :ptype command: string
+        :param runner: runs a command instead of subprocess.Popen, ex. on
+            an asyncio event loop, see _run()
+        :ptype runner: function(list of strings, string) returning (int, string)
+        """
+        self.log = log
+        self.command = command
+        self.runner = runner
+        self.lines = None
+        self.original = None
+        self.dirty = False
+
+    @property
+    def text(self):
+        """
+        :return: crontab text, read on first use
+        :rtype: string
+        """
+        if self.lines is None:
+            self.read()
+        return '\n'.join(self.lines)
+
+    def _run(self, cmd, stdin=None):
+        """
+        :param cmd: command and arguments
+        :ptype cmd: list of strings
+        :param stdin: text fed to the command, None to leave stdin alone
+        :ptype stdin: string
+        :return: exit status and output, stderr included
+        :rtype: tuple (int, string)
+        """
+        import subprocess
+        if self.runner is not None:
+            return self.runner(cmd, stdin)
+        proc = subprocess.Popen(cmd,
+                                stdin=subprocess.PIPE if stdin is not None else None,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+        stdoutdata = proc.communicate(stdin)[0]
+        return proc.returncode, stdoutdata
+
+    def _list(self):
+        """
+        Run `crontab -l`
+        :return: crontab text, empty when the user has no crontab
+        :rtype: string
+        """
+        from subprocess import CalledProcessError
+        cmd_crontab_l = [self.command, '-l']
+        returncode, stdoutdata = self._run(cmd_crontab_l)
+        stdoutdata = stdoutdata.strip()
+        # If no crontab exists, then use an empty string
+        if stdoutdata.startswith('no crontab for'):
+            return ''
+        # For other non-success responses, raise an exception
+        if returncode != 0:
+            raise CalledProcessError(returncode, cmd_crontab_l, stdoutdata)
+        return stdoutdata
+
+    def read(self):
+        """
+        Read the current crontab, discarding uncommitted changes
+        :return: crontab text
+        :rtype: string
+        """
+        self.original = self._list()
+        self.lines = self.original.split('\n') if self.original else []
+        self.dirty = False
+        if self.log is not None:
+            self.log.info('crontab jobs read')
+        return self.original
+
+    def jobs(self):
+        """
+        :return: job identity to crontab line
+        :rtype: dict
+        """
+        if self.lines is None:
+            self.read()
+        return dict((job_identity(line), line) for line in self.lines if job_identity(line) is not None)
+
+    def add(self, lines):
+        """
+        Append jobs, skipping those already present
+        :param lines: crontab lines
+        :ptype lines: list of strings
+        :return: lines actually added
+        :rtype: list of strings
+        """
+        existing = set(line.strip() for line in self.text.split('\n'))
+        added = []
+        for line in lines:
+            if line.strip() not in existing:
+                existing.add(line.strip())
+                self.lines.append(line.strip())
+                added.append(line.strip())
+        self.dirty = self.dirty or bool(added)
+        return added
+
+    def remove(self, lines):
+        """
+        Remove jobs with the same identity as any of lines
+        :param lines: crontab lines or bare commands
+        :ptype lines: list of strings
+        :return: lines actually removed
+        :rtype: list of strings
+        """
+        identities = set(job_identity(line) or line.strip() for line in lines)
+        if self.lines is None:
+            self.read()
+        removed = [line for line in self.lines if job_identity(line) in identities]
+        if removed:
+            self.lines = [line for line in self.lines if job_identity(line) not in identities]
+            self.dirty = True
+        return removed
+
+    def replace(self, lines):
+        """
+        Add jobs, replacing any job with the same identity but a different
+        schedule, identical jobs are left untouched
+        :param lines: crontab lines
+        :ptype lines: list of strings
+        :return: lines actually added
+        :rtype: list of strings
+        """
+        jobs = self.jobs()
+        stale = [line for line in lines
+                 if job_identity(line) in jobs and jobs[job_identity(line)].strip() != line.strip()]
+        self.remove(stale)
+        return self.add(lines)
+
+    def commit(self):
+        """
+        Write the crontab with a single `crontab -`, only if it changed
+        :return: True if the crontab was written
+        :rtype: bool
+        """
+        from subprocess import CalledProcessError
+        if not self.dirty:
+            return False
+        cmd_crontab_pipe = [self.command, '-']
+        returncode, stdoutdata = self._run(cmd_crontab_pipe, self.text.strip() + '\n')
+        if returncode != 0:
+            raise CalledProcessError(returncode, cmd_crontab_pipe, stdoutdata)
+        self.original = self.text
+        self.dirty = False
+        if self.log is not None:
+            self.log.info('crontab written')
+        return True
+
+    def verify(self):
+        """
+        Re-read the installed crontab and compare it with the model
+        :return: True if the installed crontab matches
+        :rtype: bool
+        """
+        installed = self._list()
+        return installed.strip() == self.text.strip()
@@ -0,0 +1,162 @@
+"""
+Find, time stamp and categorize cron events, errors and warnings in a log
+"""
+
+from classifier import Classifier
+from logreader import reverse_segment_lines, to_native
+from scanner import LineScanner
+from targets import TouchMatcher
+from timestamps import TimestampParser, strip_stamp
+
+
+class EventReader(object):
+    """
+    Everything needed to turn raw log bytes into categorized events: the
+    byte-level prefilter, time stamp parser, touch matcher and classifier.
+    It holds no per-log state, so one reader serves the cron log of this
+    host and, in a worker process, the logs of other hosts.
+    """
+
+    def __init__(self, targets, timezone='local', rules=None):
+        """
+        :param targets: touch file targets to match, None for every file
+            touched by a cron touch command (see broker)
+        :ptype targets: list of targets.Target
+        :param timezone: see timestamps.TimestampParser
+        :ptype timezone: string
+        :param rules: rules and severity thresholds, see classifier.load_rules
+            (default: classifier defaults)
+        :ptype rules: tuple (list of dicts, dict)
+        """
+        self.matcher = TouchMatcher(targets or [])
+        self.any_touch = targets is None
+        self.timestamps = TimestampParser(timezone=timezone)
+        self.classifier = Classifier(*rules) if rules is not None else Classifier()
+        self.scanner = LineScanner(patterns=[br' CROND\['] + self.classifier.patterns,
+                                   keywords=self.classifier.keywords,
+                                   line_prefixes=self.classifier.line_prefixes)
+        self.lines_scanned = 0
+
+    @property
+    def bytes_scanned(self):
+        """
+        :return: bytes searched by the prefilter so far
+        :rtype: int
+        """
+        return self.scanner.bytes_scanned
+
+    def categorize(self, line):
+        """
+        Classify a log line once, when it is read
+        :param line: cron event, error or warning line
+        :ptype line: string
+        :return: categories the line belongs to, empty for other lines
+        :rtype: tuple of strings
+        """
+        categories = []
+        if ' CROND[' in line:
+            categories.append('cron')
+            if self.any_touch:
+                touched = self.matcher.touched(line)
+                if touched is not None:
+                    categories.extend(('touch', 'touch:' + touched))
+            else:
+                target = self.matcher.match(line)
+                if target is not None:
+                    categories.extend(('touch', target.category))
+        categories.extend(self.classifier.classify(line))
+        return tuple(categories)
+
+    def scan(self, logfile, now, oldest, end=None):
+        """
+        Read a log backward from the end, continuing into its rotated
+        generations (.1, .2.gz, ...), collecting cron events, errors and
+        warnings until the first one older than oldest. Only the lines the
+        byte-level prefilter finds are decoded.
+        :param logfile: log file
+        :ptype logfile: string
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :param oldest: start of the longest window, seconds since the epoch
+        :ptype oldest: float
+        :param end: byte offset to read backward from (default: end of file)
+        :ptype end: int
+        :return: (epoch, line) pairs, newest first
+        :rtype: list of tuples
+        """
+        events = []
+        lines = reverse_segment_lines(logfile, end=end, newer_than=oldest,
+                                      timestamp=lambda line: self.timestamps.parse(to_native(line), now),
+                                      scanner=self.scanner)
+        for line in lines:
+            self.lines_scanned += 1
+            line = to_native(line)
+            epoch = self.timestamps.parse(line, now)
+            if epoch is None:
+                continue
+            if oldest < epoch:
+                events.append((epoch, line.strip()))
+            else:
+                break
+        return events
+
+    def stamp(self, lines, now):
+        """
+        :param lines: prefiltered raw lines, oldest first
+        :ptype lines: list of bytes
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :return: (epoch, line) pairs of the lines with a time stamp, oldest first
+        :rtype: list of tuples
+        """
+        events = []
+        for line in lines:
+            self.lines_scanned += 1
+            line = to_native(line)
+            epoch = self.timestamps.parse(line, now)
+            if epoch is not None:
+                events.append((epoch, line.strip()))
+        return events
+
+    def add(self, windows, events, now):
+        """
+        Categorize events and count them, see count()
+        :param windows: aggregator to count into
+        :ptype windows: window.WindowAggregator
+        :param events: (epoch, line) pairs, oldest first
+        :ptype events: iterable of tuples
+        :param now: current time, seconds since the epoch
+        :ptype now: float
+        :return: events counted, and how many of them were errors or warnings
+        :rtype: tuple (int, int)
+        """
+        return self.count(windows, ((epoch, self.categorize(line), line) for epoch, line in events), now)
+
+    @staticmethod
+    def count(windows, events, now):
+        """
+        Count categorized events in every window, keeping lines inside the
+        primary one; errors and warnings are collapsed by message (see
+        WindowAggregator)
+        :param windows: aggregator to count into
+        :ptype windows: window.WindowAggregator
+        :param events: (epoch, categories, line) tuples, oldest first
+        :ptype events: iterable of tuples
+        :param now: current time, seconds since the epoch
+        :ptype now: float
+        :return: events counted, and how many of them were errors or warnings
+        :rtype: tuple (int, int)
+        """
+        oldest = now - windows.primary * 60
+        matched = errors = 0
+        for epoch, categories, line in events:
+            if not categories:
+                continue
+            inside = epoch > oldest
+            windows.add(epoch, categories, line if inside and 'cron' in categories else None)
+            matched += 1
+            if 'error' in categories or 'warning' in categories:
+                errors += 1
+                if inside:
+                    windows.add_message(epoch, categories, strip_stamp(line), line)
+        return matched, errors
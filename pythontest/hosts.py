@@ -0,0 +1,155 @@
+"""
+Count cron touch events, errors and warnings in the syslogs of many hosts
+at once, one log per worker process
+"""
+
+import glob
+import multiprocessing
+import os
+import re
+
+from events import EventReader
+from targets import Target
+from window import WindowAggregator
+
+# logrotate generations, ex. web1.log.1, web1.log.2.gz, read with the live log
+RE_ROTATED_NAME = re.compile(r'\.\d+(\.gz)?$')
+# Generic log names, ex. /var/log/remote/web1/syslog, are named after their directory
+GENERIC_NAMES = ('syslog', 'messages', 'cron', 'all')
+
+
+def host_name(filename):
+    """
+    :param filename: a host's log, ex. "/var/log/remote/web1.log"
+        or "/var/log/remote/web1/syslog"
+    :ptype filename: string
+    :return: host name, ex. "web1"
+    :rtype: string
+    """
+    name = os.path.basename(filename)
+    if name.endswith('.log'):
+        name = name[:-len('.log')]
+    if name in GENERIC_NAMES:
+        name = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+    return name
+
+
+def find_host_logs(pattern):
+    """
+    :param pattern: directory of host logs, or glob pattern matching them
+    :ptype pattern: string
+    :return: host name to live log file, rotated generations are skipped
+    :rtype: dict
+    """
+    if os.path.isdir(pattern):
+        candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        candidates = glob.glob(pattern)
+    logs = {}
+    for filename in sorted(candidates):
+        if not os.path.isfile(filename) or RE_ROTATED_NAME.search(filename):
+            continue
+        host = host_name(filename)
+        if host in logs:
+            raise ValueError('logs "{}" and "{}" are both for host "{}"'.format(logs[host], filename, host))
+        logs[host] = filename
+    return logs
+
+
+def host_target(target, host):
+    """
+    :param target: touch file target
+    :ptype target: targets.Target
+    :param host: host name
+    :ptype host: string
+    :return: the target's per-host touch file, "<dir>/<host>-<file>", rotated
+        with prefix "<prefix>-<host>"
+    :rtype: targets.Target
+    """
+    touch = os.path.join(os.path.dirname(target.touch), host + '-' + os.path.basename(target.touch))
+    return Target(touch, target.frequency, target.rename + '-' + host)
+
+
+def scan_host(job):
+    """
+    Worker: scan one host's log (and its rotated generations) over the
+    windows and return the counts and collapsed errors and warnings, not
+    the lines, so little is sent back to the parent
+    :param job: host, log file, now, primary window, other windows,
+        targets, timezone, rules
+    :ptype job: tuple
+    :return: aggregate with keys "host", "windows" (window minutes to counts
+        per category), "messages" (see WindowAggregator.collapsed),
+        "lines_scanned", "bytes_scanned", "events_matched", "errors_found",
+        or "host" and "error" if the log could not be read
+    :rtype: dict
+    """
+    host, logfile, now, primary, windows, targets, timezone, rules = job
+    try:
+        reader = EventReader(targets, timezone=timezone, rules=rules)
+        aggregator = WindowAggregator(primary=primary, windows=windows)
+        events = reader.scan(logfile, now, now - aggregator.longest * 60)
+        matched, errors = reader.add(aggregator, reversed(events), now)
+        return {'host': host,
+                'windows': aggregator.counts(now),
+                'messages': aggregator.collapsed(('error', 'warning')),
+                'lines_scanned': reader.lines_scanned,
+                'bytes_scanned': reader.bytes_scanned,
+                'events_matched': matched,
+                'errors_found': errors}
+    except Exception as err:
+        return {'host': host, 'error': '{}: {}'.format(logfile, err)}
+
+
+class HostPool(object):
+    """
+    A process pool, sized to the CPU cores by default, that scans every
+    host's log in parallel each loop. Processes are started once and
+    reused; the parent only merges the small per-host aggregates.
+    """
+
+    def __init__(self, pattern, processes=None):
+        """
+        :param pattern: directory of host logs, or glob pattern matching them
+        :ptype pattern: string
+        :param processes: worker processes (default: CPU cores)
+        :ptype processes: int
+        """
+        self.pattern = pattern
+        self.processes = processes or multiprocessing.cpu_count()
+        self._pool = None
+
+    def scan(self, now, primary, windows, targets, timezone='local', rules=None):
+        """
+        Scan the logs currently matching the pattern, new hosts are picked up
+        :param now: time the log check started, seconds since the epoch
+        :ptype now: float
+        :param primary: main window length in minutes
+        :ptype primary: int
+        :param windows: additional window lengths in minutes
+        :ptype windows: list of ints
+        :param targets: touch file targets to match
+        :ptype targets: list of targets.Target
+        :param timezone: see timestamps.TimestampParser
+        :ptype timezone: string
+        :param rules: see classifier.load_rules
+        :ptype rules: tuple (list of dicts, dict)
+        :return: per-host aggregates, see scan_host, in host name order
+        :rtype: list of dicts
+        """
+        jobs = [(host, logfile, now, primary, list(windows), targets, timezone, rules)
+                for host, logfile in sorted(find_host_logs(self.pattern).items())]
+        if len(jobs) <= 1 or self.processes == 1:
+            return [scan_host(job) for job in jobs]
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(processes=self.processes)
+        return self._pool.map(scan_host, jobs, chunksize=1)
+
+    def close(self):
+        """
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,482 @@
+"""
+Read log files efficiently, newest lines first
+"""
+
+import mmap
+import os
+import re
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+# Prefiltered scans (see reverse_scan) skip most bytes inside the regex
+# engine, so they work on much larger blocks
+DEFAULT_SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+# logrotate names, ex. syslog.1, syslog.2.gz
+RE_ROTATED_SUFFIX = re.compile(r'^\.(\d+)(\.gz)?$')
+
+
+def to_native(line):
+    """
+    Convert a raw log line (bytes) to the native string type,
+    undecodable bytes are replaced rather than raising
+    :param line: raw log line
+    :ptype line: bytes
+    :return: log line
+    :rtype: str
+    """
+    if isinstance(line, str):
+        return line
+    return line.decode('utf-8', 'replace')
+
+
+def reverse_lines(filename, block_size=DEFAULT_BLOCK_SIZE, end=None):
+    """
+    Yield the complete lines of a file newest-first, seeking backward
+    from the end of file in fixed-size blocks. Only the blocks the caller
+    actually consumes are read, so stopping early (ex. once a time window
+    has been passed) costs the size of the window, not the size of the file.
+    :param filename: log file to read
+    :ptype filename: string
+    :param block_size: bytes read per seek
+    :ptype block_size: int
+    :param end: byte offset to start reading backward from (default: EOF)
+    :ptype end: int
+    :return: generator of non-empty lines, without line terminators
+    :rtype: generator of bytes
+    """
+    with open(filename, 'rb') as filehandle:
+        filehandle.seek(0, os.SEEK_END)
+        position = filehandle.tell()
+        if end is not None:
+            position = min(position, end)
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            filehandle.seek(position)
+            lines = (filehandle.read(read_size) + remainder).split(b'\n')
+            # The first piece may be the tail of a line in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                line = line.rstrip(b'\r')
+                if line:
+                    yield line
+        remainder = remainder.rstrip(b'\r')
+        if remainder:
+            yield remainder
+
+
+def reverse_scan(filename, scanner, block_size=DEFAULT_BLOCK_SIZE, end=None,
+                 max_block_size=DEFAULT_SCAN_BLOCK_SIZE):
+    """
+    Yield only the candidate lines (see scanner.LineScanner) of a file,
+    newest first. The file is memory mapped and searched backward in large
+    blocks cut at line boundaries; other lines are never copied, split or
+    decoded. As with reverse_lines, blocks the caller does not consume are
+    never searched. Blocks start small and double up to max_block_size, so
+    a short window near the end of a large file stays cheap.
+    :param filename: log file to read
+    :ptype filename: string
+    :param scanner: finds the candidate lines in a block
+    :ptype scanner: scanner.LineScanner
+    :param block_size: bytes searched in the first block
+    :ptype block_size: int
+    :param end: byte offset to start reading backward from (default: EOF)
+    :ptype end: int
+    :param max_block_size: largest block searched at once
+    :ptype max_block_size: int
+    :return: generator of candidate lines, without line terminators
+    :rtype: generator of bytes
+    """
+    with open(filename, 'rb') as filehandle:
+        size = os.fstat(filehandle.fileno()).st_size
+        if end is not None:
+            size = min(size, end)
+        if size <= 0:
+            return
+        mapped = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            block_end = size
+            while block_end > 0:
+                block_start = max(0, block_end - block_size)
+                while block_start > 0:
+                    # Start the block just after a line terminator
+                    newline = mapped.find(b'\n', block_start, block_end)
+                    if newline >= 0:
+                        block_start = newline + 1
+                        break
+                    # A single line longer than the block, widen it
+                    block_start = max(0, block_start - block_size)
+                for line in reversed(list(scanner.lines(mapped, block_start, block_end))):
+                    yield line
+                block_end = block_start
+                block_size = min(block_size * 2, max_block_size)
+        finally:
+            mapped.close()
+
+
+def rotated_segments(filename):
+    """
+    List a log file and its logrotate generations, newest first,
+    ex. syslog, syslog.1, syslog.2.gz, syslog.3.gz
+    :param filename: live log file
+    :ptype filename: string
+    :return: existing file names
+    :rtype: list of strings
+    """
+    dirname, basename = os.path.split(os.path.abspath(filename))
+    generations = []
+    for name in os.listdir(dirname):
+        if name.startswith(basename):
+            match = RE_ROTATED_SUFFIX.match(name[len(basename):])
+            if match is not None:
+                generations.append((int(match.group(1)), os.path.join(dirname, name)))
+    segments = [filename] if os.path.exists(filename) else []
+    return segments + [name for _, name in sorted(generations)]
+
+
+def _gzip_candidates(filehandle, scanner):
+    """
+    :param filehandle: decompressing file object
+    :ptype filehandle: gzip.GzipFile
+    :param scanner: finds the candidate lines in a block
+    :ptype scanner: scanner.LineScanner
+    :return: candidate lines, oldest first
+    :rtype: generator of bytes
+    """
+    remainder = b''
+    while True:
+        block = filehandle.read(DEFAULT_SCAN_BLOCK_SIZE)
+        if not block:
+            break
+        block = remainder + block
+        cut = block.rfind(b'\n') + 1
+        remainder = block[cut:]
+        for line in scanner.lines(block, 0, cut):
+            yield line
+    for line in scanner.lines(remainder):
+        yield line
+
+
+def _reverse_gzip_lines(filename, newer_than=None, timestamp=None, scanner=None):
+    """
+    Decompress a gzip log in a single streaming pass (no temporary file)
+    and yield its lines newest first. Gzip can not be read backward, so
+    the lines are held in memory; with newer_than and timestamp only the
+    lines inside the window are kept, with scanner only candidate lines.
+    :param filename: gzip compressed log file
+    :ptype filename: string
+    :param newer_than: drop lines stamped before this time
+    :ptype newer_than: float
+    :param timestamp: returns a line's time, or None if it has none
+    :ptype timestamp: function(bytes) -> float
+    :param scanner: only yield the lines it finds (default: all lines)
+    :ptype scanner: scanner.LineScanner
+    :return: generator of non-empty lines, without line terminators
+    :rtype: generator of bytes
+    """
+    import gzip
+    kept = []
+    with gzip.open(filename, 'rb') as filehandle:
+        lines = filehandle if scanner is None else _gzip_candidates(filehandle, scanner)
+        for line in lines:
+            line = line.rstrip(b'\r\n')
+            if not line:
+                continue
+            if newer_than is not None and timestamp is not None:
+                epoch = timestamp(line)
+                if epoch is not None and epoch <= newer_than:
+                    continue
+            kept.append(line)
+    for line in reversed(kept):
+        yield line
+
+
+def reverse_segment_lines(filename, block_size=DEFAULT_BLOCK_SIZE, end=None,
+                          newer_than=None, timestamp=None, scanner=None):
+    """
+    Yield lines newest first across the live log file and then its rotated
+    generations (see rotated_segments), so a window that started before the
+    last logrotate is still complete. An older generation is only opened
+    when its modification time, the time of its last line, is inside the
+    window; the caller stops reading once it sees a line older than the
+    window, so generations beyond that are never opened. With a scanner
+    only candidate lines are yielded (see reverse_scan).
+    :param filename: live log file
+    :ptype filename: string
+    :param block_size: bytes read per seek
+    :ptype block_size: int
+    :param end: byte offset to read the live file backward from (default: EOF)
+    :ptype end: int
+    :param newer_than: start of the window, seconds since the epoch
+    :ptype newer_than: float
+    :param timestamp: returns a line's time, or None if it has none
+    :ptype timestamp: function(bytes) -> float
+    :param scanner: only yield the lines it finds (default: all lines)
+    :ptype scanner: scanner.LineScanner
+    :return: generator of non-empty lines, without line terminators
+    :rtype: generator of bytes
+    """
+    def backward(segment, end=None):
+        if scanner is None:
+            return reverse_lines(segment, block_size=block_size, end=end)
+        return reverse_scan(segment, scanner, block_size=block_size, end=end)
+
+    for number, segment in enumerate(rotated_segments(filename)):
+        if number == 0 and segment == filename:
+            for line in backward(segment, end=end):
+                yield line
+            continue
+        if newer_than is not None and os.path.getmtime(segment) <= newer_than:
+            return
+        if segment.endswith('.gz'):
+            lines = _reverse_gzip_lines(segment, newer_than=newer_than, timestamp=timestamp,
+                                        scanner=scanner)
+        else:
+            lines = backward(segment)
+        for line in lines:
+            yield line
+
+
+class LogCheckpoint(object):
+    """
+    Remember how far a log file has been read (byte offset, inode and size)
+    so each call to read_new() returns only the lines appended since the
+    previous call. Truncation (size shrank) and rotation (inode changed)
+    restart reading at the beginning of the live file; on rotation the
+    unread tail of the previous file is still collected from its first
+    rotated name (ex. /var/log/syslog.1) when it can be found there.
+    New data is read in blocks, so a long outage or a burst of logging
+    costs one block of memory plus the lines kept, not all of it at once.
+    """
+
+    block_size = DEFAULT_BLOCK_SIZE
+
+    def __init__(self, filename, offset=0, inode=None, size=0):
+        """
+        :param filename: log file to follow
+        :ptype filename: string
+        :param offset: bytes already consumed
+        :ptype offset: int
+        :param inode: inode of the file when offset was recorded
+        :ptype inode: int
+        :param size: size of the file when offset was recorded
+        :ptype size: int
+        """
+        self.filename = filename
+        self.offset = offset
+        self.inode = inode
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, filename, saved=None):
+        """
+        Restore a checkpoint saved by to_dict(), ignoring one for another file
+        :param filename: log file to follow
+        :ptype filename: string
+        :param saved: previously saved checkpoint
+        :ptype saved: dict
+        :return: checkpoint
+        :rtype: LogCheckpoint
+        """
+        if not saved or saved.get('filename') != filename:
+            return cls(filename)
+        return cls(filename,
+                   offset=saved.get('offset', 0),
+                   inode=saved.get('inode'),
+                   size=saved.get('size', 0))
+
+    def to_dict(self):
+        """
+        :return: JSON serializable checkpoint
+        :rtype: dict
+        """
+        return {'filename': self.filename,
+                'offset': self.offset,
+                'inode': self.inode,
+                'size': self.size}
+
+    @property
+    def started(self):
+        """
+        :return: True once a position in the file has been recorded
+        :rtype: bool
+        """
+        return self.inode is not None
+
+    def seek_end(self):
+        """
+        Skip everything currently in the file, ex. after the existing
+        content has been scanned some other way
+        :return: None
+        """
+        stat = os.stat(self.filename)
+        self.inode = stat.st_ino
+        self.size = stat.st_size
+        self.offset = stat.st_size
+
+    def read_new(self, scanner=None):
+        """
+        Read the complete lines appended since the last call, a trailing
+        partial line is left for the next call
+        :param scanner: only return the lines it finds (default: all lines)
+        :ptype scanner: scanner.LineScanner
+        :return: new non-empty lines, oldest first, without line terminators
+        :rtype: list of bytes
+        """
+        stat = os.stat(self.filename)
+        lines = []
+        if self.inode is not None and stat.st_ino != self.inode:
+            lines.extend(self._read_rotated(scanner))
+            self.offset = 0
+        elif stat.st_size < self.offset:
+            # Truncated in place (ex. logrotate copytruncate)
+            self.offset = 0
+        self.inode = stat.st_ino
+        lines.extend(self._read_from(self.filename, scanner=scanner))
+        self.size = stat.st_size
+        return lines
+
+    def _read_rotated(self, scanner=None):
+        """
+        Collect the unread tail of the file that was rotated away
+        :param scanner: only return the lines it finds (default: all lines)
+        :ptype scanner: scanner.LineScanner
+        :return: lines, oldest first
+        :rtype: list of bytes
+        """
+        rotated = self.filename + '.1'
+        try:
+            if os.stat(rotated).st_ino == self.inode:
+                # Nothing more will be appended, keep a final partial line
+                return self._read_from(rotated, partial=True, scanner=scanner)
+        except OSError:
+            pass
+        return []
+
+    def _read_from(self, filename, partial=False, scanner=None):
+        """
+        Read complete lines from self.offset, block by block, and advance
+        it past them
+        :param filename: file to read
+        :ptype filename: string
+        :param partial: also return a trailing line without a terminator
+        :ptype partial: bool
+        :param scanner: only return the lines it finds (default: all lines)
+        :ptype scanner: scanner.LineScanner
+        :return: lines, oldest first
+        :rtype: list of bytes
+        """
+        lines = []
+        remainder = b''
+        with open(filename, 'rb') as filehandle:
+            filehandle.seek(self.offset)
+            while True:
+                block = filehandle.read(self.block_size)
+                if not block:
+                    break
+                data = remainder + block
+                # A line cut by the block end is carried into the next block
+                end = data.rfind(b'\n') + 1
+                lines.extend(self._split(data, end, scanner))
+                self.offset += end
+                remainder = data[end:]
+        if partial and remainder:
+            lines.extend(self._split(remainder, len(remainder), scanner))
+            self.offset += len(remainder)
+        return lines
+
+    @staticmethod
+    def _split(data, end, scanner=None):
+        """
+        :param data: block of the log
+        :ptype data: bytes
+        :param end: length of the complete lines at the start of data
+        :ptype end: int
+        :param scanner: only return the lines it finds (default: all lines)
+        :ptype scanner: scanner.LineScanner
+        :return: non-empty lines, oldest first
+        :rtype: list of bytes
+        """
+        if scanner is not None:
+            return [line for line in scanner.lines(data, 0, end) if line.strip()]
+        return [line.rstrip(b'\r') for line in data[:end].split(b'\n') if line.strip()]
+
+
+def log_time_range(filename, timestamp, limit=1000):
+    """
+    :param filename: log file
+    :ptype filename: string
+    :param timestamp: returns a line's time, or None if it has none
+    :ptype timestamp: function(bytes) -> float
+    :param limit: lines to try at each end
+    :ptype limit: int
+    :return: times of the first and last stamped lines, None when not found
+    :rtype: tuple (float, float)
+    """
+    first = last = None
+    with open(filename, 'rb') as filehandle:
+        for number, line in enumerate(filehandle):
+            first = timestamp(line)
+            if first is not None or number >= limit:
+                break
+    for number, line in enumerate(reverse_lines(filename)):
+        last = timestamp(line)
+        if last is not None or number >= limit:
+            break
+    return first, last
+
+
+class ReplayCursor(object):
+    """
+    Follow an archived log forward in time, giving the byte offset just
+    past the last line stamped at or before a point in time, so the log
+    can be read as it was then (ex. reverse_segment_lines(end=offset)).
+    Blocks whose last line is not yet due are skipped without looking at
+    their other lines; lines without a stamp go with the line before.
+    """
+
+    def __init__(self, filename, timestamp, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        :param filename: archived log file
+        :ptype filename: string
+        :param timestamp: returns a line's time, or None if it has none
+        :ptype timestamp: function(bytes) -> float
+        :param block_size: bytes read at a time
+        :ptype block_size: int
+        """
+        self.filename = filename
+        self.timestamp = timestamp
+        self.block_size = block_size
+        self.offset = 0
+
+    def advance(self, until):
+        """
+        :param until: simulated current time, seconds since the epoch
+        :ptype until: float
+        :return: byte offset just past the last line due by until
+        :rtype: int
+        """
+        with open(self.filename, 'rb') as filehandle:
+            while True:
+                filehandle.seek(self.offset)
+                block = filehandle.read(self.block_size)
+                if not block:
+                    return self.offset
+                cut = block.rfind(b'\n') + 1
+                if cut == 0:
+                    # A final line without terminator, or one longer than a block
+                    cut = len(block)
+                last = block.rfind(b'\n', 0, cut - 1) + 1
+                epoch = self.timestamp(block[last:cut])
+                if epoch is not None and epoch <= until:
+                    self.offset += cut
+                    continue
+                position = 0
+                while position < cut:
+                    end = block.find(b'\n', position, cut)
+                    end = cut if end < 0 else end + 1
+                    epoch = self.timestamp(block[position:end])
+                    if epoch is not None and epoch > until:
+                        return self.offset
+                    self.offset += end - position
+                    position = end
@@ -0,0 +1,225 @@
+"""
+Phase timers, counters and gauges for the standard loop, exported as a
+Prometheus textfile-collector file and/or a JSON stats file
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from clock import monotonic
+from state import atomic_write
+
+METRIC_PREFIX = 'pythontest'
+PROFILERS = ('cprofile', 'tracemalloc')
+
+# name: (type, help) for everything exported
+DESCRIPTIONS = {
+    'lines_scanned': ('counter', 'Candidate cron log lines decoded'),
+    'bytes_scanned': ('counter', 'Cron log bytes searched by the prefilter'),
+    'events_matched': ('counter', 'Cron events counted into the windows'),
+    'errors_found': ('counter', 'Warning and error events counted into the windows'),
+    'rotations': ('counter', 'Touch files rotated'),
+    'loops': ('counter', 'Loops run'),
+    'schedule_lag_seconds': ('gauge', 'How late the last loop started compared to its schedule'),
+}
+
+
+class Metrics(object):
+    """
+    Collect per-phase monotonic timings (last duration, running total and
+    count per phase), monotonically increasing counters and gauges, and
+    write them out atomically once per loop. Updates and snapshots hold a
+    lock, the --asyncio runtime rotates from several pool threads at once.
+    """
+
+    def __init__(self, prometheus=None, stats=None, log=None):
+        """
+        :param prometheus: Prometheus textfile-collector file (*.prom), None to skip
+        :ptype prometheus: string
+        :param stats: JSON stats file, None to skip
+        :ptype stats: string
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        """
+        self.prometheus = prometheus
+        self.stats = stats
+        self.log = log
+        self.counters = dict((name, 0) for name, (kind, _) in DESCRIPTIONS.items() if kind == 'counter')
+        self.gauges = dict((name, 0.0) for name, (kind, _) in DESCRIPTIONS.items() if kind == 'gauge')
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        """
+        :param name: counter name, see DESCRIPTIONS
+        :ptype name: string
+        :param value: increment
+        :ptype value: int
+        :return: None
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        """
+        :param name: gauge name, see DESCRIPTIONS
+        :ptype name: string
+        :param value: current value
+        :ptype value: float
+        :return: None
+        """
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block on the monotonic clock
+        :param name: phase name, ex. "parse"
+        :ptype name: string
+        :return: context manager
+        """
+        started = monotonic()
+        try:
+            yield
+        finally:
+            elapsed = monotonic() - started
+            with self._lock:
+                phase = self.phases.setdefault(name, {'last': 0.0, 'sum': 0.0, 'count': 0})
+                phase['last'] = elapsed
+                phase['sum'] += elapsed
+                phase['count'] += 1
+
+    def snapshot(self):
+        """
+        :return: all metrics
+        :rtype: dict
+        """
+        with self._lock:
+            return {'time': time.time(),
+                    'pid': os.getpid(),
+                    'counters': dict(self.counters),
+                    'gauges': dict(self.gauges),
+                    'phases': dict((name, dict(values)) for name, values in self.phases.items())}
+
+    def prometheus_text(self):
+        """
+        :return: metrics in the Prometheus text exposition format
+        :rtype: string
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(list(snapshot['counters'].items()) + list(snapshot['gauges'].items())):
+            kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+            metric = '{}_{}{}'.format(METRIC_PREFIX, name, '_total' if kind == 'counter' else '')
+            lines.append('# HELP {} {}'.format(metric, description))
+            lines.append('# TYPE {} {}'.format(metric, kind))
+            lines.append('{} {}'.format(metric, value))
+        phases = snapshot['phases']
+        if phases:
+            metric = METRIC_PREFIX + '_phase_seconds'
+            lines.append('# HELP {} Time spent per loop phase'.format(metric))
+            lines.append('# TYPE {} summary'.format(metric))
+            for name, values in sorted(phases.items()):
+                lines.append('{}_sum{{phase="{}"}} {:.6f}'.format(metric, name, values['sum']))
+                lines.append('{}_count{{phase="{}"}} {}'.format(metric, name, values['count']))
+            metric = METRIC_PREFIX + '_phase_last_seconds'
+            lines.append('# HELP {} Duration of the most recent run of each loop phase'.format(metric))
+            lines.append('# TYPE {} gauge'.format(metric))
+            for name, values in sorted(phases.items()):
+                lines.append('{}{{phase="{}"}} {:.6f}'.format(metric, name, values['last']))
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """
+        Atomically rewrite the configured metrics files, errors are logged
+        rather than stopping the loop
+        :return: None
+        """
+        try:
+            if self.prometheus is not None:
+                atomic_write(self.prometheus, self.prometheus_text(), mode=0o644)
+            if self.stats is not None:
+                atomic_write(self.stats, json.dumps(self.snapshot(), sort_keys=True) + '\n', mode=0o644)
+        except (IOError, OSError) as err:
+            if self.log is not None:
+                self.log.warning('metrics not exported: {}'.format(err))
+
+
+class Profiler(object):
+    """
+    Optional whole-run profiling, "cprofile" (CPU, pstats file) or
+    "tracemalloc" (Python 3 only, top allocation sites as text)
+    """
+
+    def __init__(self, kind, output, log=None):
+        """
+        :param kind: one of PROFILERS
+        :ptype kind: string
+        :param output: file written by stop()
+        :ptype output: string
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        """
+        self.kind = kind
+        self.output = output
+        self.log = log
+        self._profile = None
+        self._running = False
+
+    def start(self):
+        """
+        :return: None
+        """
+        if self.kind == 'cprofile':
+            self._start_cprofile()
+        else:
+            self._start_tracemalloc()
+        self._running = True
+
+    def _start_cprofile(self):
+        """
+        :return: None
+        """
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    @staticmethod
+    def _start_tracemalloc():
+        """
+        :return: None
+        """
+        import tracemalloc
+        tracemalloc.start(25)
+
+    def stop(self):
+        """
+        Stop profiling and write the results, safe to call more than once
+        :return: None
+        """
+        if not self._running:
+            return
+        self._running = False
+        if self.kind == 'cprofile':
+            self._profile.disable()
+            self._profile.dump_stats(self.output)
+        else:
+            self._stop_tracemalloc()
+        if self.log is not None:
+            self.log.info('{} profile written to {}'.format(self.kind, self.output))
+
+    def _stop_tracemalloc(self):
+        """
+        Write the top allocation sites as text
+        :return: None
+        """
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        with open(self.output, 'wt') as filehandle:
+            for stat in snapshot.statistics('lineno')[:50]:
+                filehandle.write(str(stat) + '\n')
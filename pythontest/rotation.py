@@ -0,0 +1,383 @@
+"""
+Rotate touch files to numbered names, compress them in the background and
+prune old ones
+"""
+
+import os
+import re
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from clock import SystemClock
+
+
+class Compressor(object):
+    """
+    A single background thread gzip compressing rotated files, so the main
+    loop never waits on compression. Each file is compressed to <name>.gz,
+    then the original is removed and done(name, gz_name, gz_size) is called.
+    Given an executor, ex. the asyncio runtime's bounded thread pool, the
+    files are compressed there instead of in a thread of its own. Files
+    queued or being compressed are busy(), so retention leaves them alone.
+    """
+
+    def __init__(self, log=None, executor=None):
+        """
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        :param executor: runs the compressions (default: a thread of its own)
+        :ptype executor: concurrent.futures.Executor
+        """
+        self.log = log
+        self.executor = executor
+        self._busy = set()
+        self._busy_lock = threading.Lock()
+        self._futures = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='compressor')
+        self._thread.daemon = True
+        if executor is None:
+            self._thread.start()
+
+    def submit(self, filename, done=None):
+        """
+        :param filename: file to compress
+        :ptype filename: string
+        :param done: called after compression
+        :ptype done: function(string, string, int)
+        :return: None
+        """
+        with self._busy_lock:
+            self._busy.add(filename)
+        if self.executor is not None:
+            self._futures = [future for future in self._futures if not future.done()]
+            self._futures.append(self.executor.submit(self._compress_one, filename, done))
+        else:
+            self._queue.put((filename, done))
+
+    def busy(self, filename):
+        """
+        :param filename: rotated file
+        :ptype filename: string
+        :return: True while filename is queued or being compressed
+        :rtype: bool
+        """
+        with self._busy_lock:
+            return filename in self._busy
+
+    def _run(self):
+        """
+        Worker thread, compress files until close() queues None
+        :return: None
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._compress_one(*item)
+
+    def _compress_one(self, filename, done=None):
+        """
+        :param filename: file to compress
+        :ptype filename: string
+        :param done: called after compression
+        :ptype done: function(string, string, int)
+        :return: None
+        """
+        try:
+            try:
+                compressed = self.compress(filename)
+            finally:
+                with self._busy_lock:
+                    self._busy.discard(filename)
+            if compressed is not None and done is not None:
+                done(filename, compressed, os.path.getsize(compressed))
+        except Exception as err:
+            if self.log is not None:
+                self.log.error(err, exc_info=True)
+
+    @staticmethod
+    def compress(filename):
+        """
+        :param filename: file to compress, removed afterwards
+        :ptype filename: string
+        :return: compressed file name, None if filename no longer exists
+        :rtype: string
+        """
+        import gzip
+        import shutil
+        if not os.path.exists(filename):
+            return None
+        compressed = filename + '.gz'
+        partial = compressed + '.part'
+        with open(filename, 'rb') as source:
+            with gzip.open(partial, 'wb') as target:
+                shutil.copyfileobj(source, target)
+        shutil.copystat(filename, partial)
+        os.rename(partial, compressed)
+        os.remove(filename)
+        return compressed
+
+    def close(self):
+        """
+        Finish the queued compressions and stop the thread
+        :return: None
+        """
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class Rotator(object):
+    """
+    Decide when a touch file is due for rotation (every N loops, or once it
+    reaches a size, a line count or an age) and move it to <prefix>.1,
+    <prefix>.2, ... per README.md section (1.d.i). The next suffix and the
+    rotated files are tracked in the state file, the rotate directory is
+    only scanned once, the first time a prefix is seen, so existing files
+    are never overwritten. Each rotated file can be added to the prefix's
+    time index (see archive.ArchiveIndex) before it is gzip compressed in
+    the background, and the oldest are removed beyond a file count or a
+    total size. The rotation state is only changed holding the state
+    file's lock, so a save from another thread never sees it half changed;
+    the rotated file is indexed between the two locked sections.
+    """
+
+    def __init__(self, state, log=None, loops=15, max_bytes=0, max_lines=0, max_age=0,
+                 compress=False, keep=0, keep_bytes=0, clock=None, executor=None, index=False):
+        """
+        :param state: state file, keys "rotation" and "touchfiles" are used
+        :ptype state: StateFile
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        :param loops: rotate every this many loops (0: never)
+        :ptype loops: int
+        :param max_bytes: rotate once the file is this large (0: no limit)
+        :ptype max_bytes: int
+        :param max_lines: rotate once the file has this many lines (0: no limit)
+        :ptype max_lines: int
+        :param max_age: rotate once the file is this many seconds old (0: no limit)
+        :ptype max_age: int
+        :param compress: gzip rotated files in the background
+        :ptype compress: bool
+        :param keep: rotated files kept per prefix (0: all)
+        :ptype keep: int
+        :param keep_bytes: total size of rotated files kept per prefix (0: no limit)
+        :ptype keep_bytes: int
+        :param clock: time source for max_age (default: clock.SystemClock)
+        :ptype clock: clock.SystemClock or clock.VirtualClock
+        :param executor: compresses rotated files (default: a thread of its
+            own), see Compressor
+        :ptype executor: concurrent.futures.Executor
+        :param index: add rotated files to <prefix>.index, see archive.ArchiveIndex
+        :ptype index: bool
+        """
+        self.state = state
+        self.log = log
+        self.loops = loops
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.max_age = max_age
+        self.keep = keep
+        self.keep_bytes = keep_bytes
+        self.clock = clock or SystemClock()
+        self.index = index
+        # Shared with StateFile.save(), the compressor changes the state too
+        self._lock = state.lock
+        # Indexing is done without it, one rotation at a time appends to an index
+        self._index_lock = threading.Lock()
+        self._rotation = self.state.get('rotation', {})
+        self._touchfiles = self.state.get('touchfiles', {})
+        self.state.set('rotation', self._rotation)
+        self.state.set('touchfiles', self._touchfiles)
+        self.compressor = Compressor(log=log, executor=executor) if compress else None
+
+    def _touchfile(self, filename):
+        """
+        :param filename: touch file
+        :ptype filename: string
+        :return: lines written and start time of the current touch file
+        :rtype: dict
+        """
+        info = self._touchfiles.get(filename)
+        if info is None:
+            info = self._touchfiles[filename] = {'lines': 0, 'started': self.clock.time()}
+            # Count an existing file once, afterwards appends are counted
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as filehandle:
+                    info['lines'] = sum(chunk.count(b'\n') for chunk in
+                                        iter(lambda: filehandle.read(64 * 1024), b''))
+                info['started'] = os.path.getmtime(filename)
+        return info
+
+    def note_append(self, filename, text):
+        """
+        Count lines appended to a touch file
+        :param filename: touch file
+        :ptype filename: string
+        :param text: text appended
+        :ptype text: string
+        :return: None
+        """
+        with self._lock:
+            self._touchfile(filename)['lines'] += text.count('\n')
+
+    def due(self, filename, loop_count):
+        """
+        :param filename: touch file
+        :ptype filename: string
+        :param loop_count: loops run so far
+        :ptype loop_count: int
+        :return: why the file should be rotated, None if it should not
+        :rtype: string
+        """
+        if not os.path.isfile(filename):
+            return None
+        if self.loops and loop_count % self.loops == 0:
+            return '{} loops'.format(self.loops)
+        if self.max_bytes and os.path.getsize(filename) >= self.max_bytes:
+            return '{} bytes'.format(self.max_bytes)
+        with self._lock:
+            info = dict(self._touchfile(filename))
+        if self.max_lines and info['lines'] >= self.max_lines:
+            return '{} lines'.format(self.max_lines)
+        if self.max_age and self.clock.time() - info['started'] >= self.max_age:
+            return '{} seconds old'.format(self.max_age)
+        return None
+
+    def _prefix(self, prefix):
+        """
+        :param prefix: rotated file location and prefix
+        :ptype prefix: string
+        :return: next suffix and rotated files [suffix, name, size] for prefix
+        :rtype: dict
+        """
+        rotation = self._rotation.get(prefix)
+        if rotation is None:
+            # First use of this prefix, look once for files rotated earlier
+            dirname, basename = os.path.split(os.path.abspath(prefix))
+            pattern = re.compile(r'^' + re.escape(basename) + r'\.(\d+)(\.gz)?$')
+            files = []
+            for name in os.listdir(dirname):
+                match = pattern.match(name)
+                if match is not None:
+                    path = os.path.join(dirname, name)
+                    files.append([int(match.group(1)), path, os.path.getsize(path)])
+            files.sort()
+            rotation = self._rotation[prefix] = {
+                'next': files[-1][0] + 1 if files else 1,
+                'files': files}
+        return rotation
+
+    def rotate(self, filename, prefix):
+        """
+        Move the touch file to the next numbered name and index it, then
+        queue it for compression and apply retention
+        :param filename: touch file
+        :ptype filename: string
+        :param prefix: rotated file location and prefix
+        :ptype prefix: string
+        :return: rotated file name
+        :rtype: string
+        """
+        import shutil
+        with self._lock:
+            rotation = self._prefix(prefix)
+            suffix = rotation['next']
+            rotate_filename = '{}.{}'.format(prefix, suffix)
+            while os.path.exists(rotate_filename) or os.path.exists(rotate_filename + '.gz'):
+                suffix += 1
+                rotate_filename = '{}.{}'.format(prefix, suffix)
+            shutil.move(filename, rotate_filename)
+            rotation['next'] = suffix + 1
+            rotation['files'].append([suffix, rotate_filename, os.path.getsize(rotate_filename)])
+            self._touchfiles.pop(filename, None)
+        # Reading the whole file would hold up state saves and compressions,
+        # the file is the newest of its prefix so retention keeps it meanwhile
+        if self.index:
+            self._index(prefix, rotate_filename)
+        with self._lock:
+            # Queued before retention runs again, so it is never removed mid-compression
+            if self.compressor is not None:
+                self.compressor.submit(rotate_filename, self._compressed)
+            self._retain(rotation)
+            self._save()
+        return rotate_filename
+
+    def _index(self, prefix, filename):
+        """
+        Add a rotated file to the prefix's index, a failure is logged and
+        the rotation goes on, the file is only missing from queries
+        :param prefix: rotated file location and prefix
+        :ptype prefix: string
+        :param filename: rotated touch file
+        :ptype filename: string
+        :return: None
+        """
+        from archive import ArchiveIndex
+        try:
+            with self._index_lock:
+                ArchiveIndex(prefix).add(filename)
+        except (IOError, OSError, ValueError) as err:
+            if self.log is not None:
+                self.log.error('touch file "{}" not indexed: {}'.format(filename, err))
+
+    def _compressed(self, filename, compressed, size):
+        """
+        Compressor callback, record the compressed name and size
+        :return: None
+        """
+        with self._lock:
+            for rotation in self._rotation.values():
+                for entry in rotation['files']:
+                    if entry[1] == filename:
+                        entry[1], entry[2] = compressed, size
+                        self._retain(rotation)
+                        return
+
+    def _retain(self, rotation):
+        """
+        Remove the oldest rotated files beyond the count and size limits,
+        call with self._lock held. A file still queued or being compressed
+        is kept for now, _compressed() applies retention again.
+        :param rotation: see _prefix()
+        :ptype rotation: dict
+        :return: None
+        """
+        files = rotation['files']
+        total = sum(entry[2] for entry in files)
+        while files and ((self.keep and len(files) > self.keep)
+                         or (self.keep_bytes and total > self.keep_bytes and len(files) > 1)):
+            suffix, name, size = files[0]
+            if self.compressor is not None and self.compressor.busy(name):
+                break
+            files.pop(0)
+            total -= size
+            for path in (name, name + '.gz'):
+                if os.path.exists(path):
+                    os.remove(path)
+            if self.log is not None:
+                self.log.info('removed rotated touch file "{}"'.format(name))
+
+    def _save(self):
+        """
+        :return: None
+        """
+        self.state.save()
+
+    def close(self):
+        """
+        Finish background compression and save the rotation state
+        :return: None
+        """
+        if self.compressor is not None:
+            self.compressor.close()
+        with self._lock:
+            self._save()
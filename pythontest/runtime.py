@@ -0,0 +1,210 @@
+"""
+asyncio runtime: the reports of every touch rate and the watcher run as
+tasks on one event loop, Python 3.7 or later, imported only for --asyncio
+"""
+
+import asyncio
+import signal
+import subprocess
+
+from clock import next_deadline
+from watcher import InotifyWatcher, make_watcher
+
+
+class AsyncRuntime(object):
+    """
+    Run an Ops instance on one asyncio event loop. Targets sharing a touch
+    rate form one schedule task on a drift free fixed-rate schedule, so
+    hundreds of schedules are hundreds of sleeping tasks rather than
+    threads or processes. Blocking work runs in the Ops bounded thread
+    pool: parsing the log and appending to the touch files share the
+    parsed events and the touch writer, so one schedule at a time does
+    them, then each schedule rotates its own touch files alongside the
+    others. Schedules due together share one parse. Crontab
+    commands run as asyncio subprocesses. SIGINT and SIGTERM cancel every
+    task and the run ends like an interrupted standard_loop; exit() calls
+    inside Ops keep their exit codes.
+    """
+
+    def __init__(self, ops):
+        """
+        :param ops: configured operations, with ops.executor
+        :ptype ops: PythonTest.Ops
+        """
+        self.ops = ops
+        self.log = ops.log
+        self.loop = None
+        # Held while parsing and updating the touch files, see _schedule()
+        self._lock = None
+        # Parses started, a schedule shares any parse started after it was due
+        self._generation = 0
+
+    def run(self):
+        """
+        :return: None
+        """
+        asyncio.run(self._main())
+
+    def schedules(self):
+        """
+        :return: touch file targets grouped by touch rate, fastest first
+        :rtype: list of lists of Target
+        """
+        rates = {}
+        for target in self.ops.targets:
+            rates.setdefault(target.frequency, []).append(target)
+        return [rates[frequency] for frequency in sorted(rates)]
+
+    async def _main(self):
+        """
+        :return: None
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(self.ops.executor)
+        self._lock = asyncio.Lock()
+        main = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(signum, main.cancel)
+        try:
+            await self.new_cronjob()
+            start = self.loop.time()
+            tasks = [asyncio.ensure_future(self._schedule(targets, start)) for targets in self.schedules()]
+            if self.ops.args.watch:
+                tasks.append(asyncio.ensure_future(self._watch()))
+            try:
+                maxtime = self.ops._standard_loop_maxtime
+                done, _ = await asyncio.wait(tasks, timeout=maxtime or None,
+                                             return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+                self.log.info('loop competed')
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            self.log.warning('loop terminated by request')
+        finally:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                self.loop.remove_signal_handler(signum)
+
+    async def new_cronjob(self):
+        """
+        Ops.new_cronjob, with the crontab commands run as asyncio subprocesses
+        :return: None
+        """
+        self.ops.crontab.runner = self._run_crontab
+        await self.loop.run_in_executor(None, self.ops.new_cronjob)
+
+    def _run_crontab(self, cmd, stdin=None):
+        """
+        crontable.Crontab runner, called from a pool thread: run the
+        command on the event loop and wait for it there
+        :param cmd: command and arguments
+        :ptype cmd: list of strings
+        :param stdin: text fed to the command
+        :ptype stdin: string
+        :return: exit status and output, stderr included
+        :rtype: tuple (int, string)
+        """
+        return asyncio.run_coroutine_threadsafe(self._subprocess(cmd, stdin), self.loop).result()
+
+    @staticmethod
+    async def _subprocess(cmd, stdin=None):
+        """
+        :param cmd: command and arguments
+        :ptype cmd: list of strings
+        :param stdin: text fed to the command, None to leave stdin alone
+        :ptype stdin: string
+        :return: exit status and output, stderr included
+        :rtype: tuple (int, string)
+        """
+        proc = await asyncio.create_subprocess_exec(*cmd,
+                                                    stdin=subprocess.PIPE if stdin is not None else None,
+                                                    stdout=subprocess.PIPE,
+                                                    stderr=subprocess.STDOUT)
+        stdoutdata = (await proc.communicate(stdin.encode('utf-8') if stdin is not None else None))[0]
+        return proc.returncode, stdoutdata.decode('utf-8', 'replace')
+
+    async def _schedule(self, targets, start):
+        """
+        Report and rotate targets sharing a touch rate, on a fixed-rate schedule
+        :param targets: touch file targets with the same frequency
+        :ptype targets: list of Target
+        :param start: first deadline, the same for every schedule so those
+            due together wake up together, event loop time
+        :ptype start: float
+        :return: None
+        """
+        period = targets[0].frequency * 60
+        deadline = start
+        loop_count = 0
+        while True:
+            loop_count += 1
+            # Any parse started from now on has the events this loop needs
+            due = self._generation + 1
+            async with self._lock:
+                parse = self._generation < due
+                if parse:
+                    # Let the schedules due at the same time wake up first, they share this parse
+                    await asyncio.sleep(0)
+                    self._generation += 1
+                self.ops._standard_loop_deadline = deadline
+                await self.loop.run_in_executor(None, self._run_phases, targets, loop_count, parse)
+            await self.loop.run_in_executor(None, self._rotate_phase, targets, loop_count)
+            deadline = next_deadline(deadline, period, now=self.loop.time())
+            self.log.info('pausing {} touch files {} min'.format(len(targets), period // 60))
+            await asyncio.sleep(deadline - self.loop.time())
+
+    def _run_phases(self, targets, loop_count, parse):
+        """
+        One loop for a schedule up to its rotation, in a pool thread, see
+        Ops._run_phases
+        :return: None
+        """
+        self.ops._run_phases(targets=targets, loop_count=loop_count, parse=parse, rotate=False)
+        if self.ops.args.watch:
+            self.ops._reported_events = set(message['message'] for message in
+                                            self.ops.recent_events.get('messages', []))
+
+    def _rotate_phase(self, targets, loop_count):
+        """
+        The rotation of a schedule's loop, in a pool thread, then the
+        loop's metrics export, see Ops._rotate_phase
+        :return: None
+        """
+        self.ops._rotate_phase(targets, loop_count)
+        self.ops.metrics.export()
+
+    async def _watch(self):
+        """
+        Report new warnings and errors as soon as the cron log changes, see
+        Ops.watch_loop. inotify wakes the event loop directly; without it
+        the log is checked every second.
+        :return: None
+        """
+        watcher = make_watcher([self.ops.args.logfile], log=self.log)
+        changed = asyncio.Event()
+        inotify = isinstance(watcher, InotifyWatcher)
+        if inotify:
+            self.loop.add_reader(watcher.fd, changed.set)
+        try:
+            while True:
+                if inotify:
+                    await changed.wait()
+                    changed.clear()
+                else:
+                    await asyncio.sleep(watcher.interval)
+                if not watcher.wait(0):
+                    continue
+                # Handle a burst of writes once, after debounce seconds of quiet
+                while self.ops.args.debounce > 0:
+                    await asyncio.sleep(self.ops.args.debounce)
+                    if not watcher.wait(0):
+                        break
+                async with self._lock:
+                    await self.loop.run_in_executor(None, self.ops._report_new_events)
+        finally:
+            if inotify:
+                self.loop.remove_reader(watcher.fd)
+            watcher.close()
@@ -0,0 +1,90 @@
+"""
+Find candidate log lines in large byte buffers without splitting or
+decoding every line
+"""
+
+import re
+
+
+class LineScanner(object):
+    """
+    Search a bytes, mmap or other buffer for everything the caller cares
+    about and cut out only the lines containing a hit; all other lines are
+    skipped inside the regex engine or bytes.find and never become Python
+    strings. Each pattern is searched on its own rather than as one
+    alternation: a pattern starting with a literal (ex. " CROND[") is then
+    found with a fast substring search instead of being tried at every byte.
+    Keywords, found without regard to case, are one IGNORECASE alternation
+    searched on the buffer itself, so no lowered copy of it is ever made.
+    """
+
+    def __init__(self, patterns=(br' CROND\[',), keywords=(), line_prefixes=()):
+        """
+        :param patterns: bytes regular expressions, a line matching any is a
+            candidate, ^ and $ match at the start and end of each line
+        :ptype patterns: iterable of bytes
+        :param keywords: bytes found without regard to case
+        :ptype keywords: iterable of bytes
+        :param line_prefixes: bytes regular expressions matched only at the start of a line
+        :ptype line_prefixes: iterable of bytes
+        """
+        # Lines are searched within the whole block, ^ and $ anchor at each line
+        self.searches = [re.compile(pattern, re.MULTILINE).search for pattern in patterns]
+        keywords = [re.escape(keyword) for keyword in keywords]
+        self.keywords = re.compile(b'|'.join(keywords), re.IGNORECASE).search if keywords else None
+        self.prefixes = [(re.compile(prefix).match, re.compile(b'\n(?:' + prefix + b')').search)
+                         for prefix in line_prefixes]
+        self.bytes_scanned = 0
+
+    def lines(self, buf, start=0, end=None):
+        """
+        :param buf: buffer holding whole lines between start and end
+        :ptype buf: bytes, mmap.mmap or other buffer
+        :param start: offset of the first line
+        :ptype start: int
+        :param end: offset just past the last line (default: end of buf)
+        :ptype end: int
+        :return: candidate lines, in buffer order, without line terminators
+        :rtype: list of bytes
+        """
+        if end is None:
+            end = len(buf)
+        self.bytes_scanned += max(0, end - start)
+        # line start: line end, of every line with a hit
+        spans = {}
+
+        def line_of(position):
+            line_start = buf.rfind(b'\n', start, position)
+            line_start = start if line_start < 0 else line_start + 1
+            line_end = spans.get(line_start)
+            if line_end is None:
+                line_end = buf.find(b'\n', position, end)
+                if line_end < 0:
+                    line_end = end
+                spans[line_start] = line_end
+            return line_end
+
+        for search in self.searches:
+            position = start
+            while position < end:
+                match = search(buf, position, end)
+                if match is None:
+                    break
+                position = line_of(match.start()) + 1
+        if self.keywords is not None:
+            position = start
+            while position < end:
+                match = self.keywords(buf, position, end)
+                if match is None:
+                    break
+                position = line_of(match.start()) + 1
+        for match_first, search in self.prefixes:
+            if start < end and match_first(buf, start, end) is not None:
+                line_of(start)
+            position = start
+            while position < end:
+                match = search(buf, position, end)
+                if match is None:
+                    break
+                position = line_of(match.start() + 1) + 1
+        return [buf[line_start:spans[line_start]].rstrip(b'\r') for line_start in sorted(spans)]
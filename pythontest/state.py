@@ -0,0 +1,120 @@
+"""
+Persist small amounts of runtime state between ticks and restarts
+"""
+
+import errno
+import itertools
+import json
+import os
+import threading
+
+# Temporary file suffixes, unique within the process
+_SUFFIXES = itertools.count()
+
+
+def atomic_write(filename, text, mode=None):
+    """
+    Replace a file's content atomically: write a temporary file in the
+    same directory, then rename it over the original, so readers never
+    see a half written file
+    :param filename: file to replace
+    :ptype filename: string
+    :param text: new content
+    :ptype text: string
+    :param mode: permissions (default: owner read and write only)
+    :ptype mode: int
+    :return: None
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    # Like tempfile.mkstemp(), without importing tempfile and random at startup
+    while True:
+        tmpname = os.path.join(dirname, '.{}-{}-{}'.format(os.path.basename(filename), os.getpid(),
+                                                          next(_SUFFIXES)))
+        try:
+            filedesc = os.open(tmpname, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            break
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+    try:
+        with os.fdopen(filedesc, 'wt') as filehandle:
+            filehandle.write(text)
+        if mode is not None:
+            os.chmod(tmpname, mode)
+        os.rename(tmpname, filename)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+class StateFile(object):
+    """
+    A JSON document on disk, read once and rewritten atomically (see
+    atomic_write) so a crash never leaves a half written state file.
+    Each feature keeps its state under its own top level key. Features
+    changing their state from other threads (ex. rotation, from the
+    compressor) hold `lock`, which save() also holds while serializing.
+    """
+
+    def __init__(self, filename=None, log=None):
+        """
+        :param filename: state file location, None keeps state in memory only
+        :ptype filename: string
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        """
+        self.filename = filename
+        self.log = log
+        self.lock = threading.RLock()
+        self.data = {}
+        self.load()
+
+    def load(self):
+        """
+        Read the state file, a missing or unreadable file is an empty state
+        :return: state
+        :rtype: dict
+        """
+        self.data = {}
+        if self.filename is None or not os.path.isfile(self.filename):
+            return self.data
+        try:
+            with open(self.filename, 'rt') as filehandle:
+                self.data = json.load(filehandle)
+        except (IOError, OSError, ValueError) as err:
+            if self.log is not None:
+                self.log.warning('ignoring unreadable state file "{}": {}'.format(self.filename, err))
+            self.data = {}
+        return self.data
+
+    def get(self, key, default=None):
+        """
+        :param key: feature name
+        :ptype key: string
+        :param default: returned when key is absent
+        :return: stored state for key
+        """
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        """
+        Update state for key in memory, see save()
+        :param key: feature name
+        :ptype key: string
+        :param value: JSON serializable state
+        :return: None
+        """
+        with self.lock:
+            self.data[key] = value
+
+    def save(self):
+        """
+        Atomically rewrite the state file
+        :return: None
+        """
+        if self.filename is None:
+            return
+        with self.lock:
+            text = json.dumps(self.data, sort_keys=True, separators=(',', ':'))
+            atomic_write(self.filename, text)
@@ -0,0 +1,145 @@
+"""
+Touch file targets: one cron job, touch file and rotation prefix each
+"""
+
+import json
+import os
+import re
+
+# Extracts the touched path from a cron log line, ex.
+#   "Mar 27 18:10:01 host CROND[123]: (root) CMD (touch /root/touchfile.txt)"
+RE_TOUCH_COMMAND = re.compile(r' CMD \(touch (.+)\)\s*$')
+
+
+class Target(object):
+    """
+    A file cron touches at a rate, attribute names follow the command line
+    options namespace (touch, frequency, rename)
+    """
+
+    def __init__(self, touch, frequency, rename):
+        """
+        :param touch: file cron touches
+        :ptype touch: string
+        :param frequency: touch rate in minutes
+        :ptype frequency: int
+        :param rename: rotated touch file location and prefix
+        :ptype rename: string
+        """
+        self.touch = touch
+        self.frequency = frequency
+        self.rename = rename
+
+    def __repr__(self):
+        return 'Target({!r}, {!r}, {!r})'.format(self.touch, self.frequency, self.rename)
+
+    @property
+    def cronjob(self):
+        """
+        :return: crontab line touching the file at the requested rate
+        :rtype: string
+        """
+        return '*/{} * * * * touch {}'.format(self.frequency, self.touch)
+
+    @property
+    def category(self):
+        """
+        :return: event category counting this target's touches
+        :rtype: string
+        """
+        return 'touch:' + self.touch
+
+    def validate(self):
+        """
+        Check the target is acceptable, see validate_args()
+        :return: exit code integer and text description for error (if any)
+        :rtype: tuple (int, string)
+        """
+        msg = 'invalid path or write permissions needed, touch file '
+        msg += format(self.touch)
+        if not os.access(os.path.dirname(os.path.abspath(self.touch)), os.W_OK):
+            return 1, msg
+        if os.path.isfile(os.path.abspath(self.touch)):
+            if not os.access(self.touch, os.W_OK):
+                return 1, msg
+        if not isinstance(self.frequency, int) or self.frequency <= 0:
+            msg = 'positive integer needed, rate ' + format(self.frequency)
+            msg += ' for touch file ' + format(self.touch)
+            return 1, msg
+        if not os.access(os.path.dirname(os.path.abspath(self.rename)), os.W_OK):
+            msg = 'invalid path or write permissions needed, prefix '
+            msg += format(self.rename)
+            return 1, msg
+        return 0, 'success'
+
+
+def load_targets(filename, default_rate, default_prefix):
+    """
+    Read targets from a JSON config file, either a list or
+    {"targets": [...]}, of objects like
+        {"file": "/root/a.txt", "rate": 2, "prefix": "/root/rotate/a"}
+    "rate" defaults to --rate, "prefix" to --prefix plus the file name
+    :param filename: config file
+    :ptype filename: string
+    :param default_rate: touch rate when a target has none
+    :ptype default_rate: int
+    :param default_prefix: rotation prefix base when a target has none
+    :ptype default_prefix: string
+    :return: targets, in config file order
+    :rtype: list of Target
+    """
+    with open(filename, 'rt') as filehandle:
+        config = json.load(filehandle)
+    if isinstance(config, dict):
+        config = config.get('targets', [])
+    targets = []
+    for entry in config:
+        if not isinstance(entry, dict) or 'file' not in entry:
+            raise ValueError('target without "file" in {}: {}'.format(filename, entry))
+        touch = entry['file']
+        rename = entry.get('prefix', default_prefix + '-' + os.path.basename(touch))
+        targets.append(Target(touch, entry.get('rate', default_rate), rename))
+    if not targets:
+        raise ValueError('no targets in ' + filename)
+    if len(set(target.touch for target in targets)) != len(targets):
+        raise ValueError('duplicate target files in ' + filename)
+    return targets
+
+
+class TouchMatcher(object):
+    """
+    Find which target, if any, a cron log line touched. The touched path is
+    extracted once with a compiled pattern and looked up in a dict, so the
+    cost per line does not grow with the number of targets.
+    """
+
+    def __init__(self, targets):
+        """
+        :param targets: targets to match
+        :ptype targets: list of Target
+        """
+        self.targets = dict((target.touch, target) for target in targets)
+
+    @staticmethod
+    def touched(line):
+        """
+        :param line: cron log line
+        :ptype line: string
+        :return: the file a cron touch command touched, None for other lines
+        :rtype: string
+        """
+        if ' CMD (touch ' not in line:
+            return None
+        found = RE_TOUCH_COMMAND.search(line)
+        if found is None:
+            return None
+        return found.group(1).strip()
+
+    def match(self, line):
+        """
+        :param line: cron log line
+        :ptype line: string
+        :return: the target touched, None for other lines
+        :rtype: Target
+        """
+        return self.targets.get(self.touched(line))
@@ -0,0 +1,9 @@
+"""
+Unit tests, run with ./runtests.sh; the modules under test import each
+other by plain name, as PythonTest.py does
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,338 @@
+"""
+Tests for PythonTest: whole runs through Ops, with a fake crontab command
+on PATH in place of the system crontab
+"""
+
+import calendar
+import datetime
+import json
+import logging
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
+
+import PythonTest
+from archive import ArchiveIndex
+from state import StateFile
+
+# Records each call's option, -l prints the saved crontab, - saves stdin
+FAKE_CRONTAB = '''#!/bin/sh
+here=$(dirname "$0")
+echo "$1" >> "$here/calls"
+case "$1" in
+    -l) if [ -f "$here/crontab.txt" ]; then cat "$here/crontab.txt"; else echo "no crontab for test" >&2; exit 1; fi ;;
+    -) cat > "$here/crontab.txt" ;;
+    *) exit 1 ;;
+esac
+'''
+
+
+def stamp(epoch):
+    moment = time.gmtime(epoch)
+    return time.strftime('%b {:2d} %H:%M:%S', moment).format(moment.tm_mday)
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class OpsTest(unittest.TestCase):
+
+    # 2026-10-17T10:00:00Z
+    START = calendar.timegm((2026, 10, 17, 10, 0, 0, 0, 0, 0))
+    HOURS = 2
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.bindir = os.path.join(self.tmpdir, 'bin')
+        os.mkdir(self.bindir)
+        os.mkdir(os.path.join(self.tmpdir, 'rotate'))
+        fake = os.path.join(self.bindir, 'crontab')
+        with open(fake, 'w') as filehandle:
+            filehandle.write(FAKE_CRONTAB)
+        os.chmod(fake, stat.S_IRWXU)
+        self.path = os.environ.get('PATH', '')
+        os.environ['PATH'] = self.bindir + os.pathsep + self.path
+        self.touch = os.path.join(self.tmpdir, 'touch.txt')
+        self.prefix = os.path.join(self.tmpdir, 'rotate', 'pt')
+        self.logfile = os.path.join(self.tmpdir, 'syslog')
+        self.state_file = os.path.join(self.tmpdir, 'state.json')
+        self.write_log([])
+        self.handler = RecordingHandler()
+        self.log = logging.getLogger('test_PythonTest')
+        self.log.propagate = False
+        self.log.setLevel(logging.INFO)
+        self.log.addHandler(self.handler)
+        PythonTest.LOGGER = self.log
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        self.log.removeHandler(self.handler)
+        shutil.rmtree(self.tmpdir)
+
+    def argv(self, *extra):
+        return ['--test', '--log-timezone', 'UTC', '--cron-log', self.logfile, '--file', self.touch,
+                '--prefix', self.prefix, '--state-file', self.state_file] + list(extra)
+
+    def write_log(self, lines, mode='w'):
+        with open(self.logfile, mode) as filehandle:
+            filehandle.write(''.join(line + '\n' for line in lines))
+
+    def touch_line(self, epoch):
+        return '{} host CROND[1]: (root) CMD (touch {})'.format(stamp(epoch), self.touch)
+
+    def run_ops(self, method, *extra):
+        """
+        Run an Ops method like main() does, Ops exits when it is done
+        :return: the Ops instance
+        """
+        ops = PythonTest.Ops(PythonTest.parse_arguments(sys_argv=self.argv(*extra)), self.log)
+        with self.assertRaises(SystemExit) as exited:
+            with ops:
+                getattr(ops, method)()
+        self.assertEqual(exited.exception.code, 0)
+        return ops
+
+    def write_archive(self):
+        """
+        :return: an archived syslog of HOURS from START, with a touch every 2 minutes
+        """
+        archive = os.path.join(self.tmpdir, 'syslog.1')
+        end = self.START + self.HOURS * 3600
+        with open(archive, 'w') as filehandle:
+            for epoch in range(self.START, end + 1, 10):
+                if epoch % 120 == 0:
+                    filehandle.write(self.touch_line(epoch) + '\n')
+                if epoch % 300 == 0:
+                    filehandle.write('{} host CROND[2]: (root) CMD (run-parts /etc/cron.hourly)\n'.format(
+                        stamp(epoch)))
+                filehandle.write('{} host kernel: noise {}\n'.format(stamp(epoch), epoch))
+        # RFC3164 stamps have no year, it is inferred from when the archive was written
+        os.utime(archive, (end, end))
+        return archive
+
+    def crontab_calls(self):
+        """
+        :return: crontab options called since the previous call
+        """
+        calls = os.path.join(self.bindir, 'calls')
+        if not os.path.exists(calls):
+            return []
+        with open(calls) as filehandle:
+            found = filehandle.read().split()
+        os.remove(calls)
+        return found
+
+    def crontab_text(self):
+        with open(os.path.join(self.bindir, 'crontab.txt')) as filehandle:
+            return filehandle.read()
+
+    def warnings(self):
+        return [record.getMessage() for record in self.handler.records if record.levelno == logging.WARNING]
+
+
+class UpdateTest(OpsTest):
+
+    def test_events_reported_per_touch_file(self):
+        now = time.time()
+        self.write_log([self.touch_line(now - 60),
+                        '{} host kernel: disk error on sda'.format(stamp(now - 50)),
+                        '{} host app: warning, low memory'.format(stamp(now - 40))])
+        self.log.setLevel(logging.DEBUG)
+        ops = PythonTest.Ops(PythonTest.parse_arguments(sys_argv=self.argv()), self.log)
+        ops.parse_logfile()
+        ops.update_touchfile()
+        ops.writer.close()
+        messages = [record.getMessage() for record in self.handler.records]
+        self.assertIn('Found 2 warning or error events for touch file "{}"'.format(self.touch), messages)
+        with open(self.touch) as filehandle:
+            self.assertIn('events count 1, 2 other events:', filehandle.readline())
+
+
+class OnceTest(OpsTest):
+
+    def argv(self, *extra):
+        return OpsTest.argv(self, '--once', *extra)
+
+    def test_installs_once_and_checks_every_few_runs(self):
+        now = time.time()
+        self.write_log([self.touch_line(now - 60), self.touch_line(now - 30)])
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), ['-l', '-'])
+        self.assertIn('*/2 * * * * touch ' + self.touch, self.crontab_text())
+        for _ in range(2, PythonTest.CRONTAB_CHECK_RUNS):
+            self.run_ops('run_once')
+            self.assertEqual(self.crontab_calls(), [])
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), ['-l'])
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), [])
+        self.assertEqual(self.warnings(), [])
+
+    def test_untouched_runs_check_and_reinstall(self):
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), ['-l', '-'])
+        # Installed, but nothing touched in the window: check the crontab
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), ['-l'])
+        with open(os.path.join(self.bindir, 'crontab.txt'), 'w') as filehandle:
+            filehandle.write('0 * * * * /bin/backup\n')
+        self.run_ops('run_once')
+        self.assertEqual(self.crontab_calls(), ['-l', '-'])
+        self.assertEqual(self.crontab_text(), '0 * * * * /bin/backup\n*/2 * * * * touch {}\n'.format(self.touch))
+        self.assertEqual(len([msg for msg in self.warnings() if msg.startswith('crontab jobs missing')]), 1)
+
+    def test_state_between_runs(self):
+        now = time.time()
+        self.write_log([self.touch_line(now - 90)])
+        self.run_ops('run_once')
+        self.write_log([self.touch_line(now - 10)], mode='a')
+        self.run_ops('run_once')
+        state = StateFile(self.state_file)
+        self.assertEqual(state.get('loops'), 2)
+        self.assertEqual(state.get('cronjobs'), ['*/2 * * * * touch ' + self.touch])
+        self.assertEqual(state.get('logfile')['offset'], os.path.getsize(self.logfile))
+        with open(self.touch) as filehandle:
+            counts = [line.split('events count ')[1].split(',')[0].strip() for line in filehandle]
+        # The second run only read the new line, the first is still in its window
+        self.assertEqual(counts, ['1', '2'])
+
+    def test_metrics_exported(self):
+        stats = os.path.join(self.tmpdir, 'stats.json')
+        self.write_log([self.touch_line(time.time() - 60)])
+        self.run_ops('run_once', '--metrics-json', stats)
+        with open(stats) as filehandle:
+            snapshot = json.load(filehandle)
+        self.assertEqual(snapshot['counters']['loops'], 1)
+        self.assertEqual(sorted(snapshot['phases']), ['parse', 'rotate', 'update'])
+
+    def test_changed_rate_is_installed(self):
+        self.run_ops('run_once')
+        self.crontab_calls()
+        self.run_ops('run_once', '--rate', '5')
+        self.assertEqual(self.crontab_calls(), ['-l', '-'])
+        self.assertEqual(self.crontab_text(), '*/5 * * * * touch {}\n'.format(self.touch))
+
+
+class ReplayTest(OpsTest):
+
+    def records(self, filename):
+        with open(filename) as filehandle:
+            records = [line.split(': cron touch command events count ') for line in filehandle]
+        return [(start, int(count.split(',')[0])) for start, count in records]
+
+    def test_replay_appends_and_rotates_like_a_live_run(self):
+        archive = self.write_archive()
+        ops = self.run_ops('standard_loop', '--replay', archive, '--rate', '2')
+        # A loop every 2 minutes from the first line to the last, rotating every 15
+        loops = self.HOURS * 30 + 1
+        self.assertEqual(ops._standard_loop_count, loops)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.prefix))),
+                         ['pt.1', 'pt.2', 'pt.3', 'pt.4', 'pt.index'])
+        records = []
+        for filename in [self.prefix + '.{}'.format(suffix) for suffix in range(1, 5)] + [self.touch]:
+            records.extend(self.records(filename))
+        self.assertEqual(len(records), loops)
+        self.assertEqual([start for start, _ in records],
+                         [datetime.datetime.utcfromtimestamp(self.START + 120 * loop).isoformat()
+                          for loop in range(loops)])
+        # Touches at the loop time and the 3 before it are inside the 7 minute window
+        self.assertEqual([count for _, count in records], [1, 2, 3] + [4] * (loops - 3))
+        self.assertEqual(len(list(ArchiveIndex(self.prefix).entries())), 4)
+        self.assertEqual(self.crontab_calls(), [])
+
+    def test_metrics_exported_after_the_pause(self):
+        stats = os.path.join(self.tmpdir, 'stats.json')
+        ops = self.run_ops('standard_loop', '--replay', self.write_archive(), '--rate', '2',
+                           '--metrics-json', stats)
+        with open(stats) as filehandle:
+            snapshot = json.load(filehandle)
+        # The file has every loop up to its pause, the last one included
+        self.assertEqual(snapshot['counters']['loops'], ops._standard_loop_count)
+        self.assertEqual(snapshot['phases']['pause']['count'], ops._standard_loop_count)
+
+
+class QueryTest(OpsTest):
+
+    def setUp(self):
+        OpsTest.setUp(self)
+        self.run_ops('standard_loop', '--replay', self.write_archive(), '--rate', '2')
+        self.user = os.environ.get('USER')
+        # A query needs neither root, the cron log nor a state file directory
+        os.environ['USER'] = 'nobody'
+        os.remove(self.logfile)
+
+    def tearDown(self):
+        if self.user is None:
+            os.environ.pop('USER', None)
+        else:
+            os.environ['USER'] = self.user
+        OpsTest.tearDown(self)
+
+    def query(self, *extra):
+        argv = ['--cron-log', self.logfile, '--prefix', self.prefix,
+                '--state-file', os.path.join(self.tmpdir, 'missing', 'state.json')] + list(extra)
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            PythonTest.query_archive(PythonTest.parse_arguments(sys_argv=argv), self.log)
+            return json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+
+    def iso(self, seconds):
+        return datetime.datetime.utcfromtimestamp(self.START + seconds).isoformat()
+
+    def test_summary_from_the_index(self):
+        result = self.query('--query-start', self.iso(0), '--query-end', self.iso(3599))
+        self.assertEqual((result['start'], result['end']), (self.iso(0), self.iso(3599)))
+        prefix, = result['prefixes']
+        self.assertEqual(prefix['prefix'], self.prefix)
+        self.assertEqual((prefix['files'], prefix['opened'], prefix['missing']), (2, [], []))
+        self.assertEqual(prefix['summary'], {'records': 30, 'reports': 30, 'alerts': 0,
+                                             'touches': 1 + 2 + 3 + 4 * 27, 'max': 4, 'events': 0})
+        self.assertNotIn('records', prefix)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'missing')))
+
+    def test_records(self):
+        prefix, = self.query('--query-start', self.iso(600), '--query-end', self.iso(839),
+                             '--query-records')['prefixes']
+        self.assertEqual(prefix['opened'], [self.prefix + '.1'])
+        self.assertEqual(prefix['records'], ['{}: cron touch command events count 4'.format(self.iso(seconds))
+                                             for seconds in (600, 720)])
+        self.assertEqual(prefix['summary']['reports'], 2)
+
+    def test_end_defaults_to_now(self):
+        prefix, = self.query('--query-start', str(self.START + 3600))['prefixes']
+        self.assertEqual((prefix['files'], prefix['summary']['reports']), (2, 30))
+
+    def test_range_validation(self):
+        for extra in (['--query-start', self.iso(60), '--query-end', self.iso(0)],
+                      ['--query-start', 'yesterday'],
+                      ['--query-start', self.iso(0), '--once']):
+            with self.assertRaises(SystemExit) as exited:
+                self.query(*extra)
+            self.assertEqual(exited.exception.code, 1)
+        errors = [record.getMessage() for record in self.handler.records if record.levelno == logging.ERROR]
+        self.assertIn('after --query-end', errors[0])
+        self.assertIn('argument --query-start or --query-end', errors[1])
+        self.assertIn('not allowed with', errors[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
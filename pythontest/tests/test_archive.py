@@ -0,0 +1,167 @@
+"""
+Tests for archive: touch file records, the time index and queries over it
+"""
+
+import calendar
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from archive import ArchiveIndex, index_file, parse_start, read_records
+from writer import format_record
+
+# 2026-10-17T00:00:00Z
+DAY = calendar.timegm((2026, 10, 17, 0, 0, 0, 0, 0, 0))
+
+
+def stamp(epoch):
+    """
+    :return: touch file record start of epoch, UTC
+    """
+    return datetime.datetime.utcfromtimestamp(epoch).isoformat()
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmpdir, 'rotated')
+        self.suffix = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def rotated(self, hours, count=3, touch_format='text'):
+        """
+        :return: a rotated touch file with a report every 20 minutes of each hour
+        """
+        self.suffix += 1
+        filename = '{}.{}'.format(self.prefix, self.suffix)
+        with open(filename, 'w') as filehandle:
+            for hour in hours:
+                for minute in (0, 20, 40):
+                    epoch = DAY + hour * 3600 + minute * 60
+                    filehandle.write(format_record({'start': stamp(epoch), 'count': count},
+                                                   touch_format))
+        return filename
+
+
+class RecordsTest(ArchiveTest):
+
+    def test_parse_start(self):
+        self.assertEqual(parse_start('2026-10-17T00:00:00'), DAY)
+        self.assertEqual(parse_start('2026-10-17T00:00:00.25'), DAY + 0.25)
+
+    def test_text_records_keep_their_events(self):
+        filename = os.path.join(self.tmpdir, 'touch.log')
+        with open(filename, 'w') as filehandle:
+            filehandle.write(format_record({'start': stamp(DAY), 'count': 2,
+                                            'events': [{'line': 'a'}, {'line': 'b'}]}))
+            filehandle.write(format_record({'start': stamp(DAY + 60), 'kind': 'alert',
+                                            'events': [{'line': 'c'}]}))
+        with open(filename, 'rb') as filehandle:
+            records = list(read_records(filehandle))
+        self.assertEqual([record for _, _, record in records],
+                         [(DAY, 'report', 2, 2), (DAY + 60, 'alert', 0, 1)])
+        self.assertEqual(records[1][0], len(records[0][1]))
+        self.assertIn(b'"line": "b"', records[0][1])
+
+    def test_jsonl_records(self):
+        filename = self.rotated([0], count=5, touch_format='jsonl')
+        with open(filename, 'rb') as filehandle:
+            self.assertEqual([record for _, _, record in read_records(filehandle)],
+                             [(DAY + minute * 60, 'report', 5, 0) for minute in (0, 20, 40)])
+
+
+class IndexTest(ArchiveTest):
+
+    def test_index_file_blocks_by_hour(self):
+        entry = index_file(self.rotated([0, 1, 3]))
+        self.assertEqual(entry['first'], DAY)
+        self.assertEqual(entry['last'], DAY + 3 * 3600 + 2400)
+        self.assertEqual(len(entry['blocks']), 3)
+        self.assertEqual(entry['summary'], {'records': 9, 'reports': 9, 'alerts': 0,
+                                            'touches': 27, 'max': 3, 'events': 0})
+
+    def test_empty_file_is_not_indexed(self):
+        filename = os.path.join(self.tmpdir, 'empty')
+        open(filename, 'w').close()
+        self.assertIsNone(ArchiveIndex(self.prefix).add(filename))
+        self.assertFalse(os.path.exists(self.prefix + '.index'))
+
+    def test_reach_and_out_of_order_files(self):
+        index = ArchiveIndex(self.prefix)
+        index.add(self.rotated([5, 6]))
+        index.add(self.rotated([0, 9]))
+        index.add(self.rotated([7]))
+        entries = list(index.entries())
+        self.assertEqual([entry['first'] for entry in entries],
+                         [DAY, DAY + 5 * 3600, DAY + 7 * 3600])
+        self.assertEqual([entry['reach'] for entry in entries], [DAY + 9 * 3600 + 2400] * 3)
+
+    def test_partial_last_line_is_dropped(self):
+        index = ArchiveIndex(self.prefix)
+        index.add(self.rotated([0]))
+        with open(index.filename, 'ab') as filehandle:
+            filehandle.write(b'{"file": "interrupted')
+        index.add(self.rotated([1]))
+        self.assertEqual(len(list(index.entries())), 2)
+
+    def test_search_skips_earlier_files(self):
+        index = ArchiveIndex(self.prefix)
+        for hour in range(10):
+            index.add(self.rotated([hour]))
+        entries = list(index.entries(start=DAY + 7 * 3600))
+        self.assertEqual([entry['first'] for entry in entries],
+                         [DAY + hour * 3600 for hour in (7, 8, 9)])
+
+
+class QueryTest(ArchiveTest):
+
+    def setUp(self):
+        ArchiveTest.setUp(self)
+        self.index = ArchiveIndex(self.prefix)
+        for hours in ([0, 1], [2, 3], [4, 5]):
+            self.index.add(self.rotated(hours))
+
+    def test_whole_blocks_come_from_the_index(self):
+        result = self.index.query(DAY + 3600, DAY + 4 * 3600 - 1)
+        self.assertEqual(result['files'], 2)
+        self.assertEqual(result['opened'], [])
+        self.assertEqual(result['summary']['reports'], 9)
+        self.assertEqual(result['summary']['touches'], 27)
+
+    def test_cut_blocks_are_read(self):
+        result = self.index.query(DAY + 1200, DAY + 3600 + 1200)
+        self.assertEqual(result['opened'], [self.prefix + '.1'])
+        self.assertEqual(result['summary']['reports'], 4)
+
+    def test_records_from_compressed_archives(self):
+        filename = self.prefix + '.2'
+        with open(filename, 'rb') as source:
+            with gzip.open(filename + '.gz', 'wb') as target:
+                target.write(source.read())
+        os.remove(filename)
+        result = self.index.query(DAY + 2 * 3600, DAY + 2 * 3600 + 1200, records=True)
+        self.assertEqual(result['opened'], [filename])
+        self.assertEqual(result['records'], [
+            '{}: cron touch command events count 3'.format(stamp(DAY + 2 * 3600 + minute * 60))
+            for minute in (0, 20)])
+
+    def test_removed_archives_are_missing(self):
+        os.remove(self.prefix + '.3')
+        result = self.index.query(DAY + 4 * 3600 + 600, DAY + 6 * 3600)
+        self.assertEqual(result['missing'], [self.prefix + '.3'])
+        self.assertEqual(result['summary']['reports'], 3)
+
+    def test_range_outside_the_index(self):
+        result = self.index.query(DAY + 7 * 3600, DAY + 8 * 3600)
+        self.assertEqual(result['files'], 0)
+        self.assertEqual(result['summary']['records'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
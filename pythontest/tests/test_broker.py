@@ -0,0 +1,146 @@
+"""
+Tests for broker: framing, subscriber filters and resuming after reconnects
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from broker import Broker, BrokerClient, FrameDecoder, _Subscriber, encode_frame
+from events import EventReader
+from targets import Target
+from window import WindowAggregator
+
+
+def touch_line(epoch, pid):
+    moment = time.gmtime(epoch)
+    stamp = time.strftime('%b {:2d} %H:%M:%S', moment).format(moment.tm_mday)
+    return '{} host CROND[{}]: (root) CMD (touch /tmp/a.txt)\n'.format(stamp, pid)
+
+
+class FrameTest(unittest.TestCase):
+
+    def test_round_trip_in_pieces(self):
+        data = encode_frame({'a': 1}) + encode_frame({'l': u'caf\xe9'})
+        decoder = FrameDecoder()
+        messages = []
+        for position in range(len(data)):
+            messages.extend(decoder.feed(data[position:position + 1]))
+        self.assertEqual(messages, [{'a': 1}, {'l': u'caf\xe9'}])
+        self.assertEqual(decoder.buffer, b'')
+
+    def test_oversized_frame(self):
+        self.assertRaises(ValueError, FrameDecoder().feed, b'\xff\xff\xff\xff{}')
+
+    def test_subscriber_filter(self):
+        subscriber = _Subscriber(None)
+        subscriber.subscribe({'targets': ['/tmp/a.txt'], 'severities': ['error']})
+        self.assertTrue(subscriber.wants(['cron', 'touch:/tmp/a.txt']))
+        self.assertTrue(subscriber.wants(['error']))
+        self.assertFalse(subscriber.wants(['cron', 'touch:/tmp/b.txt']))
+        subscriber.subscribe({'targets': None, 'severities': None})
+        self.assertTrue(subscriber.wants(['cron']))
+
+
+class BrokerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'broker.sock')
+        self.logfile = os.path.join(self.tmpdir, 'syslog')
+        self.now = int(time.time())
+        self.pid = 100
+        self.brokers = []
+
+    def tearDown(self):
+        for broker in self.brokers:
+            broker.close()
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, *ages):
+        with open(self.logfile, 'a') as filehandle:
+            for age in ages:
+                self.pid += 1
+                filehandle.write(touch_line(self.now - age, self.pid))
+
+    def start(self):
+        broker = Broker(self.path, self.logfile, EventReader(None, timezone='UTC'), 3600, interval=0.05)
+        broker.listen()
+        self.brokers.append(broker)
+        return broker
+
+    def receive(self, broker, client):
+        server = threading.Thread(target=broker.serve, args=(0.3,))
+        server.start()
+        try:
+            return [line for _, _, line in client.receive()]
+        finally:
+            server.join()
+
+    def test_reconnect_keeps_events_of_the_same_second(self):
+        self.append(10, 10)
+        broker = self.start()
+        client = BrokerClient(self.path, timeout=5)
+        self.assertEqual(len(self.receive(broker, client)), 2)
+        client.close()
+        self.append(10, 10, 5)
+        lines = self.receive(broker, client)
+        self.assertEqual([line.split()[4] for line in lines], ['CROND[103]:', 'CROND[104]:', 'CROND[105]:'])
+        self.assertEqual(client.sequence, 5)
+        client.close()
+
+    def test_broker_restart_skips_only_events_received(self):
+        self.append(10, 5)
+        broker = self.start()
+        client = BrokerClient(self.path, timeout=5)
+        self.assertEqual(len(self.receive(broker, client)), 2)
+        client.close()
+        broker.close()
+        self.append(5, 5)
+        restarted = self.start()
+        self.assertNotEqual(restarted.id, client.broker)
+        lines = self.receive(restarted, client)
+        self.assertEqual([line.split()[4] for line in lines], ['CROND[103]:', 'CROND[104]:'])
+        self.assertEqual(client.broker, restarted.id)
+        client.close()
+
+    def test_client_counts_as_local_mode(self):
+        self.append(300, 200)
+        with open(self.logfile, 'a') as filehandle:
+            filehandle.write(touch_line(self.now - 150, 1).replace('/tmp/a.txt', '/tmp/b.txt'))
+            filehandle.write(touch_line(self.now - 100, 2).replace('touch /tmp/a.txt', 'run-parts'))
+            filehandle.write(touch_line(self.now - 50, 3).replace('CROND[3]: (root) CMD', 'app: error'))
+        reader = EventReader([Target('/tmp/a.txt', 1, os.path.join(self.tmpdir, 'a'))], timezone='UTC')
+        local = WindowAggregator(primary=7)
+        reader.add(local, reversed(reader.scan(self.logfile, self.now, self.now - 420)), self.now)
+        broker = self.start()
+        client = BrokerClient(self.path, severities=['cron', 'error', 'warning'], timeout=5)
+        server = threading.Thread(target=broker.serve, args=(0.3,))
+        server.start()
+        try:
+            events = [(epoch, line) for epoch, _, line in client.receive()]
+        finally:
+            server.join()
+        client.close()
+        windows = WindowAggregator(primary=7)
+        self.assertEqual(reader.add(windows, events, self.now), (5, 1))
+        counts = windows.counts(self.now)[7]
+        self.assertEqual(counts, local.counts(self.now)[7])
+        self.assertEqual((counts['cron'], counts['touch'], counts['error']), (4, 2, 1))
+
+    def test_sync_on_open_connection(self):
+        self.append()
+        broker = self.start()
+        client = BrokerClient(self.path, targets=['/tmp/a.txt'], timeout=5)
+        self.assertEqual(self.receive(broker, client), [])
+        self.append(1)
+        self.assertEqual(len(self.receive(broker, client)), 1)
+        self.assertEqual(self.receive(broker, client), [])
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
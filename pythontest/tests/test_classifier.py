@@ -0,0 +1,75 @@
+"""
+Tests for classifier: <PRI> severities, keyword and regex rules
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from classifier import Classifier, load_rules
+
+
+class ClassifierTest(unittest.TestCase):
+
+    def test_defaults(self):
+        classifier = Classifier()
+        self.assertEqual(classifier.classify('host kernel: disk Error'), ('error',))
+        self.assertEqual(classifier.classify('host app: WARNING, an error'), ('error', 'warning'))
+        self.assertEqual(classifier.classify('host app: fine'), ())
+
+    def test_priority(self):
+        classifier = Classifier()
+        self.assertEqual(classifier.classify('<11>host app: failed'), ('error',))
+        self.assertEqual(classifier.classify('<12>host app: hot'), ('warning',))
+        self.assertEqual(classifier.classify('<13>host app: notice'), ())
+        self.assertEqual(Classifier(severity=None).classify('<11>host app: failed'), ())
+
+    def test_regex_rules(self):
+        classifier = Classifier([{'category': 'warning', 'regex': r'temperature above \d+'},
+                                 {'category': 'error', 'regex': 'segfault'}], None)
+        self.assertEqual(classifier.classify('cpu temperature above 90'), ('warning',))
+        self.assertEqual(classifier.classify('app segfault, temperature above 99'), ('error', 'warning'))
+        self.assertEqual(classifier.classify('Temperature above 90'), ())
+        self.assertEqual(classifier.patterns, [br'temperature above \d+', b'segfault'])
+
+    def test_scanner_rules(self):
+        classifier = Classifier()
+        self.assertEqual(classifier.keywords, [b'error', b'warning'])
+        self.assertEqual(len(classifier.line_prefixes), 1)
+
+
+class LoadRulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'rules.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, config):
+        with open(self.filename, 'w') as filehandle:
+            json.dump(config, filehandle)
+
+    def test_list_and_dict(self):
+        rules = [{'category': 'error', 'keyword': 'segfault'}]
+        self.write(rules)
+        self.assertEqual(load_rules(self.filename), (rules, {'error': 3, 'warning': 4}))
+        self.write({'rules': rules, 'severity': None})
+        self.assertEqual(load_rules(self.filename), (rules, None))
+
+    def test_invalid(self):
+        for config in ([{'category': 'info', 'keyword': 'x'}],
+                       [{'category': 'error'}],
+                       [{'category': 'error', 'keyword': 'x', 'regex': 'x'}],
+                       {'rules': [], 'severity': {'error': 9}}):
+            self.write(config)
+            self.assertRaises(ValueError, load_rules, self.filename)
+        self.write([{'category': 'error', 'regex': '('}])
+        self.assertRaises(Exception, load_rules, self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
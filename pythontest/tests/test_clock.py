@@ -0,0 +1,38 @@
+"""
+Tests for clock: drift free schedules and the simulated clock
+"""
+
+import unittest
+
+from clock import VirtualClock, monotonic, next_deadline
+
+
+class NextDeadlineTest(unittest.TestCase):
+
+    def test_fixed_rate(self):
+        self.assertEqual(next_deadline(100.0, 60, now=130.0), 160.0)
+
+    def test_work_does_not_shift_the_schedule(self):
+        self.assertEqual(next_deadline(100.0, 60, now=159.9), 160.0)
+
+    def test_missed_ticks_are_skipped(self):
+        self.assertEqual(next_deadline(100.0, 60, now=160.0), 220.0)
+        self.assertEqual(next_deadline(100.0, 60, now=401.0), 460.0)
+
+
+class ClockTest(unittest.TestCase):
+
+    def test_monotonic_moves_forward(self):
+        first = monotonic()
+        self.assertTrue(monotonic() >= first)
+
+    def test_virtual_clock(self):
+        clock = VirtualClock(1000)
+        clock.sleep(120)
+        clock.sleep(-5)
+        self.assertEqual(clock.time(), 1120.0)
+        self.assertEqual(clock.monotonic(), 1120.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
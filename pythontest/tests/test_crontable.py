@@ -0,0 +1,91 @@
+"""
+Tests for crontable: job identity and the in-memory crontab model
+"""
+
+import unittest
+from subprocess import CalledProcessError
+
+from crontable import Crontab, job_identity
+
+
+class FakeCrontab(object):
+    """
+    Stands in for the crontab command, see Crontab(runner=...)
+    """
+
+    def __init__(self, text=None):
+        self.text = text
+        self.calls = []
+
+    def __call__(self, cmd, stdin=None):
+        self.calls.append(cmd[1])
+        if cmd[1] == '-l':
+            if self.text is None:
+                return 1, 'no crontab for test\n'
+            return 0, self.text
+        if cmd[1] == '-':
+            self.text = stdin
+            return 0, ''
+        return 1, 'bad option'
+
+
+class JobIdentityTest(unittest.TestCase):
+
+    def test_identity(self):
+        self.assertEqual(job_identity('*/2 * * * * touch /root/a'), 'touch /root/a')
+        self.assertEqual(job_identity('@hourly  touch /root/a'), 'touch /root/a')
+        self.assertIsNone(job_identity('# */2 * * * * touch /root/a'))
+        self.assertIsNone(job_identity('MAILTO=root'))
+        self.assertIsNone(job_identity('@sometimes touch /root/a'))
+        self.assertIsNone(job_identity('   '))
+
+
+class CrontabTest(unittest.TestCase):
+
+    def test_no_crontab_is_empty(self):
+        crontab = Crontab(runner=FakeCrontab())
+        self.assertEqual(crontab.read(), '')
+        self.assertEqual(crontab.jobs(), {})
+
+    def test_add_commits_once(self):
+        fake = FakeCrontab('MAILTO=root\n0 * * * * /bin/backup\n')
+        crontab = Crontab(runner=fake)
+        self.assertEqual(crontab.add(['*/2 * * * * touch /a', '*/1 * * * * touch /b', '*/2 * * * * touch /a']),
+                         ['*/2 * * * * touch /a', '*/1 * * * * touch /b'])
+        self.assertTrue(crontab.commit())
+        self.assertEqual(fake.calls, ['-l', '-'])
+        self.assertEqual(fake.text, 'MAILTO=root\n0 * * * * /bin/backup\n*/2 * * * * touch /a\n*/1 * * * * touch /b\n')
+        self.assertFalse(crontab.commit())
+        self.assertTrue(crontab.verify())
+
+    def test_existing_job_is_not_added(self):
+        crontab = Crontab(runner=FakeCrontab('*/2 * * * * touch /a\n'))
+        self.assertEqual(crontab.add(['*/2 * * * * touch /a']), [])
+        self.assertFalse(crontab.dirty)
+
+    def test_replace_changes_schedule(self):
+        fake = FakeCrontab('*/5 * * * * touch /a\n0 * * * * /bin/backup\n')
+        crontab = Crontab(runner=fake)
+        crontab.replace(['*/2 * * * * touch /a'])
+        crontab.commit()
+        self.assertEqual(fake.text, '0 * * * * /bin/backup\n*/2 * * * * touch /a\n')
+
+    def test_remove_by_command(self):
+        crontab = Crontab(runner=FakeCrontab('*/5 * * * * touch /a\n0 * * * * /bin/backup\n'))
+        self.assertEqual(crontab.remove(['touch /a']), ['*/5 * * * * touch /a'])
+        self.assertEqual(crontab.text, '0 * * * * /bin/backup')
+
+    def test_verify_detects_changes(self):
+        fake = FakeCrontab('*/5 * * * * touch /a\n')
+        crontab = Crontab(runner=fake)
+        crontab.read()
+        fake.text = ''
+        self.assertFalse(crontab.verify())
+
+    def test_failures_raise(self):
+        crontab = Crontab(runner=lambda cmd, stdin=None: (1, 'permission denied'))
+        self.assertRaises(CalledProcessError, crontab.read)
+
+
+if __name__ == '__main__':
+    unittest.main()
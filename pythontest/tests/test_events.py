@@ -0,0 +1,169 @@
+"""
+Tests for events: categorizing, scanning and counting cron events, errors
+and warnings
+"""
+
+import calendar
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from events import EventReader
+from hosts import scan_host
+from targets import Target
+from window import WindowAggregator, merge_collapsed
+
+# 2026-10-17T12:00:00Z
+NOW = calendar.timegm((2026, 10, 17, 12, 0, 0, 0, 0, 0))
+TOUCH_A = '/tmp/a.txt'
+TOUCH_B = '/tmp/b.txt'
+
+
+def stamp(epoch):
+    moment = time.gmtime(epoch)
+    return time.strftime('%b {:2d} %H:%M:%S', moment).format(moment.tm_mday)
+
+
+def touch(epoch, filename):
+    return '{} host CROND[1]: (root) CMD (touch {})'.format(stamp(epoch), filename)
+
+
+class EventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.targets = [Target(TOUCH_A, 1, '/tmp/rotate/a'), Target(TOUCH_B, 5, '/tmp/rotate/b')]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, lines, name='syslog'):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'w') as filehandle:
+            filehandle.write(''.join(line + '\n' for line in lines))
+        return filename
+
+    def count(self, reader, logfile, primary=7, windows=()):
+        aggregator = WindowAggregator(primary=primary, windows=windows)
+        events = reader.scan(logfile, NOW, NOW - aggregator.longest * 60)
+        matched, errors = reader.add(aggregator, reversed(events), NOW)
+        return aggregator, matched, errors
+
+
+class CategorizeTest(EventsTest):
+
+    def test_touch_targets(self):
+        reader = EventReader(self.targets, timezone='UTC')
+        self.assertEqual(reader.categorize(touch(NOW, TOUCH_A)), ('cron', 'touch', 'touch:' + TOUCH_A))
+        self.assertEqual(reader.categorize(touch(NOW, '/tmp/other.txt')), ('cron',))
+        self.assertEqual(reader.categorize(stamp(NOW) + ' host CROND[1]: (root) CMD (run-parts)'), ('cron',))
+        self.assertEqual(reader.categorize(stamp(NOW) + ' host app: fine'), ())
+
+    def test_any_touch(self):
+        reader = EventReader(None, timezone='UTC')
+        self.assertEqual(reader.categorize(touch(NOW, '/tmp/other.txt')),
+                         ('cron', 'touch', 'touch:/tmp/other.txt'))
+
+    def test_errors_and_cron(self):
+        reader = EventReader(self.targets, timezone='UTC')
+        line = stamp(NOW) + ' host CROND[1]: (root) error: job failed'
+        self.assertEqual(reader.categorize(line), ('cron', 'error'))
+
+
+class CountTest(EventsTest):
+
+    def test_windows(self):
+        logfile = self.write([touch(NOW - 25 * 60, TOUCH_A),
+                              touch(NOW - 10 * 60, TOUCH_A),
+                              touch(NOW - 5 * 60, TOUCH_B),
+                              touch(NOW - 60, TOUCH_A),
+                              touch(NOW - 30, TOUCH_A)])
+        reader = EventReader(self.targets, timezone='UTC')
+        aggregator, matched, errors = self.count(reader, logfile, windows=[15, 30])
+        self.assertEqual((matched, errors), (5, 0))
+        counts = aggregator.counts(NOW)
+        self.assertEqual(dict((minutes, counts[minutes]['touch']) for minutes in counts),
+                         {7: 3, 15: 4, 30: 5})
+        self.assertEqual(len(aggregator.events(['cron'])), 3)
+
+    def test_per_target_routing(self):
+        logfile = self.write([touch(NOW - 120, TOUCH_A),
+                              touch(NOW - 90, TOUCH_B),
+                              touch(NOW - 60, TOUCH_A),
+                              touch(NOW - 30, '/tmp/other.txt')])
+        reader = EventReader(self.targets, timezone='UTC')
+        counts = self.count(reader, logfile)[0].counts(NOW)[7]
+        self.assertEqual(counts['touch:' + TOUCH_A], 2)
+        self.assertEqual(counts['touch:' + TOUCH_B], 1)
+        self.assertEqual(counts['touch'], 3)
+        self.assertEqual(counts['cron'], 4)
+
+    def test_scan_stops_at_the_window(self):
+        logfile = self.write([touch(NOW - 3600, TOUCH_A), touch(NOW - 60, TOUCH_A)])
+        reader = EventReader(self.targets, timezone='UTC')
+        events = reader.scan(logfile, NOW, NOW - 7 * 60)
+        self.assertEqual([epoch for epoch, _ in events], [NOW - 60])
+
+    def test_stamp_drops_lines_without_time(self):
+        reader = EventReader(self.targets, timezone='UTC')
+        events = reader.stamp([touch(NOW - 60, TOUCH_A).encode('ascii'), b'-- no stamp --'], NOW)
+        self.assertEqual(events, [(NOW - 60, touch(NOW - 60, TOUCH_A))])
+        self.assertEqual(reader.lines_scanned, 2)
+
+
+class CollapseTest(EventsTest):
+
+    def test_repeated_messages(self):
+        logfile = self.write(['{} host kernel: disk error on sda'.format(stamp(NOW - seconds))
+                              for seconds in (300, 200, 200, 100)] +
+                             ['{} host app: warning, low memory'.format(stamp(NOW - 50))])
+        reader = EventReader(self.targets, timezone='UTC')
+        aggregator, matched, errors = self.count(reader, logfile)
+        self.assertEqual((matched, errors), (5, 5))
+        messages = aggregator.collapsed(('error', 'warning'))
+        self.assertEqual([(message['message'], message['count']) for message in messages],
+                         [('host app: warning, low memory', 1), ('host kernel: disk error on sda', 4)])
+        self.assertEqual((messages[1]['first'], messages[1]['last']), (NOW - 300, NOW - 100))
+
+    def test_hosts_merged(self):
+        # Relayed logs without a host name give every host the same messages
+        for host, seconds in (('web1', (300, 100)), ('web2', (250, 40))):
+            self.write(['{} kernel: disk error on sda'.format(stamp(NOW - second)) for second in seconds] +
+                       ['{} kernel: {} only, error'.format(stamp(NOW - 10), host)], host + '.log')
+        results = [scan_host((host, os.path.join(self.tmpdir, host + '.log'), NOW, 7, [],
+                              self.targets, 'UTC', None)) for host in ('web1', 'web2')]
+        messages = merge_collapsed(result['messages'] for result in results)
+        self.assertEqual(sorted((message['message'], message['count']) for message in messages),
+                         [('kernel: disk error on sda', 4), ('kernel: web1 only, error', 1),
+                          ('kernel: web2 only, error', 1)])
+        shared = [message for message in messages if message['count'] == 4][0]
+        self.assertEqual((shared['first'], shared['last']), (NOW - 300, NOW - 40))
+        self.assertEqual(shared['line'], '{} kernel: disk error on sda'.format(stamp(NOW - 40)))
+        self.assertEqual([message['last'] for message in messages], sorted(
+            [message['last'] for message in messages], reverse=True))
+
+
+class PrefilterTest(EventsTest):
+
+    def test_only_candidate_lines_are_decoded(self):
+        lines = ['{} host app: fine {}'.format(stamp(NOW - 100 + number), number) for number in range(50)]
+        lines[10] = touch(NOW - 90, TOUCH_A)
+        lines[20] = '{} host app: cpu temperature above 90'.format(stamp(NOW - 80))
+        lines[30] = '<11>1 2026-10-17T11:58:50Z host app: failed'
+        lines[40] = '{} host app: SEGFAULT in worker'.format(stamp(NOW - 60))
+        logfile = self.write(lines)
+        rules = ([{'category': 'warning', 'regex': r'temperature above \d+'},
+                  {'category': 'error', 'keyword': 'segfault'}], {'error': 3, 'warning': 4})
+        reader = EventReader(self.targets, timezone='UTC', rules=rules)
+        aggregator, matched, errors = self.count(reader, logfile)
+        self.assertEqual((matched, errors), (4, 3))
+        self.assertEqual(reader.lines_scanned, 4)
+        self.assertEqual(reader.bytes_scanned, os.path.getsize(logfile))
+        counts = aggregator.counts(NOW)[7]
+        self.assertEqual((counts['error'], counts['warning'], counts['touch']), (2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
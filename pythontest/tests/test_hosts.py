@@ -0,0 +1,96 @@
+"""
+Tests for hosts: host log discovery and per-host scans
+"""
+
+import calendar
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from hosts import HostPool, find_host_logs, host_name, host_target, scan_host
+from targets import Target
+
+# 2026-10-17T12:00:00Z
+NOW = calendar.timegm((2026, 10, 17, 12, 0, 0, 0, 0, 0))
+
+
+def stamp(epoch):
+    moment = time.gmtime(epoch)
+    return time.strftime('%b {:2d} %H:%M:%S', moment).format(moment.tm_mday)
+
+
+class HostsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.target = Target('/tmp/a.txt', 1, '/tmp/rotate/a')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, lines):
+        filename = os.path.join(self.tmpdir, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as filehandle:
+            filehandle.write(''.join(line + '\n' for line in lines))
+        return filename
+
+    def host_log(self, name, touches, errors=0):
+        lines = ['{} host CROND[1]: (root) CMD (touch /tmp/a.txt)'.format(stamp(NOW - 60 * (touches - number)))
+                 for number in range(touches)]
+        lines += ['{} host app: disk error'.format(stamp(NOW - 30)) for _ in range(errors)]
+        return self.write(name, lines)
+
+    def test_host_name(self):
+        self.assertEqual(host_name('/var/log/remote/web1.log'), 'web1')
+        self.assertEqual(host_name('/var/log/remote/web2/syslog'), 'web2')
+        self.assertEqual(host_name('/var/log/remote/db1'), 'db1')
+
+    def test_find_host_logs(self):
+        web1 = self.write('web1.log', [])
+        self.write('web1.log.1', [])
+        self.write('web1.log.2.gz', [])
+        db1 = self.write('db1/syslog', [])
+        self.assertEqual(find_host_logs(self.tmpdir), {'web1': web1})
+        self.assertEqual(find_host_logs(os.path.join(self.tmpdir, '*', 'syslog')), {'db1': db1})
+
+    def test_duplicate_host(self):
+        self.write('web1.log', [])
+        self.write('web1', [])
+        self.assertRaises(ValueError, find_host_logs, self.tmpdir)
+
+    def test_host_target(self):
+        target = host_target(self.target, 'web1')
+        self.assertEqual((target.touch, target.frequency, target.rename),
+                         ('/tmp/web1-a.txt', 1, '/tmp/rotate/a-web1'))
+
+    def test_scan_host(self):
+        logfile = self.host_log('web1.log', 3, errors=2)
+        result = scan_host(('web1', logfile, NOW, 7, [60], [self.target], 'UTC', None))
+        self.assertEqual(result['host'], 'web1')
+        self.assertEqual(result['windows'][7]['touch'], 3)
+        self.assertEqual(result['windows'][60]['error'], 2)
+        self.assertEqual([(entry['message'], entry['count']) for entry in result['messages']],
+                         [('host app: disk error', 2)])
+
+    def test_scan_host_error(self):
+        result = scan_host(('web1', self.tmpdir, NOW, 7, [], [self.target], 'UTC', None))
+        self.assertEqual(sorted(result), ['error', 'host'])
+
+    def test_pool(self):
+        self.host_log('web1.log', 1)
+        self.host_log('web2.log', 2)
+        pool = HostPool(self.tmpdir, processes=2)
+        try:
+            results = pool.scan(NOW, 7, [], [self.target], timezone='UTC')
+        finally:
+            pool.close()
+        self.assertEqual([(result['host'], result['windows'][7]['touch']) for result in results],
+                         [('web1', 1), ('web2', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
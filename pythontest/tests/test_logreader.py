@@ -0,0 +1,152 @@
+"""
+Tests for logreader: backward block reads, rotated generations and checkpoints
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from logreader import (LogCheckpoint, ReplayCursor, log_time_range, reverse_lines, reverse_scan,
+                       reverse_segment_lines, rotated_segments)
+from scanner import LineScanner
+
+
+def write(filename, data, mode='wb'):
+    with open(filename, mode) as filehandle:
+        filehandle.write(data)
+
+
+class LogReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmpdir, 'syslog')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class ReverseLinesTest(LogReaderTest):
+
+    def test_newest_first_across_blocks(self):
+        lines = [('line %d' % number).encode('ascii') for number in range(100)]
+        write(self.log, b'\n'.join(lines) + b'\n')
+        self.assertEqual(list(reverse_lines(self.log, block_size=7)), lines[::-1])
+
+    def test_no_trailing_newline_and_crlf(self):
+        write(self.log, b'one\r\n\ntwo\r\nthree')
+        self.assertEqual(list(reverse_lines(self.log, block_size=4)), [b'three', b'two', b'one'])
+
+    def test_end_offset(self):
+        write(self.log, b'one\ntwo\nthree\n')
+        self.assertEqual(list(reverse_lines(self.log, end=8)), [b'two', b'one'])
+
+    def test_reverse_scan_keeps_candidates(self):
+        lines = [b'x CROND[1]: touch %d' % number if number % 3 == 0 else b'x other %d' % number
+                 for number in range(50)]
+        write(self.log, b'\n'.join(lines) + b'\n')
+        found = list(reverse_scan(self.log, LineScanner(), block_size=16, max_block_size=64))
+        self.assertEqual(found, [line for line in reversed(lines) if b'CROND' in line])
+
+
+class RotatedSegmentsTest(LogReaderTest):
+
+    def test_generations_in_order(self):
+        for name in ('syslog', 'syslog.1', 'syslog.2.gz', 'syslog.10.gz', 'syslog.old'):
+            write(os.path.join(self.tmpdir, name), b'')
+        self.assertEqual([os.path.basename(name) for name in rotated_segments(self.log)],
+                         ['syslog', 'syslog.1', 'syslog.2.gz', 'syslog.10.gz'])
+
+    def test_continues_into_gzip_generation(self):
+        write(self.log, b'3 c\n')
+        write(self.log + '.1', b'2 b\n')
+        with gzip.open(self.log + '.2.gz', 'wb') as filehandle:
+            filehandle.write(b'0 old\n1 a\n')
+        self.assertEqual(list(reverse_segment_lines(self.log)), [b'3 c', b'2 b', b'1 a', b'0 old'])
+
+    def test_window_skips_old_lines_and_generations(self):
+        write(self.log, b'3 c\n')
+        with gzip.open(self.log + '.1.gz', 'wb') as filehandle:
+            filehandle.write(b'0 old\n1 a\n')
+        write(self.log + '.2', b'-1 older\n')
+        os.utime(self.log + '.2', (0, 0))
+        lines = reverse_segment_lines(self.log, newer_than=0.5, timestamp=lambda line: float(line.split()[0]))
+        self.assertEqual(list(lines), [b'3 c', b'1 a'])
+
+
+class LogCheckpointTest(LogReaderTest):
+
+    def test_reads_only_new_complete_lines(self):
+        write(self.log, b'one\ntwo\n')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.seek_end()
+        write(self.log, b'three\nfour', mode='ab')
+        self.assertEqual(checkpoint.read_new(), [b'three'])
+        write(self.log, b'\nfive\n', mode='ab')
+        self.assertEqual(checkpoint.read_new(), [b'four', b'five'])
+        self.assertEqual(checkpoint.read_new(), [])
+
+    def test_reads_in_blocks(self):
+        lines = [('line %d' % number).encode('ascii') * (number % 5 + 1) for number in range(200)]
+        write(self.log, b'\n'.join(lines) + b'\npartial')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.block_size = 16
+        self.assertEqual(checkpoint.read_new(), lines)
+        self.assertEqual(checkpoint.offset, os.path.getsize(self.log) - len(b'partial'))
+
+    def test_scanner_in_blocks(self):
+        lines = [b'x CROND[1]: %d' % number if number % 2 else b'x other %d' % number for number in range(40)]
+        write(self.log, b'\n'.join(lines) + b'\n')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.block_size = 10
+        self.assertEqual(checkpoint.read_new(scanner=LineScanner()), lines[1::2])
+
+    def test_truncation_restarts(self):
+        write(self.log, b'one\ntwo\n')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.seek_end()
+        write(self.log, b'new\n')
+        self.assertEqual(checkpoint.read_new(), [b'new'])
+
+    def test_rotation_collects_unread_tail(self):
+        write(self.log, b'one\n')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.seek_end()
+        write(self.log, b'two\nlast', mode='ab')
+        os.rename(self.log, self.log + '.1')
+        write(self.log, b'fresh\n')
+        self.assertEqual(checkpoint.read_new(), [b'two', b'last', b'fresh'])
+
+    def test_save_and_restore(self):
+        write(self.log, b'one\n')
+        checkpoint = LogCheckpoint(self.log)
+        checkpoint.seek_end()
+        restored = LogCheckpoint.from_dict(self.log, checkpoint.to_dict())
+        self.assertTrue(restored.started)
+        self.assertEqual(restored.offset, 4)
+        self.assertFalse(LogCheckpoint.from_dict(self.log + '.other', checkpoint.to_dict()).started)
+
+
+class TimeRangeTest(LogReaderTest):
+
+    @staticmethod
+    def timestamp(line):
+        first = line.split(b' ')[0]
+        return float(first) if first.isdigit() else None
+
+    def test_log_time_range(self):
+        write(self.log, b'header\n10 a\n20 b\n30 c\ntrailer\n')
+        self.assertEqual(log_time_range(self.log, self.timestamp), (10.0, 30.0))
+
+    def test_replay_cursor(self):
+        write(self.log, b'10 a\n20 b\ncontinued\n30 c\n')
+        cursor = ReplayCursor(self.log, self.timestamp, block_size=8)
+        self.assertEqual(cursor.advance(5), 0)
+        self.assertEqual(cursor.advance(20), len(b'10 a\n20 b\ncontinued\n'))
+        self.assertEqual(cursor.advance(100), os.path.getsize(self.log))
+
+
+if __name__ == '__main__':
+    unittest.main()
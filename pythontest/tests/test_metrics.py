@@ -0,0 +1,84 @@
+"""
+Tests for metrics: phase timers, counters and the exported files
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from metrics import Metrics, Profiler
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_counters_gauges_and_phases(self):
+        metrics = Metrics()
+        metrics.count('loops')
+        metrics.count('lines_scanned', 10)
+        metrics.gauge('schedule_lag_seconds', 0.5)
+        for _ in range(2):
+            with metrics.phase('parse'):
+                pass
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['loops'], 1)
+        self.assertEqual(snapshot['counters']['lines_scanned'], 10)
+        self.assertEqual(snapshot['counters']['rotations'], 0)
+        self.assertEqual(snapshot['gauges']['schedule_lag_seconds'], 0.5)
+        self.assertEqual(snapshot['phases']['parse']['count'], 2)
+        self.assertTrue(snapshot['phases']['parse']['sum'] >= snapshot['phases']['parse']['last'] >= 0)
+
+    def test_phase_timed_on_error(self):
+        metrics = Metrics()
+        try:
+            with metrics.phase('rotate'):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+        self.assertEqual(metrics.phases['rotate']['count'], 1)
+
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        metrics.count('loops', 3)
+        with metrics.phase('update'):
+            pass
+        text = metrics.prometheus_text()
+        self.assertIn('# TYPE pythontest_loops_total counter\npythontest_loops_total 3\n', text)
+        self.assertIn('# TYPE pythontest_schedule_lag_seconds gauge\n', text)
+        self.assertIn('pythontest_phase_seconds_count{phase="update"} 1\n', text)
+        self.assertIn('pythontest_phase_last_seconds{phase="update"} ', text)
+
+    def test_export(self):
+        prometheus = os.path.join(self.tmpdir, 'pythontest.prom')
+        stats = os.path.join(self.tmpdir, 'stats.json')
+        metrics = Metrics(prometheus=prometheus, stats=stats)
+        metrics.count('rotations')
+        metrics.export()
+        with open(prometheus) as filehandle:
+            self.assertEqual(filehandle.read(), metrics.prometheus_text())
+        with open(stats) as filehandle:
+            self.assertEqual(json.load(filehandle)['counters']['rotations'], 1)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['pythontest.prom', 'stats.json'])
+
+    def test_export_failure_is_not_fatal(self):
+        Metrics(stats=os.path.join(self.tmpdir, 'missing', 'stats.json')).export()
+
+    def test_cprofile(self):
+        output = os.path.join(self.tmpdir, 'profile.out')
+        profiler = Profiler('cprofile', output)
+        profiler.start()
+        sum(range(100))
+        profiler.stop()
+        profiler.stop()
+        self.assertTrue(os.path.getsize(output) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
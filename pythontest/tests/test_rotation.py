@@ -0,0 +1,226 @@
+"""
+Tests for rotation: due checks, numbering, retention and background compression
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from archive import ArchiveIndex
+from clock import VirtualClock
+from rotation import Compressor, Rotator
+from state import StateFile
+
+NOW = 1700000000.0
+
+
+class DeferredFuture(object):
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.finished = False
+
+    def run(self):
+        self.function(*self.args)
+        self.finished = True
+
+    def done(self):
+        return self.finished
+
+    def result(self):
+        if not self.finished:
+            self.run()
+
+
+class DeferredExecutor(object):
+    """
+    Holds submitted jobs until run(), so a compression stays in flight
+    """
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, function, *args):
+        future = DeferredFuture(function, args)
+        self.futures.append(future)
+        return future
+
+    def run(self):
+        for future in self.futures:
+            if not future.done():
+                future.run()
+
+
+class RotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.touch = os.path.join(self.tmpdir, 'touch.log')
+        self.prefix = os.path.join(self.tmpdir, 'rotated')
+        self.state = StateFile(os.path.join(self.tmpdir, 'state.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text='line\n', rotator=None):
+        with open(self.touch, 'a') as filehandle:
+            filehandle.write(text)
+        if rotator is not None:
+            rotator.note_append(self.touch, text)
+
+    def names(self, rotator):
+        return [os.path.basename(entry[1]) for entry in rotator.state.get('rotation')[self.prefix]['files']]
+
+
+class DueTest(RotationTest):
+
+    def test_missing_file_is_never_due(self):
+        self.assertIsNone(Rotator(self.state, loops=1).due(self.touch, 1))
+
+    def test_loops_size_and_lines(self):
+        self.write('one\n')
+        self.assertEqual(Rotator(self.state, loops=5).due(self.touch, 10), '5 loops')
+        self.assertIsNone(Rotator(self.state, loops=5).due(self.touch, 11))
+        self.assertEqual(Rotator(self.state, loops=0, max_bytes=4).due(self.touch, 1), '4 bytes')
+        rotator = Rotator(StateFile(), loops=0, max_lines=3)
+        self.assertIsNone(rotator.due(self.touch, 1))
+        self.write('two\nthree\n', rotator)
+        self.assertEqual(rotator.due(self.touch, 2), '3 lines')
+
+    def test_age(self):
+        clock = VirtualClock(NOW)
+        rotator = Rotator(StateFile(), loops=0, max_age=60, clock=clock)
+        self.write()
+        os.utime(self.touch, (NOW, NOW))
+        self.assertIsNone(rotator.due(self.touch, 1))
+        clock.sleep(60)
+        self.assertEqual(rotator.due(self.touch, 2), '60 seconds old')
+
+
+class RotateTest(RotationTest):
+
+    def test_numbering_skips_existing_files(self):
+        for name in ('rotated.1', 'rotated.3.gz'):
+            with open(os.path.join(self.tmpdir, name), 'w') as filehandle:
+                filehandle.write('old\n')
+        rotator = Rotator(self.state)
+        self.write()
+        self.assertEqual(rotator.rotate(self.touch, self.prefix), self.prefix + '.4')
+        self.assertFalse(os.path.exists(self.touch))
+        self.write()
+        self.assertEqual(rotator.rotate(self.touch, self.prefix), self.prefix + '.5')
+        self.assertEqual(self.names(rotator), ['rotated.1', 'rotated.3.gz', 'rotated.4', 'rotated.5'])
+
+    def test_state_survives_restart(self):
+        rotator = Rotator(self.state)
+        self.write()
+        rotator.rotate(self.touch, self.prefix)
+        restored = Rotator(StateFile(self.state.filename))
+        self.write()
+        self.assertEqual(restored.rotate(self.touch, self.prefix), self.prefix + '.2')
+
+    def test_keep(self):
+        rotator = Rotator(self.state, keep=2)
+        for _ in range(4):
+            self.write()
+            rotator.rotate(self.touch, self.prefix)
+        self.assertEqual(self.names(rotator), ['rotated.3', 'rotated.4'])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['rotated.3', 'rotated.4', 'state.json'])
+
+    def test_keep_bytes_keeps_the_newest(self):
+        rotator = Rotator(self.state, keep_bytes=10)
+        for text in ('12345\n', '12345\n', '1234567890abc\n'):
+            self.write(text)
+            rotator.rotate(self.touch, self.prefix)
+        self.assertEqual(self.names(rotator), ['rotated.3'])
+
+
+class CompressionTest(RotationTest):
+
+    def test_compressed_entries(self):
+        rotator = Rotator(self.state, compress=True)
+        self.write('compress me\n')
+        rotator.rotate(self.touch, self.prefix)
+        rotator.close()
+        self.assertEqual(self.names(rotator), ['rotated.1.gz'])
+        with gzip.open(self.prefix + '.1.gz', 'rb') as filehandle:
+            self.assertEqual(filehandle.read(), b'compress me\n')
+        self.assertFalse(os.path.exists(self.prefix + '.1'))
+        self.assertEqual(StateFile(self.state.filename).get('rotation')[self.prefix]['files'][0][1],
+                         self.prefix + '.1.gz')
+
+    def test_files_being_compressed_are_kept(self):
+        executor = DeferredExecutor()
+        rotator = Rotator(self.state, compress=True, keep=1, executor=executor)
+        for _ in range(3):
+            self.write()
+            rotator.rotate(self.touch, self.prefix)
+        self.assertTrue(rotator.compressor.busy(self.prefix + '.1'))
+        self.assertEqual(self.names(rotator), ['rotated.1', 'rotated.2', 'rotated.3'])
+        executor.run()
+        self.assertFalse(rotator.compressor.busy(self.prefix + '.1'))
+        self.assertEqual(self.names(rotator), ['rotated.3.gz'])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['rotated.3.gz', 'state.json'])
+
+    def test_compress_skips_missing_files(self):
+        self.assertIsNone(Compressor.compress(self.touch))
+
+    def test_concurrent_saves(self):
+        rotator = Rotator(self.state, compress=True, keep=3)
+        errors = []
+
+        def save():
+            try:
+                for _ in range(200):
+                    self.state.save()
+            except Exception as err:
+                errors.append(err)
+
+        saver = threading.Thread(target=save)
+        saver.start()
+        for _ in range(20):
+            self.write('x' * 1000 + '\n')
+            rotator.rotate(self.touch, self.prefix)
+        saver.join()
+        rotator.close()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.names(rotator)), 3)
+        self.assertEqual(StateFile(self.state.filename).get('rotation'), self.state.get('rotation'))
+
+
+class IndexTest(RotationTest):
+
+    def test_rotated_files_are_indexed(self):
+        rotator = Rotator(self.state, index=True)
+        self.write('2026-10-17T00:00:00: cron touch command events count 3\n')
+        rotator.rotate(self.touch, self.prefix)
+        entries = list(ArchiveIndex(self.prefix).entries())
+        self.assertEqual([entry['file'] for entry in entries], [self.prefix + '.1'])
+
+    def test_index_without_the_state_lock(self):
+        # A save from another thread must not wait for the file to be read
+        rotator = Rotator(self.state, index=True)
+        acquired = []
+
+        def save():
+            acquired.append(self.state.lock.acquire(False))
+            if acquired[-1]:
+                self.state.lock.release()
+
+        def index(prefix, filename):
+            saver = threading.Thread(target=save)
+            saver.start()
+            saver.join()
+
+        rotator._index = index
+        self.write()
+        rotator.rotate(self.touch, self.prefix)
+        self.assertEqual(acquired, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
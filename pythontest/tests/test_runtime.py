@@ -0,0 +1,107 @@
+"""
+Tests for runtime: schedules sharing one parse, rotating outside the lock
+(Python 3.7 or later, like --asyncio)
+"""
+
+import logging
+import sys
+import threading
+import time
+import unittest
+
+from targets import Target
+
+
+class FakeArgs(object):
+    watch = False
+
+
+class FakeMetrics(object):
+
+    def __init__(self, ops):
+        self.ops = ops
+
+    def export(self):
+        with self.ops._calls_lock:
+            self.ops.calls.append(('export',))
+
+
+class FakeOps(object):
+    """
+    The parts of Ops the schedules use, recording each phase
+    """
+
+    def __init__(self, targets):
+        from concurrent.futures import ThreadPoolExecutor
+        self.log = logging.getLogger('test_runtime')
+        self.args = FakeArgs()
+        self.targets = targets
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self._standard_loop_deadline = None
+        self.calls = []
+        self.rotating = 0
+        self.overlapped = False
+        self._calls_lock = threading.Lock()
+        self.metrics = FakeMetrics(self)
+
+    def _run_phases(self, targets=None, loop_count=None, parse=True, rotate=True):
+        with self._calls_lock:
+            self.calls.append(('phases', targets[0].frequency, parse, rotate))
+
+    def _rotate_phase(self, targets=None, loop_count=None):
+        with self._calls_lock:
+            self.rotating += 1
+            self.overlapped = self.overlapped or self.rotating > 1
+        time.sleep(0.1)
+        with self._calls_lock:
+            self.rotating -= 1
+            self.calls.append(('rotate', targets[0].frequency))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'asyncio runtime needs Python 3.7 or later')
+class ScheduleTest(unittest.TestCase):
+
+    def run_schedules(self, ops, seconds):
+        import asyncio
+        from runtime import AsyncRuntime
+
+        runtime = AsyncRuntime(ops)
+        loop = runtime.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.set_default_executor(ops.executor)
+            runtime._lock = asyncio.Lock()
+            start = loop.time()
+            tasks = [loop.create_task(runtime._schedule(targets, start)) for targets in runtime.schedules()]
+            loop.run_until_complete(asyncio.sleep(seconds))
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            ops.executor.shutdown(wait=True)
+        return runtime
+
+    def test_schedules_due_together_share_one_parse(self):
+        ops = FakeOps([Target('/tmp/a.txt', 1, '/tmp/a'), Target('/tmp/b.txt', 2, '/tmp/b'),
+                       Target('/tmp/c.txt', 2, '/tmp/c')])
+        runtime = self.run_schedules(ops, 0.5)
+        phases = [call for call in ops.calls if call[0] == 'phases']
+        self.assertEqual(len(phases), 2)
+        self.assertEqual([call[2] for call in phases], [True, False])
+        self.assertEqual(runtime._generation, 1)
+        self.assertEqual(sorted(call for call in ops.calls if call[0] == 'rotate'),
+                         [('rotate', 1), ('rotate', 2)])
+        # Each loop's metrics are exported once it has rotated
+        self.assertEqual([ops.calls[index - 1][0] for index, call in enumerate(ops.calls)
+                          if call[0] == 'export'], ['rotate', 'rotate'])
+
+    def test_rotations_run_side_by_side(self):
+        ops = FakeOps([Target('/tmp/a.txt', 1, '/tmp/a'), Target('/tmp/b.txt', 2, '/tmp/b')])
+        self.run_schedules(ops, 0.5)
+        self.assertTrue(ops.overlapped)
+
+
+if __name__ == '__main__':
+    unittest.main()
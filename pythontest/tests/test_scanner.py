@@ -0,0 +1,146 @@
+"""
+Tests for scanner: candidate lines cut out of byte buffers
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+
+from classifier import Classifier
+from scanner import LineScanner
+
+LOG = (b'Oct 17 12:00:01 host CROND[1]: (root) CMD (touch /tmp/a)\n'
+       b'Oct 17 12:00:02 host kernel: all good\n'
+       b'Oct 17 12:00:03 host kernel: disk ERROR on sda\n'
+       b'<11>Oct 17 12:00:04 host app: failed\n'
+       b'Oct 17 12:00:05 host app: Warning, warning again\r\n'
+       b'Oct 17 12:00:06 host app: <11> not at the start\n')
+
+
+class LineScannerTest(unittest.TestCase):
+
+    def test_patterns(self):
+        scanner = LineScanner()
+        self.assertEqual(scanner.lines(LOG), [LOG.split(b'\n')[0]])
+        self.assertEqual(scanner.bytes_scanned, len(LOG))
+
+    def test_keywords_ignore_case(self):
+        scanner = LineScanner(patterns=(), keywords=(b'error', b'WARNING'))
+        self.assertEqual(scanner.lines(LOG), [b'Oct 17 12:00:03 host kernel: disk ERROR on sda',
+                                              b'Oct 17 12:00:05 host app: Warning, warning again'])
+
+    def test_keywords_are_literal(self):
+        scanner = LineScanner(patterns=(), keywords=(b'(root)',))
+        self.assertEqual(len(scanner.lines(LOG)), 1)
+        self.assertEqual(LineScanner(patterns=(), keywords=(b'a.l',)).lines(LOG), [])
+
+    def test_line_prefixes(self):
+        scanner = LineScanner(patterns=(), line_prefixes=(br'<11>',))
+        self.assertEqual(scanner.lines(LOG), [b'<11>Oct 17 12:00:04 host app: failed'])
+        self.assertEqual(scanner.lines(b'<11>first\nsecond\n'), [b'<11>first'])
+
+    def test_lines_in_buffer_order_once(self):
+        scanner = LineScanner(keywords=(b'touch', b'tmp'), line_prefixes=(br'<11>',))
+        self.assertEqual(scanner.lines(LOG), [LOG.split(b'\n')[0], LOG.split(b'\n')[3]])
+
+    def test_range(self):
+        lines = LOG.split(b'\n')
+        start = len(lines[0]) + 1
+        end = start + len(lines[1]) + 1 + len(lines[2]) + 1
+        scanner = LineScanner(keywords=(b'error',))
+        self.assertEqual(scanner.lines(LOG, start, end), [lines[2]])
+        self.assertEqual(scanner.lines(LOG, 0, start), [lines[0]])
+        self.assertEqual(scanner.bytes_scanned, end)
+
+    def test_mmap(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'syslog')
+            with open(filename, 'wb') as filehandle:
+                filehandle.write(LOG)
+            with open(filename, 'rb') as filehandle:
+                buf = mmap.mmap(filehandle.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    found = LineScanner(keywords=(b'error',)).lines(buf)
+                finally:
+                    buf.close()
+            self.assertEqual(found, [LOG.split(b'\n')[0], LOG.split(b'\n')[2]])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class CronLinesTest(unittest.TestCase):
+    """
+    The cron prefilter: only lines with a pattern hit are cut out of a block
+    """
+
+    def test_line_edges(self):
+        scanner = LineScanner()
+        self.assertEqual(scanner.lines(b'a CROND[1]: first\r\nb other\nc CROND[2]: last'),
+                         [b'a CROND[1]: first', b'c CROND[2]: last'])
+        self.assertEqual(scanner.lines(b' CROND[1]: at the start\n'), [b' CROND[1]: at the start'])
+        self.assertEqual(scanner.lines(b''), [])
+        self.assertEqual(scanner.lines(LOG, 10, 10), [])
+
+    def test_several_hits_one_line(self):
+        scanner = LineScanner(patterns=(br' CROND\[', br'touch /tmp/'))
+        self.assertEqual(scanner.lines(b'x CROND[1]: (root) CMD (touch /tmp/a) CROND[\ny\n'),
+                         [b'x CROND[1]: (root) CMD (touch /tmp/a) CROND['])
+
+    def test_range_cuts_lines_at_its_edges(self):
+        lines = LOG.split(b'\n')
+        end = len(lines[0])
+        # A range ending inside a line only sees the part before its end
+        self.assertEqual(LineScanner().lines(LOG, 0, end - 5), [lines[0][:end - 5]])
+
+    def test_same_lines_as_filtering_every_line(self):
+        lines = [b'Oct 17 12:%02d:00 host CROND[%d]: (root) CMD (touch /tmp/a)' % (number % 60, number)
+                 if number % 7 in (0, 3) else b'Oct 17 12:%02d:00 host kernel: line %d' % (number % 60, number)
+                 for number in range(200)]
+        buf = b'\n'.join(lines) + b'\n'
+        scanner = LineScanner()
+        self.assertEqual(scanner.lines(buf), [line for line in lines if b' CROND[' in line])
+        self.assertEqual(scanner.bytes_scanned, len(buf))
+
+
+class PrefilterTest(unittest.TestCase):
+    """
+    The prefilter may let through lines the classifier rejects, never the reverse
+    """
+
+    RULES = [{'category': 'error', 'regex': r'^Oct 17 12:00:02 h kernel'},
+             {'category': 'warning', 'regex': r'again$'},
+             {'category': 'error', 'regex': r'disk \w+ on sd[a-z]'},
+             {'category': 'warning', 'keyword': 'Timeout'}]
+
+    def test_keeps_every_classified_line(self):
+        log = (b'Oct 17 12:00:01 h kernel: first\n'
+               b'Oct 17 12:00:02 h kernel: anchored at a line start\n'
+               b'Oct 17 12:00:03 h app: warning again\n'
+               b'Oct 17 12:00:04 h app: again and again, not at the end\n'
+               b'<11>Oct 17 12:00:05 h app: failed\n'
+               b'Oct 17 12:00:06 h kernel: disk error on sdb\n'
+               b'Oct 17 12:00:07 h app: TIMEOUT talking to db\n'
+               b'Oct 17 12:00:08 h app: fine\n')
+        classifier = Classifier(self.RULES)
+        scanner = LineScanner(patterns=classifier.patterns, keywords=classifier.keywords,
+                              line_prefixes=classifier.line_prefixes)
+        found = scanner.lines(log)
+        classified = [line for line in log.split(b'\n') if classifier.classify(line.decode('ascii'))]
+        self.assertEqual(len(classified), 5)
+        self.assertEqual([line for line in classified if line not in found], [])
+        self.assertIn(b'Oct 17 12:00:02 h kernel: anchored at a line start', found)
+        self.assertNotIn(b'Oct 17 12:00:04 h app: again and again, not at the end', found)
+
+    def test_anchors_at_each_line(self):
+        log = b'Oct 17 12:00:01 h kernel: first\nOct 17 12:00:02 h kernel: second\n'
+        self.assertEqual(LineScanner(patterns=[br'^Oct 17 12:00:02 h kernel']).lines(log),
+                         [b'Oct 17 12:00:02 h kernel: second'])
+        self.assertEqual(LineScanner(patterns=[br'first$']).lines(log),
+                         [b'Oct 17 12:00:01 h kernel: first'])
+
+
+if __name__ == '__main__':
+    unittest.main()
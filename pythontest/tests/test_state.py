@@ -0,0 +1,54 @@
+"""
+Tests for state: atomic writes and the state file
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from state import StateFile, atomic_write
+
+
+class StateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_atomic_write_replaces_and_cleans_up(self):
+        atomic_write(self.filename, 'one')
+        atomic_write(self.filename, 'two', mode=0o644)
+        with open(self.filename) as filehandle:
+            self.assertEqual(filehandle.read(), 'two')
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o644)
+        self.assertEqual(os.listdir(self.tmpdir), ['state.json'])
+
+    def test_round_trip(self):
+        state = StateFile(self.filename)
+        state.set('loops', 3)
+        state.set('rotation', {'a': [1, 2]})
+        state.save()
+        restored = StateFile(self.filename)
+        self.assertEqual(restored.get('loops'), 3)
+        self.assertEqual(restored.get('rotation'), {'a': [1, 2]})
+        self.assertEqual(restored.get('missing', 'default'), 'default')
+
+    def test_unreadable_file_is_empty_state(self):
+        with open(self.filename, 'w') as filehandle:
+            filehandle.write('{not json')
+        self.assertEqual(StateFile(self.filename).data, {})
+
+    def test_in_memory(self):
+        state = StateFile()
+        state.set('loops', 1)
+        state.save()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Tests for targets: the targets config file and touch command matching
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from targets import Target, TouchMatcher, load_targets
+
+
+class LoadTargetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.config = os.path.join(self.tmpdir, 'targets.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def load(self, config):
+        with open(self.config, 'w') as filehandle:
+            json.dump(config, filehandle)
+        return load_targets(self.config, 2, '/r/pt')
+
+    def test_defaults(self):
+        targets = self.load([{'file': '/t/a.txt'}, {'file': '/t/b.txt', 'rate': 5, 'prefix': '/r/b'}])
+        self.assertEqual([(target.touch, target.frequency, target.rename) for target in targets],
+                         [('/t/a.txt', 2, '/r/pt-a.txt'), ('/t/b.txt', 5, '/r/b')])
+
+    def test_object_form(self):
+        self.assertEqual(len(self.load({'targets': [{'file': '/t/a.txt'}]})), 1)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.load, [])
+        self.assertRaises(ValueError, self.load, [{'rate': 2}])
+        self.assertRaises(ValueError, self.load, [{'file': '/t/a.txt'}, {'file': '/t/a.txt'}])
+
+    def test_validate(self):
+        touch = os.path.join(self.tmpdir, 'a.txt')
+        self.assertEqual(Target(touch, 2, os.path.join(self.tmpdir, 'pt')).validate()[0], 0)
+        self.assertEqual(Target(touch, 0, os.path.join(self.tmpdir, 'pt')).validate()[0], 1)
+        self.assertEqual(Target('/nonexistent/dir/a.txt', 2, '/tmp/pt').validate()[0], 1)
+
+
+class TouchMatcherTest(unittest.TestCase):
+
+    def test_match(self):
+        first, second = Target('/t/a.txt', 2, '/r/a'), Target('/t/b.txt', 1, '/r/b')
+        matcher = TouchMatcher([first, second])
+        line = 'Oct 17 12:00:01 host CROND[1]: (root) CMD (touch /t/b.txt)'
+        self.assertIs(matcher.match(line), second)
+        self.assertIsNone(matcher.match(line.replace('b.txt', 'c.txt')))
+        self.assertIsNone(matcher.match('Oct 17 12:00:01 host CROND[1]: (root) CMD (ls)'))
+        self.assertEqual(TouchMatcher.touched(line.replace('b.txt', 'c.txt')), '/t/c.txt')
+
+    def test_cronjob(self):
+        target = Target('/t/a.txt', 3, '/r/a')
+        self.assertEqual(target.cronjob, '*/3 * * * * touch /t/a.txt')
+        self.assertEqual(target.category, 'touch:/t/a.txt')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Tests for timestamps: syslog stamp formats and RFC3164 year inference
+"""
+
+import calendar
+import time
+import unittest
+
+from timestamps import YEAR_ROLLBACK_SECONDS, TimestampParser, parse_offset, parse_time, strip_stamp
+
+# 2026-10-17T12:00:00Z
+NOW = calendar.timegm((2026, 10, 17, 12, 0, 0, 0, 0, 0))
+
+
+def rfc3164(epoch):
+    """
+    :return: "Mmm dd hh:mm:ss " stamp of epoch in UTC
+    """
+    moment = time.gmtime(epoch)
+    return time.strftime('%b {:2d} %H:%M:%S ', moment).format(moment.tm_mday)
+
+
+class YearInferenceTest(unittest.TestCase):
+
+    def test_days_old_sweep(self):
+        # Regression: stamps 358-365 days old were moved up to a week into the future.
+        # Only a stamp less than the largest UTC offset short of a year old is ambiguous.
+        parser = TimestampParser(timezone='UTC')
+        for days in range(366):
+            for seconds in (0, 6 * 3600, 13 * 3600, 23 * 3600):
+                age = days * 86400 + seconds
+                if age >= 365 * 86400 - 14 * 3600:
+                    continue
+                epoch = NOW - age
+                self.assertEqual(parser.parse(rfc3164(epoch), NOW), epoch,
+                                 '{} days {} seconds old'.format(days, seconds))
+
+    def test_never_beyond_rollback(self):
+        parser = TimestampParser(timezone='UTC')
+        for hours in range(0, 2 * 366 * 24, 5):
+            epoch = parser.parse(rfc3164(NOW - hours * 3600), NOW)
+            self.assertTrue(epoch <= NOW + YEAR_ROLLBACK_SECONDS, '{} hours old'.format(hours))
+
+    def test_clock_skew_stays_in_the_future(self):
+        parser = TimestampParser(timezone='UTC')
+        self.assertEqual(parser.parse(rfc3164(NOW + 600), NOW), NOW + 600)
+
+    def test_new_year_read_on_jan_1(self):
+        now = calendar.timegm((2027, 1, 1, 0, 10, 0, 0, 0, 0))
+        self.assertEqual(TimestampParser(timezone='UTC').parse('Dec 31 23:59:00 host cron', now),
+                         calendar.timegm((2026, 12, 31, 23, 59, 0, 0, 0, 0)))
+
+    def test_local_new_year_before_utc(self):
+        # 2026-12-31T20:00Z is already 2027-01-01T05:00 at +09:00
+        now = calendar.timegm((2026, 12, 31, 20, 0, 0, 0, 0, 0))
+        parser = TimestampParser(timezone='+09:00')
+        self.assertEqual(parser.parse('Jan  1 04:59:00 host cron', now), now - 60)
+        self.assertEqual(parser.parse('Dec 31 23:59:00 host cron', now), now - 5 * 3600 - 60)
+
+    def test_memoized_year_follows_now(self):
+        parser = TimestampParser(timezone='UTC')
+        line = 'Jan  1 00:00:00 host cron'
+        first = parser.parse(line, calendar.timegm((2026, 6, 1, 0, 0, 0, 0, 0, 0)))
+        second = parser.parse(line, calendar.timegm((2027, 6, 1, 0, 0, 0, 0, 0, 0)))
+        self.assertEqual(second - first, 365 * 86400)
+
+
+class FormatsTest(unittest.TestCase):
+
+    def test_fraction(self):
+        parser = TimestampParser(timezone='UTC')
+        epoch = parser.parse('Oct 17 11:00:00.250000 host cron', NOW)
+        self.assertAlmostEqual(epoch, NOW - 3600 + 0.25)
+        self.assertAlmostEqual(parser.parse('Oct 17 11:00:00.500000 host cron', NOW), NOW - 3600 + 0.5)
+
+    def test_iso8601_offsets(self):
+        parser = TimestampParser(timezone='UTC')
+        self.assertEqual(parser.parse('2026-10-17T12:00:00Z host cron'), NOW)
+        self.assertEqual(parser.parse('2026-10-17T14:00:00+02:00 host cron'), NOW)
+        self.assertEqual(parser.parse('<78>1 2026-10-17T12:00:00.5 host cron'), NOW + 0.5)
+        self.assertEqual(TimestampParser(timezone='-05:00').parse('2026-10-17 07:00:00 host'), NOW)
+
+    def test_unix_and_unknown(self):
+        parser = TimestampParser(timezone='UTC')
+        self.assertEqual(parser.parse('{}.5 host cron'.format(NOW)), NOW + 0.5)
+        self.assertIsNone(parser.parse('-- no stamp here'))
+        self.assertIsNone(parser.parse('Foo 17 12:00:00 host'))
+
+    def test_strip_stamp(self):
+        self.assertEqual(strip_stamp('Oct 17 12:00:00 host cron: hi'), 'host cron: hi')
+        self.assertEqual(strip_stamp('2026-10-17T12:00:00Z host'), 'host')
+        self.assertEqual(strip_stamp('no stamp'), 'no stamp')
+
+    def test_parse_offset(self):
+        self.assertEqual(parse_offset('Z'), 0)
+        self.assertEqual(parse_offset('+02:00'), 7200)
+        self.assertEqual(parse_offset('-0530'), -19800)
+        self.assertRaises(ValueError, parse_offset, 'CEST')
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time('2026-10-17T12:00:00', 'UTC'), NOW)
+        self.assertEqual(parse_time(str(NOW)), NOW)
+        self.assertRaises(ValueError, parse_time, 'yesterday')
+
+
+if __name__ == '__main__':
+    unittest.main()
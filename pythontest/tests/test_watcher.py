@@ -0,0 +1,95 @@
+"""
+Tests for watcher: inotify and polling change detection with debounce
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from watcher import InotifyWatcher, PollingWatcher, make_watcher
+
+
+def append(filename, data='line\n'):
+    with open(filename, 'a') as filehandle:
+        filehandle.write(data)
+
+
+class WatcherTests(object):
+    """
+    Shared by the inotify and polling tests, make() builds the watcher
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmpdir, 'syslog')
+        append(self.log)
+        self.watcher = self.make([self.log])
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_timeout_without_changes(self):
+        self.assertEqual(self.watcher.wait(0.05), set())
+
+    def test_append(self):
+        append(self.log)
+        self.assertEqual(self.watcher.wait(2), set([self.log]))
+
+    def test_other_files_are_ignored(self):
+        append(os.path.join(self.tmpdir, 'touchfile.txt'))
+        self.assertEqual(self.watcher.wait(0.3), set())
+
+    def test_rotation(self):
+        os.rename(self.log, self.log + '.1')
+        append(self.log, 'fresh\n')
+        self.assertEqual(self.watcher.wait(2), set([self.log]))
+
+    def test_debounce_collects_a_burst(self):
+        def burst():
+            for _ in range(3):
+                append(self.log)
+                time.sleep(0.05)
+        writer = threading.Thread(target=burst)
+        writer.start()
+        self.assertEqual(self.watcher.wait(2, debounce=0.3), set([self.log]))
+        writer.join()
+        self.assertEqual(self.watcher.wait(0.05), set())
+
+
+class InotifyWatcherTest(WatcherTests, unittest.TestCase):
+
+    def make(self, paths):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as err:
+            self.skipTest('inotify unavailable: {}'.format(err))
+
+
+class PollingWatcherTest(WatcherTests, unittest.TestCase):
+
+    @staticmethod
+    def make(paths):
+        return PollingWatcher(paths, interval=0.02)
+
+    def test_append(self):
+        # Size changes are seen even within the modification time resolution
+        append(self.log, 'longer line\n')
+        self.assertEqual(self.watcher.wait(2), set([self.log]))
+
+
+class MakeWatcherTest(unittest.TestCase):
+
+    def test_falls_back_to_polling(self):
+        watcher = make_watcher(['/nonexistent/dir/syslog'])
+        try:
+            self.assertTrue(isinstance(watcher, PollingWatcher))
+        finally:
+            watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
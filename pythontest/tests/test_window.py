@@ -0,0 +1,137 @@
+"""
+Tests for window: sliding counters and the multi-window aggregator
+"""
+
+import unittest
+
+from window import SlidingCounter, WindowAggregator
+
+NOW = 1700000000.0
+
+
+class SlidingCounterTest(unittest.TestCase):
+
+    def test_counts_inside_window(self):
+        counter = SlidingCounter(60)
+        counter.add(NOW - 30, ('cron', 'touch'))
+        counter.add(NOW - 10, ('cron',))
+        counts = counter.counts(NOW)
+        self.assertEqual(counts['cron'], 2)
+        self.assertEqual(counts['touch'], 1)
+        self.assertEqual(counts['error'], 0)
+
+    def test_expires_buckets_leaving_the_window(self):
+        counter = SlidingCounter(60)
+        counter.add(NOW, ('cron',))
+        self.assertEqual(counter.counts(NOW + 59)['cron'], 1)
+        self.assertEqual(counter.counts(NOW + 60)['cron'], 0)
+
+    def test_ignores_events_older_than_the_window(self):
+        counter = SlidingCounter(60)
+        counter.add(NOW, ('cron',))
+        counter.add(NOW - 61, ('cron',))
+        self.assertEqual(counter.counts(NOW)['cron'], 1)
+
+    def test_jump_past_the_ring_resets(self):
+        counter = SlidingCounter(60)
+        for second in range(60):
+            counter.add(NOW + second, ('cron',))
+        self.assertEqual(counter.counts(NOW + 59)['cron'], 60)
+        counter.add(NOW + 1000, ('touch',))
+        self.assertEqual(counter.counts(NOW + 1000), {'cron': 0, 'touch': 1, 'error': 0, 'warning': 0})
+
+    def test_minute_resolution_for_long_windows(self):
+        counter = SlidingCounter(7200)
+        self.assertEqual(counter.resolution, 60)
+        self.assertEqual(counter.size, 120)
+
+    def test_extra_categories(self):
+        counter = SlidingCounter(60)
+        counter.add(NOW, ('touch:/tmp/a',), count=3)
+        self.assertEqual(counter.counts(NOW)['touch:/tmp/a'], 3)
+
+    def test_save_and_load(self):
+        counter = SlidingCounter(60)
+        counter.add(NOW - 5, ('cron', 'error'))
+        counter.add(NOW, ('cron',))
+        restored = SlidingCounter(60)
+        restored.load(counter.to_dict())
+        self.assertEqual(restored.counts(NOW), counter.counts(NOW))
+        self.assertEqual(restored.counts(NOW + 56)['cron'], 1)
+
+
+class WindowAggregatorTest(unittest.TestCase):
+
+    def test_several_windows(self):
+        windows = WindowAggregator(primary=7, windows=(1, 60))
+        self.assertEqual(windows.windows, [1, 7, 60])
+        self.assertEqual(windows.longest, 60)
+        for minutes in (0.5, 5, 30):
+            windows.add(NOW - minutes * 60, ('cron',))
+        counts = windows.counts(NOW)
+        self.assertEqual([counts[minutes]['cron'] for minutes in (1, 7, 60)], [1, 2, 3])
+
+    def test_lines_expire_with_the_primary_window(self):
+        windows = WindowAggregator(primary=1)
+        windows.add(NOW - 90, ('cron',), 'old')
+        windows.add(NOW - 30, ('cron',), 'new')
+        windows.counts(NOW)
+        self.assertEqual(windows.events(), ['new'])
+        self.assertEqual(windows.events(('error',)), [])
+
+    def test_messages_collapse(self):
+        windows = WindowAggregator(primary=1)
+        for offset in (50, 50, 20):
+            windows.add_message(NOW - offset, ('error',), 'disk full', 'line {}'.format(offset))
+        windows.add_message(NOW - 10, ('warning',), 'slow', 'slow line')
+        collapsed = windows.collapsed(('error',))
+        self.assertEqual(len(collapsed), 1)
+        self.assertEqual(collapsed[0]['count'], 3)
+        self.assertEqual(collapsed[0]['line'], 'line 20')
+        self.assertEqual((collapsed[0]['first'], collapsed[0]['last']), (int(NOW - 50), int(NOW - 20)))
+        self.assertEqual([entry['message'] for entry in windows.collapsed()], ['slow', 'disk full'])
+
+    def test_messages_expire(self):
+        windows = WindowAggregator(primary=1)
+        windows.add_message(NOW - 90, ('error',), 'gone', 'gone')
+        windows.add_message(NOW - 70, ('error',), 'partly', 'partly')
+        windows.add_message(NOW - 10, ('error',), 'partly', 'partly')
+        windows.expire(NOW)
+        collapsed = windows.collapsed()
+        self.assertEqual([entry['message'] for entry in collapsed], ['partly'])
+        self.assertEqual(collapsed[0]['count'], 1)
+
+    def test_expire_visits_only_leaving_messages(self):
+        windows = WindowAggregator(primary=1)
+        for second in range(120):
+            windows.add_message(NOW + second, ('error',), 'repeated', 'line')
+            windows.add_message(NOW + second, ('warning',), 'message {}'.format(second), 'line')
+        windows.expire(NOW + 150)
+        self.assertEqual(len(windows.messages), 30)
+        self.assertEqual(windows.collapsed(('error',))[0]['count'], 29)
+        self.assertEqual(len(windows._expiry), 58)
+        windows.expire(NOW + 300)
+        self.assertEqual((len(windows.messages), len(windows._expiry)), (0, 0))
+
+    def test_expire_after_load(self):
+        windows = WindowAggregator(primary=1)
+        windows.add_message(NOW - 50, ('error',), 'old', 'old')
+        windows.add_message(NOW - 10, ('error',), 'new', 'new')
+        restored = WindowAggregator(primary=1)
+        restored.load(windows.to_dict())
+        restored.expire(NOW + 20)
+        self.assertEqual([entry['message'] for entry in restored.collapsed()], ['new'])
+
+    def test_save_and_load(self):
+        windows = WindowAggregator(primary=7, windows=(60,))
+        windows.add(NOW - 30, ('cron', 'touch'), 'touched')
+        windows.add_message(NOW - 20, ('error',), 'disk full', 'disk full line')
+        restored = WindowAggregator(primary=7, windows=(60,))
+        restored.load(windows.to_dict())
+        self.assertEqual(restored.counts(NOW), windows.counts(NOW))
+        self.assertEqual(restored.events(), ['touched'])
+        self.assertEqual(restored.collapsed(), windows.collapsed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for writer: touch file record formats and batched appends
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from writer import TouchWriter, format_record
+
+REPORT = {'kind': 'report', 'start': '2026-10-17T12:00:00', 'count': 3,
+          'windows': {60: 20, 1: 0}, 'events': ['Oct 17 11:59:00 host kernel: disk error']}
+
+
+class FormatRecordTest(unittest.TestCase):
+
+    def test_text_report(self):
+        self.assertEqual(format_record(REPORT),
+                         '2026-10-17T12:00:00: cron touch command events count 3, 0 in last 1 min, '
+                         '20 in last 60 min, 1 other events:\n'
+                         '[\n    "Oct 17 11:59:00 host kernel: disk error"\n]\n')
+
+    def test_text_report_without_events(self):
+        self.assertEqual(format_record({'start': '2026-10-17T12:00:00', 'count': 0}),
+                         '2026-10-17T12:00:00: cron touch command events count 0\n')
+
+    def test_text_alert(self):
+        alert = {'kind': 'alert', 'start': '2026-10-17T12:00:00', 'events': ['a', 'b']}
+        first, _, rest = format_record(alert).partition('\n')
+        self.assertEqual(first, '2026-10-17T12:00:00: 2 new warning or error events:')
+        # Python 2 indents JSON with trailing spaces after commas
+        self.assertEqual(json.loads(rest), ['a', 'b'])
+        self.assertTrue(rest.startswith('[\n    "a",'))
+
+    def test_jsonl(self):
+        text = format_record(REPORT, 'jsonl')
+        self.assertTrue(text.endswith('\n'))
+        self.assertEqual(text.count('\n'), 1)
+        self.assertEqual(json.loads(text)['count'], 3)
+
+
+class TouchWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.touch = os.path.join(self.tmpdir, 'touchfile.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, filename=None):
+        with open(filename or self.touch) as filehandle:
+            return filehandle.read()
+
+    def test_batched_commit(self):
+        writer = TouchWriter()
+        writer.append(self.touch, {'start': 'a', 'count': 1})
+        writer.append(self.touch, {'start': 'b', 'count': 2})
+        self.assertFalse(os.path.exists(self.touch))
+        self.assertEqual(writer.commit(), 1)
+        self.assertEqual(self.read(), 'a: cron touch command events count 1\nb: cron touch command events count 2\n')
+        writer.close()
+
+    def test_reopens_after_rotation(self):
+        writer = TouchWriter(durability='fsync', touch_format='jsonl')
+        writer.append(self.touch, {'start': 'a', 'count': 1})
+        writer.commit()
+        os.rename(self.touch, self.touch + '.1')
+        writer.append(self.touch, {'start': 'b', 'count': 2})
+        writer.commit()
+        writer.close()
+        self.assertEqual(json.loads(self.read(self.touch + '.1'))['start'], 'a')
+        self.assertEqual(json.loads(self.read())['start'], 'b')
+
+    def test_invalid_options(self):
+        self.assertRaises(ValueError, TouchWriter, durability='sometimes')
+        self.assertRaises(ValueError, TouchWriter, touch_format='xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
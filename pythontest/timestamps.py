@@ -0,0 +1,208 @@
+"""
+Convert syslog date and time stamps to seconds since the epoch
+"""
+
+import calendar
+import re
+import time
+
+MONTHS = dict((name, number) for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1))
+
+# RFC3164 (traditional syslog), also journald "short-precise": "Mar  7 18:10:01[.123456]"
+RE_RFC3164 = re.compile(r'([A-Z][a-z]{2}) ([ 0-9]\d) (\d\d):(\d\d):(\d\d)(\.\d+)?(?= )')
+# RFC5424 / ISO8601 (rsyslog high precision, journald "short-iso"), optional "<PRI>1 " header
+RE_ISO8601 = re.compile(r'(?:<\d{1,3}>\d{0,2} ?)?'
+                        r'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(\.\d+)?'
+                        r'(Z|[+-]\d\d:?\d\d)?(?= )')
+# journald "short-unix": "1697563801.123456"
+RE_UNIX = re.compile(r'(\d{9,11})(\.\d+)?(?= )')
+RE_OFFSET = re.compile(r'^([+-])(\d\d):?(\d\d)$')
+
+# A stamp further than this in the future belongs to the previous year; allows
+# clock skew, and a log written up to UTC+14 read with the wrong --log-timezone
+YEAR_ROLLBACK_SECONDS = 14 * 3600
+# Forget memoized stamps once this many are cached
+CACHE_SIZE = 100000
+
+
+def parse_offset(text):
+    """
+    :param text: UTC offset, ex. "Z", "+02:00", "-0500"
+    :ptype text: string
+    :return: offset east of UTC in seconds
+    :rtype: int
+    """
+    if text in ('Z', 'z', 'utc', 'UTC'):
+        return 0
+    match = RE_OFFSET.match(text)
+    if match is None:
+        raise ValueError('invalid UTC offset "{}"'.format(text))
+    seconds = int(match.group(2)) * 3600 + int(match.group(3)) * 60
+    return -seconds if match.group(1) == '-' else seconds
+
+
+def strip_stamp(line):
+    """
+    :param line: syslog line
+    :ptype line: string
+    :return: the line without its leading date and time stamp, so
+        repeats of the same message compare equal
+    :rtype: string
+    """
+    for regex in (RE_RFC3164, RE_ISO8601, RE_UNIX):
+        match = regex.match(line)
+        if match is not None:
+            return line[match.end():].lstrip()
+    return line
+
+
+def parse_time(text, timezone='local'):
+    """
+    :param text: ISO8601 date and time, ex. "2024-03-07T18:10:00" or
+        "2024-03-07 18:10:00+02:00", or seconds since the epoch
+    :ptype text: string
+    :param timezone: zone of times without a UTC offset, see TimestampParser
+    :ptype timezone: string
+    :return: seconds since the epoch
+    :rtype: float
+    """
+    epoch = TimestampParser(timezone=timezone).parse(text.strip() + ' ')
+    if epoch is None:
+        raise ValueError('invalid date and time "{}", use YYYY-MM-DDTHH:MM:SS'.format(text))
+    return epoch
+
+
+class TimestampParser(object):
+    """
+    Read the date and time stamp at the start of a syslog line and return
+    seconds since the epoch, so window checks are plain number comparisons.
+    Parsed stamps are memoized (many lines share the same second), the
+    missing year of RFC3164 stamps is the current year in the log's
+    timezone, or the previous one for stamps in the future (Dec 31 lines
+    read on Jan 1 belong to last year) and stamps
+    without a UTC offset are read in the configured timezone.
+    """
+
+    def __init__(self, timezone='local'):
+        """
+        :param timezone: zone of stamps without a UTC offset, "local"
+            (the host's zone, incl. daylight saving) or a fixed offset
+            (ex. "UTC", "+02:00")
+        :ptype timezone: string
+        """
+        self.offset = None if timezone == 'local' else parse_offset(timezone)
+        self._cache = {}
+        self._cache_key = None
+        self._now = None
+        self._year = None
+
+    def _to_epoch(self, fields, offset=None):
+        """
+        :param fields: year, month, day, hour, minute, second
+        :ptype fields: tuple of ints
+        :param offset: UTC offset in seconds (default: configured timezone)
+        :ptype offset: int
+        :return: seconds since the epoch
+        :rtype: float
+        """
+        if offset is None:
+            offset = self.offset
+        if offset is None:
+            return time.mktime(fields + (0, 0, -1))
+        return calendar.timegm(fields + (0, 0, 0)) - offset
+
+    def parse(self, line, now=None):
+        """
+        :param line: syslog line
+        :ptype line: string
+        :param now: current time, for the year of RFC3164 stamps (default: now)
+        :ptype now: float
+        :return: seconds since the epoch, None if no known stamp starts the line
+        :rtype: float
+        """
+        if now is None:
+            now = time.time()
+        if now != self._now:
+            self._now = now
+            # The year where the log is written, UTC may still be in the last one
+            moment = time.localtime(now) if self.offset is None else time.gmtime(now + self.offset)
+            self._year = moment.tm_year
+            # Memoized epochs depend on the inferred year, forget them each new day
+            key = (self._year, int(now // 86400))
+            if key != self._cache_key:
+                self._cache = {}
+                self._cache_key = key
+        if len(self._cache) > CACHE_SIZE:
+            self._cache = {}
+        first = line[:1]
+        if first.isalpha():
+            return self._parse_rfc3164(line, now)
+        if first == '<' or first.isdigit():
+            epoch = self._parse_iso8601(line)
+            if epoch is None:
+                epoch = self._parse_unix(line)
+            return epoch
+        return None
+
+    def _parse_rfc3164(self, line, now):
+        """
+        :param line: syslog line starting "Mmm dd hh:mm:ss"
+        :ptype line: string
+        :param now: current time
+        :ptype now: float
+        :return: seconds since the epoch, None if not a RFC3164 stamp
+        :rtype: float
+        """
+        key = line[:15]
+        epoch = self._cache.get(key)
+        if epoch is None:
+            match = RE_RFC3164.match(line)
+            if match is None or match.group(1) not in MONTHS:
+                return None
+            month, day, hour, minute, second = (MONTHS[match.group(1)],
+                                                int(match.group(2)),
+                                                int(match.group(3)),
+                                                int(match.group(4)),
+                                                int(match.group(5)))
+            year = self._year
+            epoch = self._to_epoch((year, month, day, hour, minute, second))
+            if epoch > now + YEAR_ROLLBACK_SECONDS:
+                epoch = self._to_epoch((year - 1, month, day, hour, minute, second))
+            self._cache[key] = epoch
+            fraction = match.group(6)
+        else:
+            fraction = line[15:16] == '.' and line[15:line.find(' ', 15)]
+        return epoch + float(fraction) if fraction else epoch
+
+    def _parse_iso8601(self, line):
+        """
+        :param line: syslog line starting with a RFC5424 / ISO8601 stamp
+        :ptype line: string
+        :return: seconds since the epoch, None if not an ISO8601 stamp
+        :rtype: float
+        """
+        match = RE_ISO8601.match(line)
+        if match is None:
+            return None
+        key = (match.group(1, 2, 3, 4, 5, 6), match.group(8))
+        epoch = self._cache.get(key)
+        if epoch is None:
+            offset = None if match.group(8) is None else parse_offset(match.group(8))
+            epoch = self._to_epoch(tuple(int(field) for field in key[0]), offset)
+            self._cache[key] = epoch
+        fraction = match.group(7)
+        return epoch + float(fraction) if fraction else epoch
+
+    @staticmethod
+    def _parse_unix(line):
+        """
+        :param line: syslog line starting with seconds since the epoch
+        :ptype line: string
+        :return: seconds since the epoch, None if not a unix stamp
+        :rtype: float
+        """
+        match = RE_UNIX.match(line)
+        if match is None:
+            return None
+        return float(match.group(0))
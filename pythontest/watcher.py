@@ -0,0 +1,231 @@
+"""
+Wait for the cron log to change: inotify, or polling where inotify is
+unavailable
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from clock import monotonic
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _encode(path):
+    """
+    :param path: file system path
+    :ptype path: string
+    :return: path as bytes, for libc and for comparing inotify names
+    :rtype: bytes
+    """
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding() or 'utf-8')
+
+
+class _Watcher(object):
+    """
+    Shared debounce logic of InotifyWatcher and PollingWatcher; each
+    provides _poll(timeout), which blocks up to timeout seconds and
+    returns the watched paths that changed
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: files to watch, they may not exist yet
+        :ptype paths: list of strings
+        """
+        self.paths = [os.path.abspath(path) for path in paths]
+
+    def wait(self, timeout, debounce=0.0):
+        """
+        Block until a watched file changes or timeout passes. After the
+        first change keep collecting until no change is seen for debounce
+        seconds, so a burst of writes is handled once (never waiting past
+        timeout).
+        :param timeout: seconds to wait at most
+        :ptype timeout: float
+        :param debounce: seconds of quiet that end a burst
+        :ptype debounce: float
+        :return: watched paths that changed, empty on timeout
+        :rtype: set of strings
+        """
+        deadline = monotonic() + max(0.0, timeout)
+        changed = self._poll(max(0.0, timeout))
+        while changed and debounce > 0:
+            quiet = min(debounce, deadline - monotonic())
+            if quiet <= 0:
+                break
+            more = self._poll(quiet)
+            if not more:
+                break
+            changed.update(more)
+        return changed
+
+    def close(self):
+        """
+        :return: None
+        """
+
+
+class InotifyWatcher(_Watcher):
+    """
+    Watch the directories holding the files, so a file being created,
+    replaced or renamed away (ex. logrotate) is also seen
+    """
+
+    def __init__(self, paths):
+        """
+        :param paths: files to watch
+        :ptype paths: list of strings
+        """
+        super(InotifyWatcher, self).__init__(paths)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, 'inotify_init1: ' + os.strerror(error))
+        self._names = {}
+        for path in self.paths:
+            dirname, basename = os.path.split(path)
+            self._names.setdefault(dirname, {})[_encode(basename)] = path
+        self._watches = {}
+        try:
+            for dirname in self._names:
+                watch = self._libc.inotify_add_watch(self.fd, _encode(dirname), WATCH_MASK)
+                if watch < 0:
+                    error = ctypes.get_errno()
+                    raise OSError(error, 'inotify_add_watch {}: {}'.format(dirname, os.strerror(error)))
+                self._watches[watch] = dirname
+        except OSError:
+            self.close()
+            raise
+
+    def _poll(self, timeout):
+        """
+        :param timeout: seconds to block waiting for a change
+        :ptype timeout: float
+        :return: watched paths that changed
+        :rtype: set of strings
+        """
+        try:
+            readable = select.select([self.fd], [], [], timeout)[0]
+        except select.error as err:
+            if err.args[0] == errno.EINTR:
+                return set()
+            raise
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as err:
+            if err.errno == errno.EAGAIN:
+                return set()
+            raise
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            watch, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            path = self._names.get(self._watches.get(watch), {}).get(name)
+            if path is not None:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        """
+        :return: None
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(_Watcher):
+    """
+    Compare each file's inode, size and modification time every interval
+    """
+
+    def __init__(self, paths, interval=1.0):
+        """
+        :param paths: files to watch
+        :ptype paths: list of strings
+        :param interval: seconds between checks
+        :ptype interval: float
+        """
+        super(PollingWatcher, self).__init__(paths)
+        self.interval = interval
+        self._stats = dict((path, self._stat(path)) for path in self.paths)
+
+    @staticmethod
+    def _stat(path):
+        """
+        :param path: file
+        :ptype path: string
+        :return: inode, size and modification time, None if missing
+        :rtype: tuple
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+    def _poll(self, timeout):
+        """
+        :param timeout: seconds to block waiting for a change
+        :ptype timeout: float
+        :return: watched paths that changed
+        :rtype: set of strings
+        """
+        deadline = monotonic() + timeout
+        while True:
+            changed = set()
+            for path in self.paths:
+                stat = self._stat(path)
+                if stat != self._stats[path]:
+                    self._stats[path] = stat
+                    changed.add(path)
+            remaining = deadline - monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+
+def make_watcher(paths, log=None, interval=1.0):
+    """
+    :param paths: files to watch
+    :ptype paths: list of strings
+    :param log: pre-configured logger
+    :pytpe log: logging.getLogger object
+    :param interval: seconds between checks when polling
+    :ptype interval: float
+    :return: inotify watcher, or a polling watcher if inotify is unavailable
+    :rtype: InotifyWatcher or PollingWatcher
+    """
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError) as err:
+        if log is not None:
+            log.warning('inotify unavailable ({}), polling every {}s'.format(err, interval))
+        return PollingWatcher(paths, interval=interval)
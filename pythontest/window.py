@@ -0,0 +1,329 @@
+"""
+Count log events over sliding time windows without rescanning log lines
+"""
+
+from collections import OrderedDict, deque
+
+# Event categories counted in every window
+CATEGORIES = ('cron', 'touch', 'error', 'warning')
+
+
+def merge_collapsed(collapsed_lists):
+    """
+    Collapse messages from several aggregators, ex. one per host, as if
+    they had been counted by one: the counts of a message are added, its
+    first and last times widened and its latest line kept
+    :param collapsed_lists: WindowAggregator.collapsed() results
+    :ptype collapsed_lists: iterable of lists of dicts
+    :return: messages, last seen first, see WindowAggregator.collapsed()
+    :rtype: list of dicts
+    """
+    merged = {}
+    for collapsed in collapsed_lists:
+        for message in collapsed:
+            found = merged.get(message['message'])
+            if found is None:
+                merged[message['message']] = dict(message, categories=list(message['categories']))
+                continue
+            found['count'] += message['count']
+            found['first'] = min(found['first'], message['first'])
+            if message['last'] > found['last']:
+                found['last'], found['line'] = message['last'], message['line']
+            found['categories'].extend(category for category in message['categories']
+                                       if category not in found['categories'])
+    return sorted(merged.values(), key=lambda message: message['last'], reverse=True)
+
+
+class SlidingCounter(object):
+    """
+    Ring buffer of per-bucket counters covering the last `seconds` seconds.
+    Each bucket holds one counter per category (the fixed CATEGORIES plus
+    any others added, ex. one per touch file) and a running total is kept
+    per category, so adding an event, expiring a bucket and asking for the
+    count in the window are all O(1) (expiry is O(buckets passed), bounded
+    by the ring size).
+    """
+
+    def __init__(self, seconds, resolution=None, categories=CATEGORIES):
+        """
+        :param seconds: window length
+        :ptype seconds: int
+        :param resolution: bucket width in seconds (default: 1 second up to an
+            hour long window, 1 minute beyond that)
+        :ptype resolution: int
+        :param categories: event categories to count
+        :ptype categories: tuple of strings
+        """
+        if resolution is None:
+            resolution = 1 if seconds <= 3600 else 60
+        self.seconds = seconds
+        self.resolution = resolution
+        self.size = max(1, int(seconds // resolution))
+        self.categories = tuple(categories)
+        self._buckets = [None] * self.size
+        self._head = None
+        self.totals = dict.fromkeys(self.categories, 0)
+
+    def _advance(self, bucket):
+        """
+        Move the newest bucket forward, expiring buckets that left the window
+        :param bucket: absolute bucket number (epoch // resolution)
+        :ptype bucket: int
+        :return: None
+        """
+        if self._head is None or bucket - self._head >= self.size:
+            self._buckets = [None] * self.size
+            self.totals = dict.fromkeys(self.categories, 0)
+        elif bucket > self._head:
+            for index in range(self._head + 1, bucket + 1):
+                self._expire(index % self.size)
+        else:
+            return
+        self._head = bucket
+
+    def _expire(self, slot):
+        """
+        :param slot: ring position to empty
+        :ptype slot: int
+        :return: None
+        """
+        counts = self._buckets[slot]
+        if counts is not None:
+            for category, count in counts.items():
+                self.totals[category] -= count
+            self._buckets[slot] = None
+
+    def add(self, epoch, categories, count=1):
+        """
+        Count an event, events older than the window are ignored
+        :param epoch: event time, seconds since the epoch
+        :ptype epoch: float
+        :param categories: categories the event belongs to
+        :ptype categories: iterable of strings
+        :param count: number of events
+        :ptype count: int
+        :return: None
+        """
+        bucket = int(epoch // self.resolution)
+        self._advance(bucket)
+        if bucket <= self._head - self.size:
+            return
+        slot = bucket % self.size
+        counts = self._buckets[slot]
+        if counts is None:
+            counts = self._buckets[slot] = {}
+        for category in categories:
+            counts[category] = counts.get(category, 0) + count
+            self.totals[category] = self.totals.get(category, 0) + count
+
+    def counts(self, epoch=None):
+        """
+        :param epoch: current time, expires buckets older than the window
+        :ptype epoch: float
+        :return: events per category in the window
+        :rtype: dict
+        """
+        if epoch is not None:
+            self._advance(int(epoch // self.resolution))
+        return dict(self.totals)
+
+    def to_dict(self):
+        """
+        :return: JSON serializable, sparse copy of the ring
+        :rtype: dict
+        """
+        return {'head': self._head,
+                'buckets': dict((str(slot), counts) for slot, counts in enumerate(self._buckets)
+                                if counts)}
+
+    def load(self, saved):
+        """
+        Restore a ring saved by to_dict()
+        :param saved: saved ring
+        :ptype saved: dict
+        :return: None
+        """
+        self._buckets = [None] * self.size
+        self.totals = dict.fromkeys(self.categories, 0)
+        self._head = saved.get('head')
+        for slot, counts in saved.get('buckets', {}).items():
+            slot = int(slot)
+            if slot < self.size:
+                self._buckets[slot] = counts
+                for category, count in counts.items():
+                    self.totals[category] = self.totals.get(category, 0) + count
+
+
+class WindowAggregator(object):
+    """
+    Feed each classified log event once and read counts for several
+    windows at the same time (ex. 1, 7 and 60 minutes). The lines of the
+    primary window are also kept, oldest first, for reporting. Messages
+    (lines without their time stamp) are collapsed instead: each distinct
+    message is kept once with its occurrences counted per second, so a
+    daemon repeating itself costs memory per second, not per line. An
+    expiry queue of (second, message), oldest first, lets expire() visit
+    only the messages with occurrences leaving the window.
+    """
+
+    def __init__(self, primary=7, windows=()):
+        """
+        :param primary: main window length in minutes
+        :ptype primary: int
+        :param windows: additional window lengths in minutes
+        :ptype windows: iterable of ints
+        """
+        self.primary = primary
+        self.windows = sorted(set([primary] + list(windows)))
+        self.counters = dict((minutes, SlidingCounter(minutes * 60)) for minutes in self.windows)
+        self.lines = deque()
+        # message: [categories, last line, deque of [second, occurrences]], last seen last
+        self.messages = OrderedDict()
+        # (second, message) for every second in the messages, oldest first
+        self._expiry = deque()
+
+    @property
+    def longest(self):
+        """
+        :return: longest window length in minutes
+        :rtype: int
+        """
+        return self.windows[-1]
+
+    def add(self, epoch, categories, line=None):
+        """
+        :param epoch: event time, seconds since the epoch
+        :ptype epoch: float
+        :param categories: categories the event belongs to
+        :ptype categories: tuple of strings
+        :param line: log line to keep while inside the primary window
+        :ptype line: string
+        :return: None
+        """
+        for counter in self.counters.values():
+            counter.add(epoch, categories)
+        if line is not None:
+            self.lines.append((epoch, categories, line))
+
+    def add_message(self, epoch, categories, message, line):
+        """
+        Collapse an event inside the primary window into its message, the
+        event is counted by add()
+        :param epoch: event time, seconds since the epoch
+        :ptype epoch: float
+        :param categories: categories the event belongs to
+        :ptype categories: tuple of strings
+        :param message: the line without its time stamp
+        :ptype message: string
+        :param line: log line, kept as the last occurrence
+        :ptype line: string
+        :return: None
+        """
+        entry = self.messages.pop(message, None)
+        if entry is None:
+            entry = [categories, line, deque()]
+        entry[1] = line
+        second = int(epoch)
+        seen = entry[2]
+        if seen and seen[-1][0] == second:
+            seen[-1][1] += 1
+        else:
+            seen.append([second, 1])
+            self._expiry.append((second, message))
+        self.messages[message] = entry
+
+    def expire(self, epoch):
+        """
+        Drop kept lines and message occurrences that left the primary window
+        :param epoch: current time, seconds since the epoch
+        :ptype epoch: float
+        :return: None
+        """
+        oldest = epoch - self.primary * 60
+        while self.lines and self.lines[0][0] <= oldest:
+            self.lines.popleft()
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= oldest:
+            _, message = expiry.popleft()
+            entry = self.messages.get(message)
+            if entry is None:
+                continue
+            seen = entry[2]
+            while seen and seen[0][0] <= oldest:
+                seen.popleft()
+            if not seen:
+                del self.messages[message]
+
+    def counts(self, epoch):
+        """
+        :param epoch: current time, seconds since the epoch
+        :ptype epoch: float
+        :return: window length in minutes to events per category
+        :rtype: dict
+        """
+        self.expire(epoch)
+        return dict((minutes, counter.counts(epoch)) for minutes, counter in self.counters.items())
+
+    def events(self, categories=None):
+        """
+        :param categories: only lines in any of these categories (default: all)
+        :ptype categories: iterable of strings
+        :return: kept lines, newest first
+        :rtype: list of strings
+        """
+        if categories is None:
+            return [line for _, _, line in reversed(self.lines)]
+        wanted = set(categories)
+        return [line for _, found, line in reversed(self.lines) if wanted.intersection(found)]
+
+    def collapsed(self, categories=None):
+        """
+        :param categories: only messages in any of these categories (default: all)
+        :ptype categories: iterable of strings
+        :return: messages, last seen first, as dicts with keys "message",
+            "line" (the last occurrence), "categories", "count" and
+            "first" and "last" (seconds since the epoch)
+        :rtype: list of dicts
+        """
+        wanted = None if categories is None else set(categories)
+        collapsed = []
+        for message, (found, line, seen) in reversed(list(self.messages.items())):
+            if wanted is not None and not wanted.intersection(found):
+                continue
+            collapsed.append({'message': message,
+                              'line': line,
+                              'categories': list(found),
+                              'count': sum(count for _, count in seen),
+                              'first': seen[0][0],
+                              'last': seen[-1][0]})
+        return collapsed
+
+    def to_dict(self):
+        """
+        :return: JSON serializable copy of the counters, kept lines and messages
+        :rtype: dict
+        """
+        return {'counters': dict((str(minutes), counter.to_dict())
+                                 for minutes, counter in self.counters.items()),
+                'lines': [[epoch, list(categories), line] for epoch, categories, line in self.lines],
+                'messages': [[message, list(categories), line, list(seen)]
+                             for message, (categories, line, seen) in self.messages.items()]}
+
+    def load(self, saved):
+        """
+        Restore counters, kept lines and messages saved by to_dict(), windows not
+        saved previously start empty
+        :param saved: saved aggregator
+        :ptype saved: dict
+        :return: None
+        """
+        for minutes, counter in self.counters.items():
+            counter_saved = saved.get('counters', {}).get(str(minutes))
+            if counter_saved is not None:
+                counter.load(counter_saved)
+        self.lines = deque((epoch, tuple(categories), line)
+                           for epoch, categories, line in saved.get('lines', []))
+        self.messages = OrderedDict((message, [tuple(categories), line, deque(seen)])
+                                    for message, categories, line, seen in saved.get('messages', []))
+        self._expiry = deque(sorted((second, message) for message, (_, _, seen) in self.messages.items()
+                                    for second, _ in seen))
@@ -0,0 +1,143 @@
+"""
+Append reports to touch files through long lived, batched file handles
+"""
+
+import json
+import os
+import threading
+
+DURABILITY = ('none', 'flush', 'fsync')
+FORMATS = ('text', 'jsonl')
+
+
+def format_record(record, touch_format='text'):
+    """
+    Render a touch file record
+      text: the original human readable line, events as an indented JSON list
+      jsonl: one compact JSON object per line
+    :param record: report, keys "start", "count" and optionally
+        "windows" (other window minutes to count), "events" (warnings and
+        errors) and "kind" ("report", or "alert" for events reported early)
+    :ptype record: dict
+    :param touch_format: "text" or "jsonl"
+    :ptype touch_format: string
+    :return: text to append, newline terminated
+    :rtype: string
+    """
+    if touch_format == 'jsonl':
+        return json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n'
+    events = record.get('events', [])
+    touch_append = record.get('start')
+    if record.get('kind') == 'alert':
+        touch_append += ': {} new warning or error events:\n'.format(len(events))
+        touch_append += json.dumps(events, sort_keys=True, indent=4)
+        return touch_append.strip() + '\n'
+    touch_append += ': cron touch command events count '
+    touch_append += str(record.get('count'))
+    for minutes, count in sorted(record.get('windows', {}).items()):
+        touch_append += ', {} in last {} min'.format(count, minutes)
+    if len(events) > 0:
+        touch_append += ', {} other events:\n'.format(len(events))
+        touch_append += json.dumps(events, sort_keys=True, indent=4) + '\n'
+    return touch_append.strip() + '\n'
+
+
+class TouchWriter(object):
+    """
+    Keep touch files open across loops and write each loop's appends as
+    one batch per file. A handle is reopened when its file was moved away
+    (ex. by rotate_touchfile) or deleted, detected by comparing the inode
+    of the path with the inode of the open handle. After each batch the
+    data is left in the write buffer ("none"), flushed to the operating
+    system ("flush") or flushed and synced to disk ("fsync"). Appends,
+    batches and closes hold a lock, the --asyncio runtime closes touch
+    files for rotation while another schedule writes its batch.
+    """
+
+    def __init__(self, durability='flush', touch_format='text', log=None):
+        """
+        :param durability: "none", "flush" or "fsync"
+        :ptype durability: string
+        :param touch_format: "text" or "jsonl", see format_record()
+        :ptype touch_format: string
+        :param log: pre-configured logger
+        :pytpe log: logging.getLogger object
+        """
+        if durability not in DURABILITY:
+            raise ValueError('durability must be one of ' + ', '.join(DURABILITY))
+        if touch_format not in FORMATS:
+            raise ValueError('format must be one of ' + ', '.join(FORMATS))
+        self.durability = durability
+        self.touch_format = touch_format
+        self.log = log
+        self._handles = {}
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    def append(self, filename, record):
+        """
+        Queue a record for filename, written by commit()
+        :param filename: touch file
+        :ptype filename: string
+        :param record: report, see format_record()
+        :ptype record: dict
+        :return: text queued
+        :rtype: string
+        """
+        text = format_record(record, self.touch_format)
+        with self._lock:
+            self._pending.setdefault(filename, []).append(text)
+        return text
+
+    def _handle(self, filename):
+        """
+        :param filename: touch file
+        :ptype filename: string
+        :return: an open handle still pointing at filename
+        :rtype: file
+        """
+        filehandle = self._handles.get(filename)
+        if filehandle is not None:
+            try:
+                current = os.stat(filename).st_ino
+            except OSError:
+                current = None
+            if current != os.fstat(filehandle.fileno()).st_ino:
+                self.close(filename)
+                filehandle = None
+        if filehandle is None:
+            filehandle = self._handles[filename] = open(filename, 'at')
+        return filehandle
+
+    def commit(self):
+        """
+        Write all queued records, one write per file, then apply durability
+        :return: files written
+        :rtype: int
+        """
+        written = 0
+        with self._lock:
+            for filename, texts in self._pending.items():
+                filehandle = self._handle(filename)
+                filehandle.write(''.join(texts))
+                if self.durability != 'none':
+                    filehandle.flush()
+                if self.durability == 'fsync':
+                    os.fsync(filehandle.fileno())
+                written += 1
+            self._pending = {}
+        return written
+
+    def close(self, filename=None):
+        """
+        Flush and close one touch file's handle, or all of them
+        :param filename: touch file (default: all)
+        :ptype filename: string
+        :return: None
+        """
+        with self._lock:
+            filenames = list(self._handles) if filename is None else [filename]
+            for name in filenames:
+                filehandle = self._handles.pop(name, None)
+                if filehandle is not None:
+                    filehandle.close()
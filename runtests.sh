@@ -0,0 +1,3 @@
+#!/usr/bin/env sh
+# Run the unit tests, under python2 unless PYTHON is set, ex. PYTHON=python3 ./runtests.sh
+cd "$(dirname "$0")" && exec "${PYTHON:-python2}" -m unittest discover -s pythontest/tests -t pythontest "$@"